@@ -1,11 +1,24 @@
 """
 LLM.py - Gemini 기반 대화 생성 모듈
 """
+import asyncio
+import itertools
 import logging
 import os
-from typing import Optional, List, Dict
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Optional, List, Dict, Iterator, Tuple, Callable
 import google.generativeai as genai
 
+from context import ContextWindow, estimate_tokens
+from intent import IntentEngine
+from ratelimit import is_rate_limit, limiter_for
+from runtime import CancelToken
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s [LLM] %(message)s')
 logger = logging.getLogger(__name__)
 
@@ -52,20 +65,181 @@ SYSTEM_PROMPT = """당신은 '하이'라는 이름의 AI 건강 도우미입니
 자연스럽게 대화해주세요. 다시 한번 강조: 이모티콘/이모지를 절대 사용하지 마세요."""
 
 
+# 고정 문장 (TTS 캐시 예열 대상)
+GREETING = "할머니~ 저 하이예요! 점심 맛있게 드셨어요?"
+
+# 시간대별 인사말: (이 시각 전까지, 인사말), 마지막 항목은 밤
+GREETINGS = (
+    (5, "할머니~ 저 하이예요! 아직 안 주무셨어요?"),
+    (11, "할머니~ 저 하이예요! 좋은 아침이에요. 아침은 드셨어요?"),
+    (14, GREETING),
+    (17, "할머니~ 저 하이예요! 오후 잘 보내고 계세요?"),
+    (21, "할머니~ 저 하이예요! 저녁 맛있게 드셨어요?"),
+    (24, "할머니~ 저 하이예요! 주무시기 전에 잠깐 전화드렸어요."),
+)
+
+# 복약 알림 전화 인사말 (scheduler 슬롯별, 약 이름이 없을 때)
+MEDICATION_GREETINGS = {
+    "morning": "할머니~ 저 하이예요! 아침 드시고 약 챙겨 드셨어요?",
+    "lunch": "할머니~ 저 하이예요! 점심 드시고 약 챙겨 드셨어요?",
+    "evening": "할머니~ 저 하이예요! 저녁 드시고 약 드실 시간이에요~",
+    "bedtime": "할머니~ 저 하이예요! 주무시기 전에 약 챙겨 드셨어요?",
+}
+
+# 의도별 응답은 intent.INTENTS, 어느 의도에도 안 맞을 때의 데모 응답
+DEMO_DEFAULT = "네 할머니, 더 말씀해 주세요~"
+
+APOLOGIES = (
+    "죄송해요 할머니, 잘 못 들었어요. 다시 말씀해 주시겠어요?",
+    "죄송해요, 다시 말씀해 주시겠어요?",
+)
+
+
+# 문장 경계: 종결 부호(. ! ? … ~) 뒤 공백, 또는 줄바꿈
+_SENTENCE_END = re.compile(r'[.!?…~]+["\')\]]*\s+|\n+')
+
+
+def split_chunks(buffer: str, max_clause: int = 40) -> Tuple[List[str], str]:
+    """
+    스트리밍 버퍼를 TTS용 문장/절 단위로 분리
+    
+    Args:
+        buffer: 지금까지 받은 (아직 내보내지 않은) 텍스트
+        max_clause: 종결 부호 없이 이 길이를 넘으면 쉼표에서 절 단위로 끊음
+        
+    Returns:
+        (완성된 청크 목록, 남은 버퍼)
+    """
+    chunks = []
+    start = 0
+    for m in _SENTENCE_END.finditer(buffer):
+        piece = buffer[start:m.end()].strip()
+        if piece:
+            chunks.append(piece)
+        start = m.end()
+    rest = buffer[start:]
+    
+    # 긴 절은 마지막 쉼표에서 끊어 첫 음성을 앞당김
+    while len(rest) > max_clause:
+        cut = rest.rfind(", ", 0, len(rest) - 1)
+        if cut <= 0:
+            break
+        chunks.append(rest[:cut + 1].strip())
+        rest = rest[cut + 2:]
+    
+    return chunks, rest
+
+
+# 세션 ID를 주지 않은 호출자가 공유하는 기본 세션
+DEFAULT_SESSION = "default"
+
+
+# 오래된 턴을 접을 때 쓰는 요약 요청
+SUMMARY_REQUEST = """아래는 어르신과 나눈 통화 내용입니다.
+건강 상태, 식사, 약 복용, 기분, 언급한 사람/일정 위주로 3문장 이내로 요약하세요.
+이전 요약이 있으면 합쳐서 하나로 만드세요.
+
+이전 요약: {summary}
+
+대화:
+{dialogue}"""
+
+
+@dataclass
+class Reply:
+    """
+    응답 생성 하나의 결과 (턴마다 따로 두고 commit()에 그대로 넘김)
+
+    세션에 두면 말 끊기로 겹친 턴, 추측 생성, 다른 탭이 서로 덮어쓰므로
+    record=False 생성은 결과를 여기에만 남깁니다.
+    """
+    path: Optional[str] = None   # gemini / intent / demo / quota / error (None이면 생성 전)
+    text: str = ""               # 생성한 응답 전체
+    response: Any = None         # Gemini 응답 (usage_metadata로 실제 토큰 수)
+    prompt_tokens: int = 0       # 이번 요청의 프롬프트 토큰 (추정)
+
+
+class Conversation:
+    """세션별 대화 상태 (최근 턴 + 누적 요약)"""
+    
+    __slots__ = ("session_id", "context", "last_used", "last_path", "lock")
+    
+    def __init__(self, session_id: str, context: ContextWindow):
+        self.session_id = session_id
+        self.context = context
+        self.last_used = time.monotonic()
+        # 마지막으로 기록한 응답 경로: gemini / intent(로컬 빠른 경로) / demo(API 없음) / quota(429 폴백) / error
+        self.last_path = "gemini"
+        # 문맥 읽기/기록 보호 (생성 중에는 잡지 않음)
+        self.lock = threading.Lock()
+    
+    @property
+    def history(self) -> List[Dict]:
+        """그대로 보관 중인 최근 턴"""
+        return self.context.history
+
+
 class LLM:
-    """Gemini 대화 생성"""
+    """Gemini 대화 생성
+    
+    GenerativeModel은 프로세스당 하나만 만들고, 대화 상태는 세션 ID별로
+    Conversation 풀에 보관합니다. 풀은 최대 세션 수와 유휴 시간 제한을
+    넘으면 가장 오래 쓰지 않은 세션부터 정리합니다.
+    
+    요청마다 ContextWindow가 (누적 요약 + 최근 턴 + 새 입력)을 토큰 예산
+    안에서 구성하므로, 통화가 길어져도 프롬프트 크기가 일정합니다.
     
-    def __init__(self, api_key: Optional[str] = None):
+    약 복용/식사/인사처럼 정형화된 턴은 IntentEngine이 신뢰도 높게 판정하면
+    Gemini를 부르지 않고 바로 응답합니다.
+    """
+    
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        max_sessions: int = 256,
+        idle_timeout: float = 1800.0,
+        model=None,
+        max_turns: int = 6,
+        context_tokens: int = 1500,
+        intents: Optional[IntentEngine] = None,
+        fast_path: bool = True,
+        rpm: Optional[float] = None,
+        turn_deadline: float = 6.0,
+    ):
         """
         Args:
             api_key: Google API 키
+            max_sessions: 동시에 유지할 최대 세션 수 (초과 시 LRU 정리)
+            idle_timeout: 이 시간(초) 동안 쓰지 않은 세션은 정리
+            model: 미리 만든 GenerativeModel (벤치마크용 가짜 모델 주입)
+            max_turns: 요약하지 않고 그대로 보낼 최근 턴 수
+            context_tokens: 요청 하나의 프롬프트 토큰 예산
+            intents: 정형 의도 판정기 (None이면 기본 의도 목록)
+            fast_path: True면 신뢰도 높은 정형 턴은 Gemini 없이 로컬 응답
+            rpm: API 키의 분당 요청 쿼터 (None이면 GEMINI_RPM 환경변수 또는 15)
+            turn_deadline: 한 턴의 응답을 기다릴 최대 시간 (초, 넘길 것 같으면 대체 응답)
         """
         self.api_key = api_key or get_api_key("GOOGLE_API_KEY")
+        self.max_sessions = max(1, max_sessions)
+        self.idle_timeout = idle_timeout
+        self.max_turns = max_turns
+        self.context_tokens = context_tokens
+        self.intents = intents or IntentEngine()
+        self.fast_path = fast_path
+        self.turn_deadline = turn_deadline
+        # 같은 키를 쓰는 모든 세션/인스턴스가 한 버킷을 공유
+        self.limiter = limiter_for(self.api_key, rpm or float(os.getenv("GEMINI_RPM", "15")))
+        # 정리된 세션까지 포함한 누적 토큰
+        self._usage = {"requests": 0, "prompt_tokens": 0, "output_tokens": 0}
+        self._sessions: "OrderedDict[str, Conversation]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.model = model
+
+        if model is not None:
+            return
         
         if not self.api_key:
             logger.error("GOOGLE_API_KEY가 설정되지 않았습니다")
-            self.model = None
-            self.chat = None
             return
         
         try:
@@ -81,22 +255,143 @@ class LLM:
                 }
             )
             
-            self.chat = self.model.start_chat(history=[])
-            self.history: List[Dict] = []
-            
             logger.info("LLM 초기화 완료 (Gemini)")
             
         except Exception as e:
             logger.error(f"LLM 초기화 실패: {e}")
             self.model = None
-            self.chat = None
     
-    def generate(self, user_input: str) -> str:
+    # ─────────────────────────────────────────────
+    # 세션 풀
+    # ─────────────────────────────────────────────
+    def session(self, session_id: str = DEFAULT_SESSION) -> Conversation:
+        """
+        세션의 대화 상태 조회 (없으면 생성)
+        
+        Args:
+            session_id: 통화/사용자 단위 세션 ID
+            
+        Returns:
+            해당 세션의 Conversation
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            conv = self._sessions.get(session_id)
+            if conv is None:
+                context = ContextWindow(
+                    max_turns=self.max_turns,
+                    token_budget=self.context_tokens,
+                    summarizer=self._summarize if self.model else None,
+                )
+                conv = Conversation(session_id, context)
+                self._sessions[session_id] = conv
+                while len(self._sessions) > self.max_sessions:
+                    old_id, _ = self._sessions.popitem(last=False)
+                    logger.info(f"세션 정리 (LRU): {old_id}")
+            else:
+                self._sessions.move_to_end(session_id)
+            conv.last_used = now
+            return conv
+    
+    def _evict_idle(self, now: float):
+        """유휴 세션 정리 (가장 오래된 것부터, 잠금 상태에서 호출)"""
+        while self._sessions:
+            session_id, conv = next(iter(self._sessions.items()))
+            if now - conv.last_used < self.idle_timeout:
+                break
+            del self._sessions[session_id]
+            logger.info(f"세션 정리 (유휴): {session_id}")
+    
+    @property
+    def session_count(self) -> int:
+        """현재 유지 중인 세션 수"""
+        return len(self._sessions)
+    
+    @property
+    def history(self) -> List[Dict]:
+        """기본 세션의 최근 턴 (하위 호환용)"""
+        return self.session().history
+    
+    def token_usage(self, session_id: Optional[str] = None) -> Dict:
+        """
+        토큰 사용량
+        
+        Args:
+            session_id: 지정하면 해당 세션의 문맥 통계 (없는 세션이면 빈 dict, 새로 만들지 않음),
+                None이면 프로세스 누적
+            
+        Returns:
+            requests, prompt_tokens, output_tokens (+ 세션별 last_prompt_tokens 등)
+        """
+        with self._lock:
+            if session_id is None:
+                return dict(self._usage)
+            conv = self._sessions.get(session_id)
+        if conv is None:
+            return {}
+        with conv.lock:
+            return dict(conv.context.stats)
+    
+    # ─────────────────────────────────────────────
+    # 문맥 관리
+    # ─────────────────────────────────────────────
+    def _record(self, conv: Conversation, user_input: str, reply: str, response=None, truncated: bool = False):
+        """완료된 턴을 문맥에 기록 (응답의 usage_metadata가 있으면 실제 토큰 수 사용)"""
+        usage = getattr(response, "usage_metadata", None)
+        prompt = getattr(usage, "prompt_token_count", None) or None
+        output = getattr(usage, "candidates_token_count", None) or None
+        conv.context.add(user_input, reply, prompt_tokens=prompt, output_tokens=output, truncated=truncated)
+        stats = conv.context.stats
+        with self._lock:
+            self._usage["requests"] += 1
+            self._usage["prompt_tokens"] += stats["last_prompt_tokens"]
+            self._usage["output_tokens"] += output if output is not None else estimate_tokens(reply)
+    
+    def _local_reply(
+        self,
+        conv: Conversation,
+        user_input: str,
+        record: bool = True,
+        result: Optional[Reply] = None,
+    ) -> Optional[str]:
+        """정형 턴이면 로컬 응답 (record면 문맥에도 기록), 아니면 None"""
+        if not self.fast_path:
+            return None
+        hit = self.intents.answer(user_input)
+        if hit is None:
+            return None
+        reply = hit.reply
+        if record:
+            with conv.lock:
+                conv.context.remember(user_input, reply)
+                conv.last_path = "intent"
+        if result is not None:
+            result.path, result.text = "intent", reply
+        logger.info(f"로컬 응답 ({hit.name}, 신뢰도 {hit.confidence:.2f}): {reply}")
+        return reply
+    
+    def is_local(self, user_input: str) -> bool:
+        """로컬 빠른 경로로 답할 입력인지 (집계 없이 판정만)"""
+        if not self.fast_path:
+            return False
+        return self.intents.accepts(self.intents.match(user_input))
+    
+    def _summarize(self, summary: str, turns: List[Tuple[str, str]]) -> str:
+        """오래된 턴을 누적 요약으로 압축 (ContextWindow가 fold_batch 턴마다 호출)"""
+        dialogue = "\n".join(f"어르신: {user}\n하이: {ai}" for user, ai in turns)
+        prompt = SUMMARY_REQUEST.format(summary=summary or "없음", dialogue=dialogue)
+        # 요약은 급하지 않으므로 쿼터가 바로 나지 않으면 발췌 요약으로
+        response = self.limiter.call(lambda: self.model.generate_content(prompt), time.monotonic() + 1.0)
+        return response.text.strip()
+    
+    def generate(self, user_input: str, session_id: str = DEFAULT_SESSION) -> str:
         """
         응답 생성 (동기)
         
         Args:
             user_input: 사용자 입력 텍스트
+            session_id: 대화 세션 ID
             
         Returns:
             AI 응답 텍스트
@@ -104,87 +399,297 @@ class LLM:
         if not user_input or not user_input.strip():
             return ""
         
-        if not self.chat:
+        conv = self.session(session_id)
+        
+        local = self._local_reply(conv, user_input)
+        if local:
+            return local
+        
+        if not self.model:
             logger.warning("LLM이 초기화되지 않아 데모 응답 사용")
+            conv.last_path = "demo"
             return self._demo_response(user_input)
         
         try:
             logger.info(f"입력: {user_input}")
             
-            response = self.chat.send_message(user_input)
+            deadline = time.monotonic() + self.turn_deadline
+            # 잠금은 문맥을 읽고 쓸 때만 (재시도/백오프 동안 같은 세션의 다른 요청을 막지 않게)
+            with conv.lock:
+                contents = conv.context.build(user_input)
+            response = self.limiter.call(lambda: self.model.generate_content(contents), deadline)
             ai_response = response.text.strip()
-            
-            # 히스토리 저장
-            self.history.append({"role": "user", "content": user_input})
-            self.history.append({"role": "ai", "content": ai_response})
+            with conv.lock:
+                self._record(conv, user_input, ai_response, response)
+                conv.last_path = "gemini"
             
             logger.info(f"응답: {ai_response}")
             return ai_response
             
         except Exception as e:
             logger.error(f"응답 생성 실패: {e}")
-            # 429 쿼터 초과 시 데모 응답으로 폴백
-            if "429" in str(e) or "quota" in str(e).lower():
-                logger.warning("API 쿼터 초과 - 데모 모드로 전환")
+            # 재시도로도 턴 마감을 못 지킨 429만 데모 응답으로 폴백
+            if is_rate_limit(e):
+                logger.warning("API 쿼터 초과 - 이번 턴은 데모 응답")
+                conv.last_path = "quota"
                 return self._demo_response(user_input)
-            return "죄송해요 할머니, 잘 못 들었어요. 다시 말씀해 주시겠어요?"
+            conv.last_path = "error"
+            return APOLOGIES[0]
+    
+    def generate_stream(
+        self,
+        user_input: str,
+        session_id: str = DEFAULT_SESSION,
+        on_first_token: Optional[Callable[[], None]] = None,
+        record: bool = True,
+        cancel: Optional[CancelToken] = None,
+        result: Optional[Reply] = None,
+    ) -> Iterator[str]:
+        """
+        스트리밍 응답 생성 (문장/절 단위로 yield)
+        
+        Gemini 스트리밍 응답을 받는 즉시 split_chunks로 잘라 내보내므로,
+        첫 문장이 완성되자마자 TTS를 시작할 수 있습니다.
+        
+        Args:
+            user_input: 사용자 입력 텍스트
+            session_id: 대화 세션 ID
+            on_first_token: 첫 스트리밍 조각을 받았을 때 호출 (지연 계측용)
+            record: False면 문맥에도 세션에도 남기지 않음 (result를 commit()에 넘겨 확정)
+            cancel: 취소 신호 (말 끊기, 다음 조각에서 멈추고 내보낸 부분까지만 기록)
+            result: 이번 생성의 경로/응답/토큰을 채울 Reply
+            
+        Yields:
+            응답 텍스트 청크 (문장 또는 절)
+        """
+        if not user_input or not user_input.strip():
+            return
+        
+        conv = self.session(session_id)
+        result = result if result is not None else Reply()
+        
+        def finish(path: str, text: str = ""):
+            result.path, result.text = path, text
+            if record:
+                conv.last_path = path
+        
+        local = self._local_reply(conv, user_input, record, result)
+        if local:
+            if on_first_token:
+                on_first_token()
+            yield local
+            return
+        
+        if not self.model:
+            logger.warning("LLM이 초기화되지 않아 데모 응답 사용")
+            demo = self._demo_response(user_input)
+            finish("demo", demo)
+            yield demo
+            return
+        
+        logger.info(f"입력 (스트리밍): {user_input}")
+        # 잠금은 문맥을 읽고 쓸 때만 (yield 동안 잡고 있으면 버려진 생성기가 세션을 막음)
+        with conv.lock:
+            contents = conv.context.build(user_input)
+            result.path = "gemini"
+            result.prompt_tokens = conv.context.stats["last_prompt_tokens"]
+        full_text = ""
+        buffer = ""
+        sent: List[str] = []
+        deadline = time.monotonic() + self.turn_deadline
+        
+        def start():
+            # 429는 보통 첫 조각 전에 나므로 첫 조각까지를 재시도 단위로
+            stream = self.model.generate_content(contents, stream=True)
+            parts = iter(stream)
+            return stream, parts, next(parts, None)
+        
+        try:
+            response, parts, first = self.limiter.call(start, deadline)
+            for part in itertools.chain([first] if first is not None else [], parts):
+                if cancel is not None and cancel.cancelled:
+                    break
+                if on_first_token and not full_text:
+                    on_first_token()
+                full_text += part.text
+                buffer += part.text
+                chunks, buffer = split_chunks(buffer)
+                for chunk in chunks:
+                    sent.append(chunk)
+                    yield chunk
+            
+            if cancel is not None and cancel.cancelled:
+                self._interrupted(conv, user_input, sent, cancel.reason, record, result, response)
+                return
+            
+            tail = buffer.strip()
+            if tail:
+                sent.append(tail)
+                yield tail
+            
+        except GeneratorExit:
+            # 소비자가 스트림을 닫음 (말 끊기로 합성/재생이 먼저 멈춘 경우)
+            if cancel is not None and cancel.cancelled:
+                self._interrupted(conv, user_input, sent, cancel.reason, record, result)
+            raise
+            
+        except Exception as e:
+            logger.error(f"스트리밍 응답 실패: {e}")
+            if sent:
+                finish("error", " ".join(sent))
+                return
+            # 재시도로도 턴 마감을 못 지킨 429만 데모 응답으로 폴백
+            if is_rate_limit(e):
+                logger.warning("API 쿼터 초과 - 이번 턴은 데모 응답")
+                demo = self._demo_response(user_input)
+                finish("quota", demo)
+                yield demo
+            else:
+                finish("error", APOLOGIES[0])
+                yield APOLOGIES[0]
+            return
+        
+        ai_response = full_text.strip()
+        result.response = response
+        if record:
+            with conv.lock:
+                self._record(conv, user_input, ai_response, response)
+                finish("gemini", ai_response)
+        else:
+            finish("gemini", ai_response)
+        logger.info(f"응답: {ai_response}")
     
-    async def generate_async(self, user_input: str) -> str:
+    async def generate_async(self, user_input: str, session_id: str = DEFAULT_SESSION) -> str:
         """비동기 응답 생성"""
         if not user_input or not user_input.strip():
             return ""
         
-        if not self.chat:
+        conv = self.session(session_id)
+        
+        local = self._local_reply(conv, user_input)
+        if local:
+            return local
+        
+        if not self.model:
+            conv.last_path = "demo"
             return self._demo_response(user_input)
         
         try:
             logger.info(f"입력: {user_input}")
             
-            response = await self.chat.send_message_async(user_input)
+            with conv.lock:
+                contents = conv.context.build(user_input)
+            response = await self.limiter.call_async(
+                lambda: self.model.generate_content_async(contents),
+                time.monotonic() + self.turn_deadline,
+            )
             ai_response = response.text.strip()
             
-            self.history.append({"role": "user", "content": user_input})
-            self.history.append({"role": "ai", "content": ai_response})
+            def record():
+                with conv.lock:
+                    self._record(conv, user_input, ai_response, response)
+            # 요약 접기가 동기 API를 부를 수 있으므로 이벤트 루프 밖에서 기록
+            await asyncio.to_thread(record)
             
+            conv.last_path = "gemini"
             logger.info(f"응답: {ai_response}")
             return ai_response
             
         except Exception as e:
             logger.error(f"응답 생성 실패: {e}")
-            # 429 쿼터 초과 시 데모 응답으로 폴백
-            if "429" in str(e) or "quota" in str(e).lower():
-                logger.warning("API 쿼터 초과 - 데모 모드로 전환")
+            # 재시도로도 턴 마감을 못 지킨 429만 데모 응답으로 폴백
+            if is_rate_limit(e):
+                logger.warning("API 쿼터 초과 - 이번 턴은 데모 응답")
+                conv.last_path = "quota"
                 return self._demo_response(user_input)
-            return "죄송해요, 다시 말씀해 주시겠어요?"
+            conv.last_path = "error"
+            return APOLOGIES[1]
+    
+    def commit(
+        self,
+        user_input: str,
+        reply: str,
+        result: Reply,
+        session_id: str = DEFAULT_SESSION,
+        truncated: bool = False,
+    ):
+        """
+        record=False로 생성한 응답을 확정해 문맥에 기록 (추측 생성이 맞았을 때, 말 끊기 후 말한 데까지)
+        
+        Args:
+            user_input: 사용자 입력
+            reply: 응답 (끊긴 경우 실제로 말한 부분까지)
+            result: 그 생성의 Reply (경로와 토큰 수를 여기서 읽음, 세션 상태는 보지 않음)
+            session_id: 대화 세션 ID
+            truncated: 말 끊기로 응답이 중간에 멈춤
+        """
+        if result.path is None:
+            return
+        conv = self.session(session_id)
+        with conv.lock:
+            if result.path == "intent":
+                conv.context.remember(user_input, reply, truncated)
+            elif result.path == "gemini":
+                self._record(conv, user_input, reply, None if truncated else result.response, truncated)
+            conv.last_path = result.path
+    
+    def _interrupted(
+        self,
+        conv: Conversation,
+        user_input: str,
+        sent: List[str],
+        reason: str,
+        record: bool,
+        result: Reply,
+        response=None,
+    ):
+        """말 끊기로 멈춘 스트리밍 응답을 내보낸 부분까지만 끊김 표시와 함께 기록"""
+        reply = " ".join(sent)
+        result.path, result.text, result.response = "gemini", reply, response
+        logger.info(f"응답 중단 ({reason}): {reply or '(첫 문장 전)'}")
+        if record:
+            with conv.lock:
+                self._record(conv, user_input, reply, truncated=True)
+                conv.last_path = "gemini"
     
     def _demo_response(self, text: str) -> str:
-        """데모 응답 (API 없을 때)"""
-        responses = {
-            "안녕": "안녕하세요 할머니~ 오늘 기분이 어떠세요?",
-            "약": "약 드셨어요? 건강을 위해 꼭 챙겨 드세요~",
-            "밥": "밥 맛있게 드셨군요! 뭐 드셨어요?",
-            "아파": "어머, 어디가 불편하세요? 많이 아프시면 병원에 가보셔야 해요.",
-            "심심": "심심하시면 저랑 이야기해요! 요즘 뭐 하고 지내세요?",
-            "고마": "할머니가 건강하게 지내시는 게 저한테는 가장 큰 선물이에요~",
-            "먹": "맛있게 드셨어요? 잘 드셔야 힘이 나요~",
-        }
-        
-        for keyword, response in responses.items():
-            if keyword in text:
-                return response
-        
-        return "네 할머니, 더 말씀해 주세요~"
-    
-    def get_greeting(self) -> str:
-        """인사말"""
-        return "할머니~ 저 하이예요! 점심 맛있게 드셨어요?"
-    
-    def reset(self):
-        """대화 초기화"""
-        if self.model:
-            self.chat = self.model.start_chat(history=[])
-        self.history.clear()
-        logger.info("대화 초기화됨")
+        """데모 응답 (API 없을 때, 신뢰도와 무관하게 가장 가까운 의도)"""
+        return self.intents.fallback(text, DEMO_DEFAULT)
+    
+    def get_greeting(
+        self,
+        now: Optional[datetime] = None,
+        slot: Optional[str] = None,
+        medications: Optional[Tuple[str, ...]] = None,
+    ) -> str:
+        """
+        인사말 (시간대에 맞게, 복약 알림 전화면 약 이야기로)
+        
+        Args:
+            now: 기준 시각 (None이면 지금)
+            slot: 복약 슬롯 (morning/lunch/evening/bedtime, scheduler가 건 전화)
+            medications: 이번에 드실 약 (있으면 이름을 넣어 말함)
+        """
+        if slot is not None:
+            if medications:
+                meal = {"morning": "아침", "lunch": "점심", "evening": "저녁"}.get(slot)
+                when = f"{meal} 드시고 " if meal else ""
+                return f"할머니~ 저 하이예요! {when}{', '.join(medications)} 챙겨 드셨어요?"
+            if slot in MEDICATION_GREETINGS:
+                return MEDICATION_GREETINGS[slot]
+        hour = (now or datetime.now()).hour
+        return next(text for until, text in GREETINGS if hour < until)
+    
+    def canned_phrases(self) -> List[str]:
+        """미리 정해진 응답 문장 (TTS 캐시 예열용)"""
+        return [*dict.fromkeys(text for _, text in GREETINGS), *MEDICATION_GREETINGS.values(),
+                *self.intents.replies(), DEMO_DEFAULT, *APOLOGIES]
+    
+    def reset(self, session_id: str = DEFAULT_SESSION):
+        """대화 초기화 (해당 세션만 풀에서 제거)"""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+        logger.info(f"대화 초기화됨: {session_id}")
 
 
 # 테스트
@@ -193,7 +698,7 @@ if __name__ == "__main__":
     load_dotenv()
     
     llm = LLM()
-    if llm.chat:
+    if llm.model:
         response = llm.generate("안녕하세요")
         print(f"응답: {response}")
     else:
@@ -2,10 +2,20 @@
 STT.py - Deepgram 기반 음성 인식 모듈
 오디오 바이트 → 텍스트 변환
 """
+import asyncio
+import io
+import json
 import logging
 import os
-from typing import Optional
-from deepgram import DeepgramClient, PrerecordedOptions
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional, AsyncIterator, Dict, List
+from urllib.parse import urlencode
+
+import httpx
+import websockets
+from deepgram import DeepgramClient, DeepgramClientOptions, PrerecordedOptions
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s [STT] %(message)s')
 logger = logging.getLogger(__name__)
@@ -25,26 +35,177 @@ def get_api_key(key_name: str) -> Optional[str]:
     return os.getenv(key_name)
 
 
+# Deepgram REST 기본 주소 (연결 예열 대상)
+DEEPGRAM_API_URL = "https://api.deepgram.com"
+
+
+class PooledTransport(httpx.HTTPTransport):
+    """
+    요청이 끝나도 닫히지 않는 keep-alive 연결 풀
+    
+    Deepgram SDK는 요청마다 `with httpx.Client(transport=...)`를 만들고 나올 때
+    transport를 닫습니다. 여기서는 close/__exit__를 무시해 TCP/TLS 연결을
+    턴과 세션 사이에 재사용하고, 실제 종료는 shutdown()으로만 합니다.
+    """
+    
+    def __init__(
+        self,
+        pool_size: int = 8,
+        keepalive_expiry: float = 60.0,
+        **kwargs,
+    ):
+        """
+        Args:
+            pool_size: 최대 동시 연결 수 (= 유지할 keep-alive 연결 수)
+            keepalive_expiry: 쉬고 있는 연결을 유지할 시간 (초)
+            **kwargs: httpx.HTTPTransport 인자
+        """
+        limits = httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=pool_size,
+            keepalive_expiry=keepalive_expiry,
+        )
+        super().__init__(limits=limits, **kwargs)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "new_connections": 0, "tls_handshakes": 0, "connect_ms": 0.0}
+    
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        inner = request.extensions.get("trace")
+        started: Dict[str, float] = {}
+        
+        def trace(event: str, info: dict):
+            # 새 연결이 열릴 때만 connect_tcp/start_tls 이벤트가 옴
+            now = time.perf_counter()
+            if event.endswith(".started"):
+                started[event] = now
+            elif event == "connection.connect_tcp.complete":
+                with self._lock:
+                    self.stats["new_connections"] += 1
+                    self.stats["connect_ms"] += (now - started.get("connection.connect_tcp.started", now)) * 1000
+            elif event == "connection.start_tls.complete":
+                with self._lock:
+                    self.stats["tls_handshakes"] += 1
+                    self.stats["connect_ms"] += (now - started.get("connection.start_tls.started", now)) * 1000
+            if inner:
+                inner(event, info)
+        
+        request.extensions["trace"] = trace
+        # 요청별 Content-Type (SDK의 headers= 인자는 공용 설정을 바꾸므로 여기서 붙임)
+        content_type = request.extensions.pop("content_type", None)
+        if content_type:
+            request.headers["Content-Type"] = content_type
+        with self._lock:
+            self.stats["requests"] += 1
+        return super().handle_request(request)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        pass
+    
+    def close(self):
+        pass
+    
+    def shutdown(self):
+        """풀의 연결을 실제로 닫음"""
+        super().close()
+    
+    def summary(self) -> Dict:
+        """연결 재사용 통계"""
+        with self._lock:
+            stats = dict(self.stats)
+        requests = stats["requests"]
+        stats["reused"] = max(0, requests - stats["new_connections"])
+        stats["reuse_rate"] = stats["reused"] / requests if requests else 0.0
+        return stats
+
+
 class STT:
     """Deepgram 음성 인식"""
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        client=None,
+        pool_size: int = 8,
+        keepalive_expiry: float = 60.0,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 30.0,
+        url: Optional[str] = None,
+    ):
         """
         Args:
             api_key: Deepgram API 키 (없으면 환경변수/Secrets에서 로드)
+            client: 미리 만든 Deepgram 클라이언트 (벤치마크용 가짜 클라이언트 주입)
+            pool_size: keep-alive 연결 풀 크기 (모든 세션이 공유)
+            keepalive_expiry: 쉬고 있는 연결 유지 시간 (초)
+            connect_timeout: 연결 수립 제한 시간 (초)
+            read_timeout: 응답 대기 제한 시간 (초)
+            url: REST 주소 (None이면 Deepgram 기본 주소, 로컬 가짜 서버로 바꿀 수 있음)
         """
         self.api_key = api_key or get_api_key("DEEPGRAM_API_KEY")
+        self.url = (url or DEEPGRAM_API_URL).rstrip("/")
+        self.transport = PooledTransport(pool_size=pool_size, keepalive_expiry=keepalive_expiry)
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        # 요청마다 같은 옵션이므로 한 번만 생성
+        self.options = PrerecordedOptions(
+            model="nova-2",
+            language="ko",  # 한국어
+            smart_format=True,
+            punctuate=True,
+        )
+        self._rest = None
         
-        if not self.api_key:
+        if client is not None:
+            self.client = client
+        elif not self.api_key:
             logger.warning("DEEPGRAM_API_KEY가 설정되지 않았습니다")
             self.client = None
         else:
             try:
-                self.client = DeepgramClient(self.api_key)
+                self.client = DeepgramClient(self.api_key, DeepgramClientOptions(url=self.url))
                 logger.info("STT 초기화 완료 (Deepgram)")
             except Exception as e:
                 logger.error(f"Deepgram 초기화 실패: {e}")
                 self.client = None
+        
+        if self.client is not None:
+            self._rest = self.client.listen.rest.v("1")
+    
+    def warm_up(self, url: Optional[str] = None, background: bool = False) -> bool:
+        """
+        연결 예열 (시작 시 TCP/TLS 연결을 미리 열어 풀에 넣어 둠)
+        
+        응답 코드와 무관하게 연결만 맺으면 성공입니다.
+        
+        Args:
+            url: 예열할 주소 (None이면 REST 주소)
+            background: True면 백그라운드 스레드에서 실행하고 바로 반환
+        
+        Returns:
+            연결 성공 여부 (background면 항상 True)
+        """
+        if background:
+            threading.Thread(target=self.warm_up, args=(url,), name="stt-warmup", daemon=True).start()
+            return True
+        try:
+            start = time.perf_counter()
+            with httpx.Client(transport=self.transport, timeout=self.timeout) as client:
+                client.head(url or self.url)
+            logger.info(f"Deepgram 연결 예열 완료 ({(time.perf_counter() - start) * 1000:.0f}ms)")
+            return True
+        except httpx.HTTPError as e:
+            logger.warning(f"Deepgram 연결 예열 실패: {e}")
+            return False
+    
+    def connection_stats(self) -> Dict:
+        """연결 재사용 통계 (requests, new_connections, reused, reuse_rate, ...)"""
+        return self.transport.summary()
+    
+    def close(self):
+        """연결 풀 종료"""
+        self.transport.shutdown()
     
     def transcribe(self, audio_data: bytes, mime_type: str = "audio/wav") -> Optional[str]:
         """
@@ -67,20 +228,7 @@ class STT:
         
         try:
             logger.info(f"음성 인식 시작... ({len(audio_data)} bytes)")
-            
-            # Deepgram 옵션 설정
-            options = PrerecordedOptions(
-                model="nova-2",
-                language="ko",  # 한국어
-                smart_format=True,
-                punctuate=True,
-            )
-            
-            # 오디오 소스
-            source = {"buffer": audio_data, "mimetype": mime_type}
-            
-            # 음성 인식 실행
-            response = self.client.listen.rest.v("1").transcribe_file(source, options)
+            response = self.request(audio_data, mime_type)
             
             # 결과 추출
             transcript = response.results.channels[0].alternatives[0].transcript
@@ -96,10 +244,216 @@ class STT:
             logger.error(f"음성 인식 실패: {e}")
             return None
     
+    def request(self, audio_data: bytes, mime_type: str = "audio/wav"):
+        """
+        Deepgram 인식 요청 한 번 (오류를 그대로 올림, 재시도하는 일괄 처리용)
+        
+        Args:
+            audio_data: 오디오 바이트 데이터
+            mime_type: 오디오 MIME 타입
+            
+        Returns:
+            SDK 응답 (results.channels[0].alternatives[0].transcript, metadata.duration)
+        
+        Raises:
+            RuntimeError: 클라이언트가 초기화되지 않음
+            DeepgramApiError, httpx.HTTPError 등: 요청 실패
+        """
+        if not self._rest:
+            raise RuntimeError("STT 클라이언트가 초기화되지 않았습니다")
+        
+        # 오디오 소스 (스트림으로 나눠 전송)
+        source = {"stream": io.BytesIO(audio_data)}
+        
+        # 음성 인식 실행 (SDK가 mimetype을 헤더로 보내지 않으므로 직접 지정)
+        # headers=로 넘기면 SDK가 클라이언트 공용 헤더를 바꿔 동시 요청끼리 섞이므로
+        # 요청 extensions에 실어 PooledTransport가 이 요청에만 붙이게 함
+        # transport를 넘기면 SDK가 요청마다 새 연결 대신 공용 풀을 사용
+        return self._rest.transcribe_file(
+            source, self.options,
+            timeout=self.timeout,
+            transport=self.transport,
+            extensions={"content_type": mime_type},
+        )
+    
     async def transcribe_async(self, audio_data: bytes, mime_type: str = "audio/wav") -> Optional[str]:
-        """비동기 음성 인식"""
-        # 현재는 동기 버전 사용 (Deepgram SDK 호환성)
-        return self.transcribe(audio_data, mime_type)
+        """비동기 음성 인식 (Deepgram SDK가 동기라 스레드에서 실행)"""
+        return await asyncio.to_thread(self.transcribe, audio_data, mime_type)
+
+
+# Deepgram 실시간 인식 엔드포인트
+DEEPGRAM_LISTEN_URL = "wss://api.deepgram.com/v1/listen"
+
+
+@dataclass
+class TranscriptEvent:
+    """실시간 인식 결과"""
+    text: str
+    is_final: bool          # 이 구간의 결과가 확정됨
+    speech_final: bool = False  # 엔드포인팅: 발화가 끝난 것으로 판단됨
+    utterance_end: bool = False  # UtteranceEnd: 단어 사이 공백이 utterance_end_ms를 넘음 (턴 종료)
+
+
+class StreamingSTT:
+    """
+    Deepgram 실시간 음성 인식 (websocket)
+    
+    녹음되는 PCM 프레임을 send()로 바로 보내고, events()로 중간/최종
+    결과를 받습니다. 말하는 동안 인식이 함께 진행됩니다.
+    
+    사용 예:
+        async with StreamingSTT() as stream:
+            await stream.send(pcm_frame)
+            ...
+            await stream.finish()
+            async for event in stream.events():
+                print(event.text, event.is_final)
+    """
+    
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        url: str = DEEPGRAM_LISTEN_URL,
+        sample_rate: int = 16000,
+        channels: int = 1,
+        interim_results: bool = True,
+        endpointing: int = 300,
+        keepalive_interval: float = 5.0,
+        utterance_end_ms: Optional[int] = None,
+    ):
+        """
+        Args:
+            api_key: Deepgram API 키 (없으면 환경변수/Secrets에서 로드)
+            url: websocket 엔드포인트 (로컬 가짜 서버 주소로 바꿀 수 있음)
+            sample_rate: PCM 샘플레이트 (16-bit little-endian)
+            channels: 채널 수
+            interim_results: 중간 결과 수신 여부
+            endpointing: 발화 종료 판단 무음 길이 (ms)
+            keepalive_interval: 오디오가 없을 때 KeepAlive 전송 간격 (초)
+            utterance_end_ms: 턴 종료로 볼 단어 사이 공백 (ms, 1000 이상, interim_results 필요)
+        """
+        self.api_key = api_key or get_api_key("DEEPGRAM_API_KEY")
+        self.url = url
+        self.params = {
+            "model": "nova-2",
+            "language": "ko",
+            "encoding": "linear16",
+            "sample_rate": sample_rate,
+            "channels": channels,
+            "punctuate": "true",
+            "smart_format": "true",
+            "interim_results": "true" if interim_results else "false",
+            "endpointing": endpointing,
+        }
+        if utterance_end_ms:
+            self.params["utterance_end_ms"] = utterance_end_ms
+        self.keepalive_interval = keepalive_interval
+        self.finals: List[str] = []
+        self._ws = None
+        self._events: asyncio.Queue = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+        self._last_send = 0.0
+    
+    async def start(self):
+        """websocket 연결 시작"""
+        headers = {"Authorization": f"Token {self.api_key}"} if self.api_key else {}
+        self._ws = await websockets.connect(
+            f"{self.url}?{urlencode(self.params)}",
+            extra_headers=headers,
+            max_size=None,
+        )
+        self._last_send = asyncio.get_running_loop().time()
+        self._tasks = [
+            asyncio.create_task(self._receive()),
+            asyncio.create_task(self._keepalive()),
+        ]
+        logger.info("실시간 인식 연결됨")
+    
+    async def send(self, pcm: bytes):
+        """PCM 프레임 전송"""
+        if not pcm:
+            return
+        await self._ws.send(pcm)
+        self._last_send = asyncio.get_running_loop().time()
+    
+    async def finish(self):
+        """오디오 전송 종료 (남은 결과는 events()로 계속 수신)"""
+        if self._ws is not None:
+            try:
+                await self._ws.send(json.dumps({"type": "CloseStream"}))
+            except websockets.ConnectionClosed:
+                pass
+    
+    async def close(self):
+        """연결 종료"""
+        for task in self._tasks:
+            task.cancel()
+        if self._ws is not None:
+            await self._ws.close()
+            self._ws = None
+    
+    async def events(self) -> AsyncIterator[TranscriptEvent]:
+        """중간/최종 인식 결과 (연결이 닫히면 종료)"""
+        while True:
+            event = await self._events.get()
+            if event is None:
+                return
+            yield event
+    
+    @property
+    def transcript(self) -> str:
+        """지금까지 확정된 전체 텍스트"""
+        return " ".join(self.finals).strip()
+    
+    async def __aenter__(self):
+        await self.start()
+        return self
+    
+    async def __aexit__(self, *exc):
+        await self.close()
+    
+    async def _receive(self):
+        """서버 메시지 → TranscriptEvent"""
+        try:
+            async for message in self._ws:
+                if isinstance(message, bytes):
+                    continue
+                data = json.loads(message)
+                if data.get("type") == "UtteranceEnd":
+                    self._events.put_nowait(TranscriptEvent("", True, True, utterance_end=True))
+                    continue
+                if data.get("type") != "Results":
+                    continue
+                
+                alternatives = data.get("channel", {}).get("alternatives") or [{}]
+                text = (alternatives[0].get("transcript") or "").strip()
+                event = TranscriptEvent(
+                    text=text,
+                    is_final=bool(data.get("is_final")),
+                    speech_final=bool(data.get("speech_final")),
+                )
+                if event.is_final and text:
+                    self.finals.append(text)
+                    logger.info(f"실시간 인식 (확정): {text}")
+                if text or event.speech_final:
+                    self._events.put_nowait(event)
+        except websockets.ConnectionClosed:
+            pass
+        except Exception as e:
+            logger.error(f"실시간 인식 수신 실패: {e}")
+        finally:
+            self._events.put_nowait(None)
+    
+    async def _keepalive(self):
+        """오디오가 끊긴 동안 연결 유지"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.keepalive_interval)
+            if loop.time() - self._last_send >= self.keepalive_interval:
+                try:
+                    await self._ws.send(json.dumps({"type": "KeepAlive"}))
+                except websockets.ConnectionClosed:
+                    return
 
 
 # 테스트
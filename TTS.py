@@ -4,12 +4,16 @@ TTS.py - Edge TTS 기반 음성 합성 모듈
 """
 import asyncio
 import logging
-import tempfile
-import os
-import platform
-from typing import Optional
+import threading
+from contextlib import nullcontext
+from typing import AsyncContextManager, Callable, Optional, AsyncIterator, Iterable, List, Union
 import edge_tts
 
+from audio_cache import AudioCache
+from codec import SpeechEncoder
+from playback import Clip, PlaybackEngine
+from runtime import CancelToken, get_loop
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s [TTS] %(message)s')
 logger = logging.getLogger(__name__)
 
@@ -24,89 +28,333 @@ VOICES = {
 class TTS:
     """Edge TTS 음성 합성"""
     
-    def __init__(self, voice: str = "female_warm", rate: str = "-5%"):
+    def __init__(
+        self,
+        voice: str = "female_warm",
+        rate: str = "-5%",
+        cache: Optional[AudioCache] = None,
+        communicate=None,
+        output_format: str = "mp3",
+        bitrate: Optional[int] = None,
+    ):
         """
         Args:
             voice: 음성 종류 (female_warm, female_bright, male)
             rate: 말하기 속도 (예: "-10%", "+5%")
+            cache: 합성 결과 캐시 (None이면 매번 Edge TTS 호출)
+            communicate: edge_tts.Communicate 대체 클래스 (벤치마크용 가짜 합성기 주입)
+            output_format: 출력 형식 (mp3, opus: 브라우저용 저비트레이트, pcm: 로컬 재생)
+            bitrate: 출력 비트레이트 (kbps, None이면 mp3는 Edge TTS 원본 그대로, opus는 24)
         """
         self.voice = VOICES.get(voice, VOICES["female_warm"])
         self.rate = rate
+        self.cache = cache
+        # Edge TTS는 24kHz 48kbps MP3만 주므로 다른 형식은 받은 뒤 변환
+        self.encoder = SpeechEncoder(output_format, bitrate)
+        self._communicate = communicate or edge_tts.Communicate
         self.is_speaking = False
+        self._playback: Optional[PlaybackEngine] = None
+        self._playback_lock = threading.Lock()
         
-        logger.info(f"TTS 초기화 완료 (voice: {self.voice}, rate: {self.rate})")
+        logger.info(f"TTS 초기화 완료 (voice: {self.voice}, rate: {self.rate}, "
+                    f"format: {self.encoder.output_format} {self.encoder.bitrate or ''})")
+
+    @property
+    def mime_type(self) -> str:
+        """합성 결과 MIME 타입 (전달 경로의 Content-Type, <source type>)"""
+        return self.encoder.mime_type
+
+    @property
+    def concatenable(self) -> bool:
+        """문장별 오디오를 이어 붙여 한 스트림으로 재생할 수 있는지 (MP3만)"""
+        return self.encoder.concatenable
     
-    async def synthesize(self, text: str) -> Optional[bytes]:
+    async def synthesize(
+        self,
+        text: str,
+        cancel: Optional[CancelToken] = None,
+        slot: Optional[Callable[[], AsyncContextManager]] = None,
+    ) -> Optional[bytes]:
         """
-        텍스트를 음성으로 변환
+        텍스트를 음성으로 변환 (synthesize_stream의 청크를 한 번에 이어 붙임)
         
         Args:
             text: 합성할 텍스트
+            cancel: 취소 신호 (취소되면 받던 스트림을 버리고 None, 캐시에도 넣지 않음)
+            slot: Edge TTS 동시 요청 자리 (캐시에 없을 때만 잡음, dispatcher.slot 등)
             
         Returns:
-            MP3 오디오 바이트 데이터
+            오디오 바이트 데이터 (output_format 형식)
         """
-        if not text or not text.strip():
+        parts: List[bytes] = []
+        try:
+            async for chunk in self._stream(text, cancel, slot):
+                parts.append(chunk)
+        except Exception as e:
+            logger.error(f"음성 합성 실패: {e}")
+            return None
+        if cancel is not None and cancel.cancelled:
             return None
+        return b"".join(parts) or None
+    
+    async def synthesize_stream(
+        self,
+        text: str,
+        cancel: Optional[CancelToken] = None,
+        slot: Optional[Callable[[], AsyncContextManager]] = None,
+        max_buffer: int = 32,
+    ) -> AsyncIterator[bytes]:
+        """
+        Edge TTS가 내보내는 대로 오디오 청크를 yield (첫 청크부터 전달/재생 시작 가능)
         
+        받는 쪽보다 앞서 받아 둘 청크는 max_buffer개까지이고, 그 이상이면
+        Edge TTS 스트림 읽기를 멈춥니다 (느린 소비자가 메모리를 채우지 않음).
+        다 받으면 캐시에 넣고, 중간에 실패하거나 취소되면 조용히 끝납니다
+        (받는 쪽은 그때까지 받은 청크만 가짐).
+        
+        출력 형식이 원본 MP3가 아니면 (opus, pcm, 비트레이트 지정) 전체를 받아
+        변환해야 하므로 변환된 오디오 한 청크만 나옵니다.
+        
+        Args:
+            text: 합성할 텍스트
+            cancel: 취소 신호
+            slot: Edge TTS 동시 요청 자리 (synthesize 참고)
+            max_buffer: 미리 받아 둘 최대 청크 수
+        """
         try:
-            logger.info(f"음성 합성 시작: {text[:30]}...")
-            
-            communicate = edge_tts.Communicate(
-                text=text.strip(),
-                voice=self.voice,
-                rate=self.rate,
-            )
-            
-            # 메모리에 오디오 저장
-            audio_data = b""
-            async for chunk in communicate.stream():
-                if chunk["type"] == "audio":
-                    audio_data += chunk["data"]
-            
-            logger.info(f"음성 합성 완료: {len(audio_data)} bytes")
-            return audio_data
-            
+            async for chunk in self._stream(text, cancel, slot, max_buffer):
+                yield chunk
         except Exception as e:
             logger.error(f"음성 합성 실패: {e}")
-            return None
+    
+    async def _stream(
+        self,
+        text: str,
+        cancel: Optional[CancelToken],
+        slot: Optional[Callable[[], AsyncContextManager]],
+        max_buffer: int = 32,
+    ) -> AsyncIterator[bytes]:
+        """캐시 → Edge TTS 스트림 → (필요하면) 형식 변환 → 캐시 저장 (실패하면 예외)"""
+        if not text or not text.strip():
+            return
+        
+        key = None
+        if self.cache:
+            key = self.cache.make_key(text, self.voice, self.rate, self.encoder.key)
+            cached = self.cache.get(key)
+            if cached:
+                logger.info(f"캐시 적중: {text[:30]}...")
+                yield cached
+                return
+        
+        parts: List[bytes] = []
+        async for chunk in self._edge_stream(text, cancel, slot, max_buffer):
+            parts.append(chunk)
+            if self.encoder.passthrough:
+                yield chunk
+        if cancel is not None and cancel.cancelled:
+            logger.info(f"음성 합성 취소 ({cancel.reason}): {text[:30]}...")
+            return
+        if not parts:
+            return
+        
+        # 청크 목록을 한 번만 이어 붙임 (캐시/변환/통계용)
+        audio_data = b"".join(parts)
+        if self.encoder.passthrough:
+            # 통계만 (크기로 길이 계산, 디코딩 없이 바로 끝나므로 루프에서 불러도 됨)
+            self.encoder.encode(audio_data)
+        else:
+            audio_data = await asyncio.to_thread(self.encoder.encode, audio_data)
+            if audio_data is None:
+                raise RuntimeError(f"{self.encoder.output_format} 변환 실패")
+            yield audio_data
+        logger.info(f"음성 합성 완료: {len(audio_data)} bytes")
+        if key:
+            self.cache.put(key, audio_data)
+    
+    async def _edge_stream(
+        self,
+        text: str,
+        cancel: Optional[CancelToken],
+        slot: Optional[Callable[[], AsyncContextManager]],
+        max_buffer: int,
+    ) -> AsyncIterator[bytes]:
+        """Edge TTS 오디오 청크 (읽기는 별도 태스크, 대기열이 차면 읽기를 멈춤)"""
+        buffer: asyncio.Queue = asyncio.Queue(maxsize=max(1, max_buffer))
+        done = object()
+        
+        async def read():
+            async with (slot() if slot else nullcontext()):
+                if cancel is not None and cancel.cancelled:
+                    return
+                logger.info(f"음성 합성 시작: {text[:30]}...")
+                communicate = self._communicate(
+                    text=text.strip(),
+                    voice=self.voice,
+                    rate=self.rate,
+                )
+                async for chunk in communicate.stream():
+                    if cancel is not None and cancel.cancelled:
+                        return
+                    if chunk["type"] == "audio":
+                        await buffer.put(chunk["data"])
+        
+        async def produce():
+            # 취소(소비자가 그만둠)면 아무것도 넣지 않고 끝남
+            try:
+                await read()
+            except Exception as e:
+                await buffer.put(e)
+            else:
+                await buffer.put(done)
+        
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                item = await buffer.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # 소비자가 중간에 그만두면 Edge TTS 연결도 바로 닫음
+            producer.cancel()
+    
+    async def prewarm(self, texts: Iterable[str], concurrency: int = 4) -> int:
+        """
+        자주 쓰는 문장을 미리 합성해 캐시에 채움 (인사말, 데모 응답 등)
+        
+        Args:
+            texts: 미리 합성할 문장들
+            concurrency: 동시에 합성할 최대 개수
+            
+        Returns:
+            새로 합성한 문장 수
+        """
+        if not self.cache:
+            return 0
+        
+        missing = []
+        for text in dict.fromkeys(t.strip() for t in texts if t and t.strip()):
+            if self.cache.make_key(text, self.voice, self.rate, self.encoder.key) not in self.cache:
+                missing.append(text)
+        
+        limit = asyncio.Semaphore(max(1, concurrency))
+        
+        async def warm(text):
+            async with limit:
+                return await self.synthesize(text)
+        
+        results = await asyncio.gather(*(warm(t) for t in missing))
+        warmed = sum(1 for audio in results if audio)
+        logger.info(f"캐시 예열 완료: {warmed}/{len(missing)}개 합성")
+        return warmed
+    
+    async def synthesize_chunks(
+        self,
+        chunks: Union[Iterable[str], AsyncIterator[str]],
+        prefetch: int = 2,
+        cancel: Optional[CancelToken] = None,
+        slot: Optional[Callable[[], AsyncContextManager]] = None,
+    ) -> AsyncIterator[bytes]:
+        """
+        텍스트 청크를 도착하는 대로 합성해 순서대로 yield
+        
+        LLM 스트리밍과 겹쳐 돌도록, 다음 청크를 기다리는 동안 앞 청크의
+        합성이 진행됩니다. 동시에 합성 중인 청크는 (yield 차례를 기다리는 청크 포함)
+        prefetch개로 제한합니다.
+        
+        Args:
+            chunks: 텍스트 청크 (동기 이터레이터면 스레드에서 순회)
+            prefetch: 동시에 합성할 최대 청크 수 (1이면 한 청크씩 차례로)
+            cancel: 취소 신호 (취소되면 대기 중인 합성을 모두 버리고 바로 끝냄)
+            slot: 청크별 합성에 쓸 동시 요청 자리 (synthesize 참고)
+            
+        Yields:
+            청크별 오디오 바이트 (output_format 형식, 재생 순서대로)
+        """
+        pending: asyncio.Queue = asyncio.Queue()
+        slots = asyncio.Semaphore(max(1, prefetch))
+        
+        async def produce():
+            source = _iterate(chunks)
+            try:
+                async for text in source:
+                    await slots.acquire()
+                    if cancel is not None and cancel.cancelled:
+                        break
+                    pending.put_nowait(asyncio.create_task(self.synthesize(text, cancel, slot)))
+            finally:
+                pending.put_nowait(None)
+                await source.aclose()
+        
+        producer = asyncio.create_task(produce())
+        # 취소되면 합성 완료를 기다리지 않고 바로 깨어나도록
+        cancelled = asyncio.ensure_future(cancel.wait()) if cancel is not None else None
+        try:
+            while True:
+                task = await pending.get()
+                if task is None:
+                    break
+                if cancelled is not None:
+                    await asyncio.wait({task, cancelled}, return_when=asyncio.FIRST_COMPLETED)
+                    if cancelled.done():
+                        task.cancel()
+                        break
+                audio = await task
+                slots.release()
+                if audio:
+                    yield audio
+                if cancel is not None and cancel.cancelled:
+                    break
+            if cancel is None or not cancel.cancelled:
+                await producer
+        finally:
+            if cancelled is not None:
+                cancelled.cancel()
+            producer.cancel()
+            while not pending.empty():
+                task = pending.get_nowait()
+                if task is not None:
+                    task.cancel()
     
     def synthesize_sync(self, text: str) -> Optional[bytes]:
-        """동기 음성 합성"""
-        return asyncio.run(self.synthesize(text))
+        """동기 음성 합성 (공용 백그라운드 루프에서 실행)"""
+        return get_loop().run(self.synthesize(text))
     
-    def play_audio(self, audio_data: bytes) -> bool:
+    @property
+    def playback(self) -> PlaybackEngine:
+        """로컬 재생 엔진 (처음 재생할 때 플레이어를 띄우고 계속 씀)"""
+        with self._playback_lock:
+            if self._playback is None:
+                self._playback = PlaybackEngine()
+            return self._playback
+
+    def play_audio(self, audio_data: bytes, cancel: Optional[CancelToken] = None) -> bool:
         """
-        오디오 재생
+        오디오 재생 (재생이 끝날 때까지 대기)
         
         Args:
-            audio_data: MP3 오디오 바이트
+            audio_data: 오디오 바이트 (output_format 형식)
+            cancel: 취소 신호 (취소되면 재생 중인 소리를 바로 멈춤)
             
         Returns:
-            재생 성공 여부
+            재생 성공 여부 (중간에 멈추면 False)
         """
-        if not audio_data:
+        if not audio_data or (cancel is not None and cancel.cancelled):
             return False
         
         self.is_speaking = True
-        temp_file = None
+        # 이 재생 동안만 취소에 반응 (끝나면 해제해 오래 쓰는 토큰이 나중에 다른 재생을 멈추지 않게)
+        stop = self.stop
+        if cancel is not None:
+            cancel.on_cancel(stop)
         
         try:
-            # 임시 파일로 저장
-            with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as f:
-                f.write(audio_data)
-                temp_file = f.name
-            
-            # OS별 재생
-            system = platform.system()
-            
-            if system == "Windows":
-                self._play_windows(temp_file)
-            elif system == "Darwin":
-                self._play_macos(temp_file)
-            else:
-                self._play_linux(temp_file)
-            
+            if not self.playback.play(audio_data):
+                logger.info("오디오 재생 중단")
+                return False
             logger.info("오디오 재생 완료")
             return True
             
@@ -115,53 +363,55 @@ class TTS:
             return False
             
         finally:
-            self.is_speaking = False
-            # 임시 파일 정리
-            if temp_file and os.path.exists(temp_file):
-                try:
-                    os.unlink(temp_file)
-                except OSError:
-                    pass
-    
-    def _play_windows(self, filepath: str):
-        """Windows에서 재생"""
-        try:
-            # Windows Media Player API 사용
-            from ctypes import windll
-            windll.winmm.mciSendStringW(f'open "{filepath}" type mpegvideo alias audio', None, 0, 0)
-            windll.winmm.mciSendStringW('play audio wait', None, 0, 0)
-            windll.winmm.mciSendStringW('close audio', None, 0, 0)
-        except Exception as e:
-            logger.warning(f"MCI 재생 실패, 대체 방법 시도: {e}")
-            # 대체: 기본 앱으로 열기
-            os.startfile(filepath)
-            import time
-            time.sleep(3)
-    
-    def _play_macos(self, filepath: str):
-        """macOS에서 재생"""
-        import subprocess
-        subprocess.run(["afplay", filepath], check=True)
+            if cancel is not None:
+                cancel.remove_callback(stop)
+            self.is_speaking = self._playback is not None and self._playback.busy
     
-    def _play_linux(self, filepath: str):
-        """Linux에서 재생"""
-        import subprocess
-        # mpg123 또는 ffplay 사용
-        try:
-            subprocess.run(["mpg123", "-q", filepath], check=True)
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            subprocess.run(["ffplay", "-nodisp", "-autoexit", filepath], check=True)
+    def enqueue_audio(self, audio_data: bytes) -> Optional[Clip]:
+        """
+        재생 대기열에 추가하고 바로 반환 (문장별 청크를 끊김 없이 이어서 재생)
+        
+        Returns:
+            대기열 항목 (tts.playback.wait(clip)으로 재생 끝까지 대기), 빈 오디오면 None
+        """
+        if not audio_data:
+            return None
+        self.is_speaking = True
+        return self.playback.enqueue(audio_data)
     
     def stop(self):
-        """재생 중지"""
+        """재생 중지 (말 끊기: 대기열을 비우고 나오던 소리도 바로 멈춤)"""
         self.is_speaking = False
-        if platform.system() == "Windows":
-            try:
-                from ctypes import windll
-                windll.winmm.mciSendStringW('stop audio', None, 0, 0)
-                windll.winmm.mciSendStringW('close audio', None, 0, 0)
-            except Exception:
-                pass
+        if self._playback is not None:
+            self._playback.stop()
+
+async def _iterate(chunks: Union[Iterable[str], AsyncIterator[str]]) -> AsyncIterator[str]:
+    """동기/비동기 이터러블을 비동기로 순회 (동기 쪽은 스레드에서 next 호출)"""
+    if hasattr(chunks, "__aiter__"):
+        async for chunk in chunks:
+            yield chunk
+        return
+    
+    iterator = iter(chunks)
+    done = object()
+    loop = asyncio.get_running_loop()
+    step = None
+    try:
+        while True:
+            # 취소돼도 진행 중인 next()는 스레드에서 끝까지 돌므로 shield로 붙잡아 둠
+            step = asyncio.ensure_future(asyncio.to_thread(next, iterator, done))
+            chunk = await asyncio.shield(step)
+            if chunk is done:
+                break
+            yield chunk
+    finally:
+        # 중간에 멈추면 생성기를 닫아 finally(끊김 기록 등)가 돌게 함
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            if step is not None and not step.done():
+                step.add_done_callback(lambda _: loop.run_in_executor(None, close))
+            else:
+                loop.run_in_executor(None, close)
 
 
 # 테스트
@@ -170,8 +420,8 @@ if __name__ == "__main__":
     
     async def test():
         tts = TTS()
-        audio = await tts.synthesize("안녕하세요 할머니, 저는 하이예요!")
-        if audio:
-            tts.play_audio(audio)
+        async for audio in tts.synthesize_chunks(["안녕하세요 할머니, ", "저는 하이예요!"]):
+            tts.enqueue_audio(audio)
+        tts.playback.drain()
     
     asyncio.run(test())
\ No newline at end of file
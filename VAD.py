@@ -0,0 +1,148 @@
+"""
+VAD.py - 음성 구간 검출 (에너지 + 영교차율)
+STT 업로드 전에 앞뒤 무음을 잘라내고, 말소리가 없는 녹음은 버림
+"""
+import io
+import logging
+import wave
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [VAD] %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class VAD:
+    """프레임 단위 에너지/영교차율 기반 음성 구간 검출"""
+
+    def __init__(
+        self,
+        frame_ms: int = 20,
+        margin_db: float = 12.0,
+        min_energy_db: float = -50.0,
+        max_noise_db: float = -50.0,
+        zcr_max: float = 0.35,
+        min_speech_ms: int = 200,
+        padding_ms: int = 200,
+    ):
+        """
+        Args:
+            frame_ms: 분석 프레임 길이 (ms)
+            margin_db: 배경 소음 대비 이만큼 크면 음성 후보
+            min_energy_db: 절대 최소 에너지 (dBFS, 아주 조용한 녹음 대비)
+            max_noise_db: 배경 소음 추정 상한 (dBFS, 처음부터 끝까지 말한 녹음에서
+                조용한 말소리를 소음으로 보고 잘라내지 않도록)
+            zcr_max: 이보다 영교차율이 높으면 잡음으로 간주 (에너지가 충분히 크면 예외)
+            min_speech_ms: 음성 프레임 합계가 이보다 짧으면 말소리 없음으로 판단
+            padding_ms: 잘라낸 구간 앞뒤로 남길 여유 (말끝 잘림 방지)
+        """
+        self.frame_ms = frame_ms
+        self.margin_db = margin_db
+        self.min_energy_db = min_energy_db
+        self.max_noise_db = max_noise_db
+        self.zcr_max = zcr_max
+        self.min_speech_ms = min_speech_ms
+        self.padding_ms = padding_ms
+        self.stats: Dict[str, int] = {"clips": 0, "dropped": 0, "bytes_in": 0, "bytes_out": 0}
+
+    def detect(self, samples: np.ndarray, sample_rate: int) -> Optional[Tuple[int, int]]:
+        """
+        음성 구간 검출
+
+        Args:
+            samples: 모노 float 샘플 (-1.0 ~ 1.0)
+            sample_rate: 샘플레이트
+
+        Returns:
+            (시작 샘플, 끝 샘플) 또는 말소리가 없으면 None
+        """
+        frame_len = max(1, sample_rate * self.frame_ms // 1000)
+        n_frames = len(samples) // frame_len
+        if n_frames == 0:
+            return None
+
+        frames = samples[:n_frames * frame_len].reshape(n_frames, frame_len)
+
+        # 프레임별 에너지(dBFS)와 영교차율
+        energy_db = 10.0 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+        signs = np.signbit(frames)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / frame_len
+
+        min_frames = max(1, self.min_speech_ms // self.frame_ms)
+        low, high = np.percentile(energy_db, [10, 90])
+        if high - low < self.margin_db:
+            # 조용한 구간과 큰 구간의 차이가 없음 = 전부 말소리이거나 전부 무음 → 자르지 않음
+            speech = (energy_db > self.min_energy_db) & (zcr < self.zcr_max)
+            return (0, len(samples)) if np.count_nonzero(speech) >= min_frames else None
+
+        # 배경 소음 = 하위 10% 에너지 (끝까지 말한 녹음이면 하위 10%도 말소리이므로 상한을 둠)
+        noise_floor = min(low, self.max_noise_db)
+        threshold = max(noise_floor + self.margin_db, self.min_energy_db)
+        speech = (energy_db > threshold) & ((zcr < self.zcr_max) | (energy_db > threshold + 10.0))
+
+        if np.count_nonzero(speech) < min_frames:
+            return None
+
+        idx = np.flatnonzero(speech)
+        pad = self.padding_ms // self.frame_ms
+        first = max(0, idx[0] - pad)
+        last = min(n_frames, idx[-1] + 1 + pad)
+        end = len(samples) if last == n_frames else last * frame_len
+        return first * frame_len, end
+
+    def trim(self, wav_bytes: bytes) -> Optional[bytes]:
+        """
+        WAV 앞뒤 무음 제거
+
+        Args:
+            wav_bytes: 16-bit PCM WAV (audio_recorder 출력)
+
+        Returns:
+            잘라낸 WAV 바이트, 말소리가 없으면 None
+            (WAV가 아니거나 16-bit가 아니면 원본 그대로)
+        """
+        self.stats["clips"] += 1
+        self.stats["bytes_in"] += len(wav_bytes)
+
+        try:
+            with wave.open(io.BytesIO(wav_bytes), "rb") as wf:
+                params = wf.getparams()
+                pcm = wf.readframes(params.nframes)
+        except (wave.Error, EOFError) as e:
+            logger.warning(f"WAV 해석 실패, 원본 사용: {e}")
+            self.stats["bytes_out"] += len(wav_bytes)
+            return wav_bytes
+
+        if params.sampwidth != 2:
+            self.stats["bytes_out"] += len(wav_bytes)
+            return wav_bytes
+
+        data = np.frombuffer(pcm, dtype="<i2")
+        channels = params.nchannels
+        if channels > 1:
+            data = data[:len(data) // channels * channels].reshape(-1, channels)
+            mono = data.mean(axis=1) / 32768.0
+        else:
+            mono = data / 32768.0
+
+        span = self.detect(mono.astype(np.float32), params.framerate)
+        if span is None:
+            self.stats["dropped"] += 1
+            logger.info(f"말소리 없음, 업로드 생략 ({len(wav_bytes)} bytes)")
+            return None
+
+        start, end = span
+        trimmed = data[start:end]
+
+        out = io.BytesIO()
+        with wave.open(out, "wb") as wf:
+            wf.setnchannels(channels)
+            wf.setsampwidth(2)
+            wf.setframerate(params.framerate)
+            wf.writeframes(trimmed.astype("<i2").tobytes())
+        result = out.getvalue()
+
+        self.stats["bytes_out"] += len(result)
+        logger.info(f"무음 제거: {len(wav_bytes)} → {len(result)} bytes")
+        return result
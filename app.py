@@ -3,24 +3,36 @@ app.py - Haii-Call 음성 대화 앱
 Deepgram STT + Edge TTS
 """
 import streamlit as st
-import asyncio
-import sys
+import streamlit.components.v1 as components
+import os
 import time
+import uuid
 import base64
+from contextlib import contextmanager
 from html import escape
 from dotenv import load_dotenv
 
-# Windows 이벤트 루프 정책
-if sys.platform == "win32":
-    asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
-
 from audio_recorder_streamlit import audio_recorder
 from STT import STT
 from LLM import LLM
 from TTS import TTS
+from VAD import VAD
+from codec import AudioEncoder, CONCATENABLE
+from audio_cache import AudioCache
+from pipeline import PipelineRunner, Turn
+from media import MediaServer
+from metrics import MetricsRegistry, TraceLog
+from runtime import get_loop
+from dispatcher import dispatcher_from_env
+from call_server import CallClient
+from transcript_store import TranscriptStore
+from scheduler import CallScheduler, Timetable, DEFAULT_DOSES, load_timetables
 
 load_dotenv()
 
+# 통화 서버 주소 (설정하면 이 앱은 화면/재생만 하는 얇은 클라이언트)
+CALL_SERVER_URL = os.getenv("CALL_SERVER_URL")
+
 # ═══════════════════════════════════════════════════════════════════════════
 # 페이지 설정
 # ═══════════════════════════════════════════════════════════════════════════
@@ -178,14 +190,20 @@ if 'state' not in st.session_state:
     st.session_state.state = 'idle'
 if 'messages' not in st.session_state:
     st.session_state.messages = []
+if 'chat_html' not in st.session_state:
+    st.session_state.chat_html = []   # 메시지별 말풍선 HTML (새 메시지만 만들어 덧붙임)
 if 'start_time' not in st.session_state:
     st.session_state.start_time = None
 if 'last_audio' not in st.session_state:
     st.session_state.last_audio = None
-if 'tts_audio' not in st.session_state:
-    st.session_state.tts_audio = None
+if 'tts_src' not in st.session_state:
+    st.session_state.tts_src = None
 if 'tts_key' not in st.session_state:
     st.session_state.tts_key = 0
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+if 'speaking' not in st.session_state:
+    st.session_state.speaking = None   # 지금 말하고 있는 턴 (말 끊기용)
 
 # ═══════════════════════════════════════════════════════════════════════════
 # 모듈 로드
@@ -193,9 +211,13 @@ if 'tts_key' not in st.session_state:
 @st.cache_resource(show_spinner=False)
 def get_stt():
     try:
-        return STT()
+        stt = STT()
     except:
         return None
+    # 첫 발화 전에 Deepgram 연결을 미리 열어 둠 (페이지 로딩은 막지 않음)
+    if stt.client:
+        stt.warm_up(background=True)
+    return stt
 
 @st.cache_resource(show_spinner=False)
 def get_llm():
@@ -207,40 +229,382 @@ def get_llm():
 @st.cache_resource(show_spinner=False)
 def get_tts():
     try:
-        return TTS(voice="female_warm", rate="-5%")
+        tts = TTS(voice="female_warm", rate="-5%", cache=AudioCache(),
+                  output_format=os.getenv("TTS_FORMAT", "mp3"), bitrate=int(os.getenv("TTS_BITRATE", "0")) or None)
     except:
         return None
+    # 인사말/데모 응답 미리 합성 (쿼터 폴백 중에도 바로 말할 수 있게)
+    llm = get_llm()
+    if llm:
+        # 첫 화면을 막지 않도록 백그라운드 루프에 넣고 기다리지 않음 (끝나기 전 요청은 그냥 합성)
+        future = get_loop().submit(tts.prewarm(llm.canned_phrases()))
+        future.add_done_callback(
+            lambda f: not f.cancelled() and f.exception() and print(f"TTS 예열 오류: {f.exception()}"))
+    return tts
+
+@st.cache_resource(show_spinner=False)
+def get_metrics():
+    return MetricsRegistry()
+
+@st.cache_resource(show_spinner=False)
+def get_pipeline():
+    return PipelineRunner(get_stt(), get_llm(), get_tts(), vad=VAD(),
+                          encoder=AudioEncoder(os.getenv("STT_CODEC", "flac")),
+                          metrics=get_metrics(),
+                          trace_log=TraceLog(os.getenv("TRACE_LOG", "logs/turns.jsonl")),
+                          dispatcher=dispatcher_from_env(get_metrics()))
+
+@st.cache_resource(show_spinner=False)
+def get_media():
+    """미디어 서버 (/metrics, MEDIA_PUBLIC_URL이 있으면 오디오 URL 전달도)"""
+    try:
+        return MediaServer(port=int(os.getenv("MEDIA_PORT", "8502")), metrics=get_metrics())
+    except OSError as e:
+        print(f"미디어 서버 시작 실패, data URI 사용: {e}")
+        return None
+
+def media_urls():
+    """오디오를 URL로 줄 미디어 서버 (MEDIA_PUBLIC_URL이 없으면 None → data URI)"""
+    media = get_media()
+    return media if media and media.public else None
+
+@st.cache_resource(show_spinner=False)
+def get_store():
+    """통화 기록 저장소 (열지 못하면 기록 없이 진행)"""
+    try:
+        return TranscriptStore(os.getenv("TRANSCRIPT_DB", "data/transcripts.db"))
+    except Exception as e:
+        print(f"통화 기록 저장소 오류: {e}")
+        return None
+
+@st.cache_resource(show_spinner=False)
+def get_scheduler():
+    """복약 알림 스케줄러 (SCHEDULE_FILE의 시간표 + ELDER_ID는 없으면 기본 시간표)"""
+    scheduler = CallScheduler(spread=float(os.getenv("SCHEDULE_SPREAD", "600")))
+    path = os.getenv("SCHEDULE_FILE", "data/schedule.json")
+    if os.path.exists(path):
+        try:
+            for eid, timetable in load_timetables(path).items():
+                scheduler.add(eid, timetable)
+        except Exception as e:
+            print(f"복약 시간표 오류: {e}")
+    # 시간표 등록은 설정으로만 (주소의 ?elder=... 로는 등록하지 않음)
+    eid = os.getenv("ELDER_ID", "default")
+    if scheduler.next_call(eid) is None:
+        scheduler.add(eid, Timetable.of(DEFAULT_DOSES))
+    get_loop().submit(scheduler.run())
+    return scheduler
 
 # ═══════════════════════════════════════════════════════════════════════════
 # 유틸리티
 # ═══════════════════════════════════════════════════════════════════════════
+def elder_id():
+    """통화 기록에 남길 어르신 ID (?elder=... 또는 ELDER_ID)"""
+    return st.query_params.get("elder") or os.getenv("ELDER_ID", "default")
+
+def start_call():
+    """통화 기록 시작 (통화 서버를 쓰면 서버가 기록)"""
+    store = get_store()
+    if store and not CALL_SERVER_URL:
+        st.session_state.call_id = store.start_call(elder_id(), session_id=st.session_state.session_id)
+
+def save_turn(user_text, reply, trace=None):
+    """턴을 통화 기록에 (대기열에 넣기만 하고 쓰기는 백그라운드에서 모아서)"""
+    store = get_store()
+    call_id = st.session_state.get('call_id')
+    if store and call_id and (user_text or reply):
+        store.record_turn(call_id, user_text, reply, trace)
+
 def get_time():
     if st.session_state.start_time:
         s = int(time.time() - st.session_state.start_time)
         return f"{s//60:02d}:{s%60:02d}"
     return "00:00"
 
+def get_call(greeting=False):
+    """이 세션의 통화 서버 연결 (끊겼으면 다시 연결)"""
+    call = st.session_state.get('call')
+    if call is None or call.closed:
+        call = CallClient(CALL_SERVER_URL, st.session_state.session_id, greeting=greeting, elder_id=elder_id())
+        get_loop().run(call.connect(), timeout=10)
+        st.session_state.call = call
+    return call
+
 def reset():
+    if st.session_state.speaking is not None:
+        interrupt("stop")
+    call = st.session_state.pop('call', None)
+    if call is not None:
+        # 대화 문맥은 서버에 있으므로 새 세션 ID로 다음 통화를 시작
+        get_loop().run(call.close())
+        st.session_state.session_id = uuid.uuid4().hex
+    call_id = st.session_state.pop('call_id', None)
+    if call_id is not None:
+        get_store().end_call(call_id)
     llm = get_llm()
-    if llm: llm.reset()
+    if llm: llm.reset(st.session_state.session_id)
     st.session_state.state = 'idle'
+    st.session_state.pop('scheduled', None)
     st.session_state.messages = []
+    st.session_state.chat_html = []
     st.session_state.start_time = None
     st.session_state.last_audio = None
-    st.session_state.tts_audio = None
+    st.session_state.tts_src = None
+
+def audio_mime():
+    """합성 오디오 MIME 타입 (통화 서버를 쓰면 서버가 알려 준 형식)"""
+    call = st.session_state.get('call')
+    if CALL_SERVER_URL and call is not None:
+        return call.audio_mime
+    tts = get_tts()
+    return tts.mime_type if tts else "audio/mpeg"
+
+def audio_src(audio):
+    """오디오 참조 URL (공개 미디어 주소가 없으면 data URI)"""
+    media = media_urls()
+    mime = audio_mime()
+    if media:
+        return media.url_for(media.store.put(audio, mime))
+    return f"data:{mime};base64,{base64.b64encode(audio).decode()}"
 
 def synthesize_and_play(text):
     """TTS 합성 후 재생 준비"""
-    tts = get_tts()
-    if tts and text:
+    media = media_urls()
+    if text and media and audio_mime() in CONCATENABLE:
+        # 합성은 루프에서 계속하고 주소부터 내보냄 → 브라우저가 첫 청크부터 받아 재생
+        media_id = media.store.create(audio_mime())
+        pipeline = get_pipeline()
+
+        async def fill():
+            try:
+                async for chunk in pipeline.speak_stream(text):
+                    media.store.append(media_id, chunk)
+            finally:
+                media.store.finish(media_id)
+
+        get_loop().submit(fill())
+        st.session_state.tts_src = media.url_for(media_id)
+        st.session_state.tts_key += 1
+    elif text:
         try:
-            audio = asyncio.run(tts.synthesize(text))
+            audio = get_pipeline().speak_sync(text)
             if audio:
-                st.session_state.tts_audio = audio
+                st.session_state.tts_src = audio_src(audio)
                 st.session_state.tts_key += 1
         except Exception as e:
             print(f"TTS 오류: {e}")
 
+# 청크 오디오 순차 재생: 부모 문서에 tts-<turn>-<n> 요소가 붙는 대로 이어서 재생
+AUDIO_QUEUE_JS = """
+<script>
+(function() {
+    var doc = window.parent.document;
+    var turn = "__TURN__";
+    var idx = 0, playing = false, blocked = false;
+    function next() {
+        if (playing || blocked) return;
+        var el = doc.getElementById("tts-" + turn + "-" + idx);
+        if (!el) return;
+        playing = true;
+        el.onended = function() { playing = false; idx++; next(); };
+        el.play().catch(function(e) {
+            console.log("Autoplay blocked:", e);
+            blocked = true;
+        });
+    }
+    new MutationObserver(next).observe(doc.body, {childList: true, subtree: true});
+    next();
+})();
+</script>
+"""
+
+def interrupt(reason="stop"):
+    """
+    말하고 있는 응답 끊기 (정지 버튼, 말하는 중에 새로 녹음)
+
+    응답이 나가는 동안 rerun이 일어나면 이전 실행은 다음 화면 갱신에서 멈추고,
+    백그라운드 생성/합성은 여기서 취소합니다. 말한 데까지만 대화창에 남깁니다.
+    """
+    turn = st.session_state.speaking
+    st.session_state.speaking = None
+    st.session_state.tts_src = None
+    if turn is None:
+        return
+    if isinstance(turn, CallClient):
+        get_loop().run(turn.stop())
+    else:
+        get_pipeline().interrupt(turn, reason)
+        save_turn(turn.user_text, turn.spoken_reply, turn.trace.finish() if turn.trace else None)
+    if turn.spoken_reply:
+        add_message('ai', turn.spoken_reply, truncated=True)
+    st.session_state.stop_audio = True
+
+# 재생 중인 응답 오디오 즉시 정지 (이전 실행의 오디오 요소는 이번 실행이 끝날 때까지 남아 있음)
+STOP_AUDIO_JS = """
+<script>
+window.parent.document.querySelectorAll('audio[id^="tts-"]').forEach(function(el) {
+    el.pause();
+    el.removeAttribute("src");
+});
+</script>
+"""
+
+def bubble(m):
+    """메시지 하나의 말풍선 HTML"""
+    t = escape(m['text'])
+    if m.get('truncated'):
+        t += ' …'
+    if m['role'] == 'user':
+        return f'<div class="msg msg-user"><div class="msg-label">👵 나</div><div class="bubble bubble-user">{t}</div></div>'
+    return f'<div class="msg msg-ai"><div class="msg-label">🤖 하이</div><div class="bubble bubble-ai">{t}</div></div>'
+
+def add_message(role, text, truncated=False):
+    """대화에 메시지 추가 (말풍선 HTML은 이때 한 번만 만듦)"""
+    m = {'role': role, 'text': text}
+    if truncated:
+        m['truncated'] = True
+    st.session_state.messages.append(m)
+    st.session_state.chat_html.append(bubble(m))
+
+def render_chat(pending=None):
+    """
+    최근 대화 HTML (대화가 길어져도 최근 6개만, 만들어 둔 말풍선을 이어 붙임)
+
+    Args:
+        pending: 지금 말하고 있는 응답 (스트리밍 중 제자리 갱신용)
+    """
+    if len(st.session_state.chat_html) != len(st.session_state.messages):
+        st.session_state.chat_html = [bubble(m) for m in st.session_state.messages]
+    html = st.session_state.chat_html[-6:]
+    if pending:
+        html = html[-5:] + [bubble({'role': 'ai', 'text': pending})]
+    return f'<div class="chat">{"".join(html)}</div>'
+
+@contextmanager
+def timed(scope):
+    """
+    스크립트 실행 시간 기록 (/metrics의 haii_rerun_duration_seconds)
+
+    중간에 rerun으로 멈춘 실행은 기록하지 않습니다.
+
+    Args:
+        scope: app(전체 rerun) 또는 조각 이름
+    """
+    start = time.perf_counter()
+    yield
+    get_metrics().rerun_seconds.observe(time.perf_counter() - start, page=st.session_state.state, scope=scope)
+
+def play_chunks(chunks, spoken, chat_slot):
+    """
+    오디오 청크를 도착하는 대로 재생하며 대화창 갱신
+
+    Args:
+        chunks: 문장별 오디오 청크 반복자
+        spoken: 지금까지 말한 응답 텍스트를 돌려주는 함수
+        chat_slot: 대화창 자리
+    """
+    st.session_state.tts_key += 1
+    turn_key = st.session_state.tts_key
+    media = media_urls()
+    mime = audio_mime()
+    if media and mime in CONCATENABLE:
+        # 청크가 붙는 대로 미디어 서버가 점진 전송 → 오디오 요소 하나로 재생
+        media_id = media.store.create(mime)
+        st.markdown(f'''
+            <audio id="tts-{turn_key}" autoplay>
+                <source src="{media.url_for(media_id)}" type="{mime}">
+            </audio>
+        ''', unsafe_allow_html=True)
+        try:
+            for audio in chunks:
+                media.store.append(media_id, audio)
+                # 화면 갱신이 rerun(말 끊기) 확인 지점도 겸함
+                chat_slot.markdown(render_chat(spoken()), unsafe_allow_html=True)
+        finally:
+            media.store.finish(media_id)
+    else:
+        components.html(AUDIO_QUEUE_JS.replace("__TURN__", str(turn_key)), height=0)
+        audio_area = st.container()
+        for idx, audio in enumerate(chunks):
+            audio_area.markdown(f'''
+                <audio id="tts-{turn_key}-{idx}" preload="auto">
+                    <source src="{audio_src(audio)}" type="{mime}">
+                </audio>
+            ''', unsafe_allow_html=True)
+            chat_slot.markdown(render_chat(spoken()), unsafe_allow_html=True)
+
+def stream_reply(text, chat_slot, trace=None):
+    """
+    LLM 스트리밍 → 청크별 TTS → 순차 재생
+    
+    첫 문장이 합성되는 즉시 오디오 요소를 내보내고, rerun 없이 대화창을
+    제자리에서 갱신합니다 (rerun하면 재생 중인 오디오가 사라짐).
+
+    Returns:
+        끝난 턴 (중간에 끊기면 이 실행은 여기까지 오지 않고 interrupt()가 정리)
+    """
+    turn = Turn(session_id=st.session_state.session_id, user_text=text, trace=trace)
+    st.session_state.speaking = turn
+    try:
+        play_chunks(get_pipeline().reply_audio(turn), lambda: turn.spoken_reply, chat_slot)
+    except Exception as e:
+        print(f"TTS 오류: {e}")
+
+    st.session_state.speaking = None
+    response = turn.reply
+    if response:
+        add_message('ai', response)
+        with turn.trace.span("render"):
+            chat_slot.markdown(render_chat(), unsafe_allow_html=True)
+    return turn
+
+def remote_reply(audio_bytes, chat_slot):
+    """
+    통화 서버로 한 턴 (인식/응답/합성은 서버에서, 여기서는 화면과 재생만)
+
+    rerun으로 이 실행이 멈춰도 서버 쪽 턴은 계속 돌고, 다음 입력이 들어가면
+    서버가 끊습니다.
+    """
+    call = get_call()
+    st.session_state.speaking = call
+    result = {}
+
+    def chunks():
+        for event in get_loop().iterate(call.say(audio_bytes)):
+            if event.type == "transcript" and event.text:
+                add_message('user', event.text)
+                chat_slot.markdown(render_chat(), unsafe_allow_html=True)
+            elif event.type == "audio":
+                yield event.audio
+            elif event.type == "turn_end":
+                result.update(event.data)
+            elif event.type == "error":
+                print(f"통화 서버 오류: {event.data.get('message')}")
+
+    try:
+        play_chunks(chunks(), lambda: call.spoken_reply, chat_slot)
+    except Exception as e:
+        print(f"통화 서버 오류: {e}")
+
+    st.session_state.speaking = None
+    if result.get('reply'):
+        add_message('ai', result['reply'], truncated=bool(result.get('interrupted')))
+        chat_slot.markdown(render_chat(), unsafe_allow_html=True)
+
+def remote_greeting():
+    """통화 서버에 연결하고 인사말을 받아 재생 준비"""
+    try:
+        call = get_call(greeting=True)
+        audio = b"".join(e.audio for e in get_loop().iterate(call.events()) if e.type == "audio")
+    except Exception as e:
+        print(f"통화 서버 연결 오류: {e}")
+        return
+    if call.spoken_reply:
+        add_message('ai', call.spoken_reply)
+    if audio:
+        st.session_state.tts_src = audio_src(audio)
+        st.session_state.tts_key += 1
+
 # ═══════════════════════════════════════════════════════════════════════════
 # 화면
 # ═══════════════════════════════════════════════════════════════════════════
@@ -258,6 +622,19 @@ def page_idle():
         if st.button("📞 전화 걸기", type="primary", use_container_width=True):
             st.session_state.state = 'ringing'
             st.rerun()
+    scheduled_call()
+
+
+@st.fragment(run_every=5)
+def scheduled_call():
+    """복약 시간이 되면 전화가 오도록 (5초마다 이 부분만 확인)"""
+    call = get_scheduler().ringing(elder_id())
+    # 같은 어르신 화면이 여러 개여도 각 세션에서 한 번씩 울림
+    if call and st.session_state.get('rang') != call.due:
+        st.session_state.rang = call.due
+        st.session_state.scheduled = call
+        st.session_state.state = 'ringing'
+        st.rerun()
 
 
 def page_ringing():
@@ -277,24 +654,119 @@ def page_ringing():
     with c3:
         if st.button("📞 받기", type="primary", use_container_width=True):
             st.session_state.start_time = time.time()
+            start_call()
             llm = get_llm()
-            if llm:
-                greeting = llm.get_greeting()
-                st.session_state.messages.append({'role': 'ai', 'text': greeting})
+            if CALL_SERVER_URL:
+                remote_greeting()
+            elif llm:
+                scheduled = st.session_state.pop('scheduled', None)
+                greeting = (llm.get_greeting(slot=scheduled.slot, medications=scheduled.medications)
+                            if scheduled else llm.get_greeting())
+                add_message('ai', greeting)
+                save_turn(None, greeting)
                 # 인사말 TTS
                 synthesize_and_play(greeting)
             st.session_state.state = 'call'
             st.rerun()
 
 
+@st.fragment(run_every=1)
+def call_status():
+    """상태바 (통화 시간만 1초마다 따로 갱신, 나머지 화면은 다시 그리지 않음)"""
+    with timed("timer"):
+        st.markdown(f'''
+            <div class="status-bar">
+                <div class="status-text"><span class="status-dot"></span>통화 중</div>
+                <div class="timer">{get_time()}</div>
+            </div>
+        ''', unsafe_allow_html=True)
+
+
+@st.fragment
+def conversation():
+    """
+    대화창 + 마이크 + 재생 (녹음하면 이 조각만 다시 실행)
+
+    한 턴이 대화창과 재생을 차례로 갱신하므로 셋을 한 조각에 둡니다.
+    조각 rerun은 실행 중인 턴을 멈추지 않으므로, 말하는 중에 끊는 정지 버튼은
+    조각 밖(전체 rerun)에 둡니다.
+    """
+    with timed("conversation"):
+        # 말하는 중에 다른 입력으로 rerun되면 응답을 끊음
+        if st.session_state.speaking is not None:
+            interrupt("barge_in")
+        if st.session_state.pop('stop_audio', False):
+            components.html(STOP_AUDIO_JS, height=0)
+
+        # 대화
+        chat_slot = st.empty()
+        chat_slot.markdown(render_chat(), unsafe_allow_html=True)
+        
+        # 마이크 버튼
+        audio_bytes = audio_recorder(
+            text="",
+            recording_color="#ef4444",
+            neutral_color="#22c55e",
+            icon_name="microphone",
+            icon_size="3x",
+            pause_threshold=2.0,
+            sample_rate=16000,
+            key="mic"
+        )
+        
+        st.markdown('<div class="hint">버튼을 누르고 말씀하세요</div>', unsafe_allow_html=True)
+        
+        # 음성 처리
+        if audio_bytes and audio_bytes != st.session_state.last_audio:
+            st.session_state.last_audio = audio_bytes
+            
+            stt = get_stt()
+            llm = get_llm()
+            
+            if CALL_SERVER_URL:
+                remote_reply(audio_bytes, chat_slot)
+            elif stt and llm:
+                # 턴 계측 (VAD/STT/LLM/TTS/렌더링 구간)
+                trace = get_pipeline().start_trace(st.session_state.session_id)
+                
+                # STT
+                text = get_pipeline().transcribe_sync(audio_bytes, mime_type="audio/wav", trace=trace)
+                
+                if text:
+                    add_message('user', text)
+                    with trace.span("render"):
+                        chat_slot.markdown(render_chat(), unsafe_allow_html=True)
+                    
+                    # LLM → TTS 스트리밍 (문장 단위로 바로 재생)
+                    turn = stream_reply(text, chat_slot, trace)
+                    save_turn(text, turn.reply, trace.finish())
+                
+                trace.finish()
+        
+        # TTS 오디오 재생 (autoplay)
+        if st.session_state.tts_src:
+            # JavaScript로 자동 재생
+            st.markdown(f'''
+                <audio id="tts-{st.session_state.tts_key}" autoplay>
+                    <source src="{st.session_state.tts_src}" type="{audio_mime()}">
+                </audio>
+                <script>
+                    var audio = document.getElementById("tts-{st.session_state.tts_key}");
+                    if (audio) {{
+                        audio.play().catch(function(e) {{
+                            console.log("Autoplay blocked:", e);
+                        }});
+                    }}
+                </script>
+            ''', unsafe_allow_html=True)
+            
+            # 재생 후 초기화
+            st.session_state.tts_src = None
+
+
 def page_call():
     # 상태바
-    st.markdown(f'''
-        <div class="status-bar">
-            <div class="status-text"><span class="status-dot"></span>통화 중</div>
-            <div class="timer">{get_time()}</div>
-        </div>
-    ''', unsafe_allow_html=True)
+    call_status()
     
     # 프로필
     st.markdown('''
@@ -304,78 +776,16 @@ def page_call():
             <div class="role">AI 건강도우미</div>
         </div>
     ''', unsafe_allow_html=True)
-    
+
     # AI 상태
     st.markdown('<div class="ai-state">💬 마이크를 누르고 말씀하세요</div>', unsafe_allow_html=True)
+
+    # 말 끊기 (응답이 나가는 중에도 누를 수 있도록 대화창보다 먼저 그림)
+    c1, c2, c3 = st.columns([1, 2, 1])
+    with c2:
+        st.button("✋ 그만 말하기", on_click=interrupt, args=("stop",), use_container_width=True)
     
-    # 대화
-    html = []
-    for m in st.session_state.messages[-6:]:
-        t = escape(m['text'])
-        if m['role'] == 'user':
-            html.append(f'<div class="msg msg-user"><div class="msg-label">👵 나</div><div class="bubble bubble-user">{t}</div></div>')
-        else:
-            html.append(f'<div class="msg msg-ai"><div class="msg-label">🤖 하이</div><div class="bubble bubble-ai">{t}</div></div>')
-    st.markdown(f'<div class="chat">{"".join(html)}</div>', unsafe_allow_html=True)
-    
-    # 마이크 버튼
-    audio_bytes = audio_recorder(
-        text="",
-        recording_color="#ef4444",
-        neutral_color="#22c55e",
-        icon_name="microphone",
-        icon_size="3x",
-        pause_threshold=2.0,
-        sample_rate=16000,
-        key="mic"
-    )
-    
-    st.markdown('<div class="hint">버튼을 누르고 말씀하세요</div>', unsafe_allow_html=True)
-    
-    # 음성 처리
-    if audio_bytes and audio_bytes != st.session_state.last_audio:
-        st.session_state.last_audio = audio_bytes
-        
-        stt = get_stt()
-        llm = get_llm()
-        
-        if stt and llm:
-            # STT
-            text = stt.transcribe(audio_bytes, mime_type="audio/wav")
-            
-            if text:
-                st.session_state.messages.append({'role': 'user', 'text': text})
-                
-                # LLM
-                response = llm.generate(text)
-                if response:
-                    st.session_state.messages.append({'role': 'ai', 'text': response})
-                    # TTS
-                    synthesize_and_play(response)
-        
-        st.rerun()
-    
-    # TTS 오디오 재생 (autoplay)
-    if st.session_state.tts_audio:
-        audio_b64 = base64.b64encode(st.session_state.tts_audio).decode()
-        
-        # JavaScript로 자동 재생
-        st.markdown(f'''
-            <audio id="tts-{st.session_state.tts_key}" autoplay>
-                <source src="data:audio/mp3;base64,{audio_b64}" type="audio/mp3">
-            </audio>
-            <script>
-                var audio = document.getElementById("tts-{st.session_state.tts_key}");
-                if (audio) {{
-                    audio.play().catch(function(e) {{
-                        console.log("Autoplay blocked:", e);
-                    }});
-                }}
-            </script>
-        ''', unsafe_allow_html=True)
-        
-        # 재생 후 초기화
-        st.session_state.tts_audio = None
+    conversation()
     
     # 종료 버튼
     c1, c2, c3 = st.columns([1, 2, 1])
@@ -390,9 +800,10 @@ def page_call():
 # ═══════════════════════════════════════════════════════════════════════════
 def main():
     s = st.session_state.state
-    if s == 'idle': page_idle()
-    elif s == 'ringing': page_ringing()
-    elif s == 'call': page_call()
+    with timed("app"):
+        if s == 'idle': page_idle()
+        elif s == 'ringing': page_ringing()
+        elif s == 'call': page_call()
 
 if __name__ == "__main__":
     main()
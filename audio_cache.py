@@ -0,0 +1,172 @@
+"""
+audio_cache.py - TTS 오디오 캐시
+(text, voice, rate) 해시 → 오디오 바이트, 메모리 LRU + 디스크 2단계
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [CACHE] %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join(".cache", "tts")
+
+
+class AudioCache:
+    """콘텐츠 주소 기반 오디오 캐시 (메모리 LRU + 디스크)"""
+
+    def __init__(
+        self,
+        max_bytes: int = 32 * 1024 * 1024,
+        cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+        max_disk_bytes: int = 512 * 1024 * 1024,
+    ):
+        """
+        Args:
+            max_bytes: 메모리 캐시 용량 (바이트, 초과 시 LRU 정리)
+            cache_dir: 디스크 캐시 폴더 (None이면 메모리만 사용)
+            max_disk_bytes: 디스크 캐시 용량 (시작 시 오래된 파일부터 정리)
+        """
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+        if self.cache_dir:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                self._prune_disk()
+            except OSError as e:
+                logger.warning(f"디스크 캐시 사용 불가: {e}")
+                self.cache_dir = None
+
+    @staticmethod
+    def make_key(text: str, voice: str, rate: str, output_format: str = "") -> str:
+        """캐시 키 (SHA-256, 출력 형식이 기본 MP3가 아니면 형식/비트레이트도 포함)"""
+        raw = "\x1f".join((text.strip(), voice, rate, *filter(None, [output_format])))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """캐시 조회 (메모리 → 디스크 순, 디스크 적중 시 메모리로 올림)"""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return data
+
+        data = self._read_disk(key)
+        if data is None:
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+
+        with self._lock:
+            self.stats["disk_hits"] += 1
+            self._store_memory(key, data)
+        return data
+
+    def put(self, key: str, data: bytes):
+        """캐시 저장 (메모리 + 디스크)"""
+        if not data:
+            return
+        with self._lock:
+            self._store_memory(key, data)
+        self._write_disk(key, data)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            if key in self._memory:
+                return True
+        path = self._path(key)
+        return bool(path) and os.path.exists(path)
+
+    # ─────────────────────────────────────────────
+    # 메모리 계층
+    # ─────────────────────────────────────────────
+    def _store_memory(self, key: str, data: bytes):
+        """메모리 LRU에 저장 (잠금 상태에서 호출)"""
+        if len(data) > self.max_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old)
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    # ─────────────────────────────────────────────
+    # 디스크 계층
+    # ─────────────────────────────────────────────
+    def _path(self, key: str) -> Optional[str]:
+        if not self.cache_dir:
+            return None
+        return os.path.join(self.cache_dir, key[:2], f"{key}.audio")
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        if not path:
+            return None
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"디스크 캐시 읽기 실패: {e}")
+            return None
+
+    def _write_disk(self, key: str, data: bytes):
+        """임시 파일에 쓴 뒤 교체 (동시 쓰기/중단에도 깨진 파일이 남지 않음)"""
+        path = self._path(key)
+        if not path or os.path.exists(path):
+            return
+        try:
+            folder = os.path.dirname(path)
+            os.makedirs(folder, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=folder, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"디스크 캐시 쓰기 실패: {e}")
+
+    def _prune_disk(self):
+        """디스크 용량 초과 시 오래된 파일부터 삭제"""
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                if name.endswith(".tmp"):
+                    os.unlink(path)
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+
+        if total <= self.max_disk_bytes:
+            return
+
+        entries.sort()
+        for _, size, path in entries:
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= size
+            if total <= self.max_disk_bytes:
+                break
+        logger.info(f"디스크 캐시 정리: {total} bytes 유지")
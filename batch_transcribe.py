@@ -0,0 +1,286 @@
+"""
+batch_transcribe.py - 저장된 통화 녹음 일괄 음성 인식
+디렉터리나 목록 파일의 오디오를 동시 요청 수를 제한해 STT로 인식하고, 결과를 JSONL에
+한 줄씩 바로 기록 (중단 후 다시 실행하면 이미 끝난 파일은 건너뜀)
+
+사용 예:
+    python batch_transcribe.py recordings/ -o transcripts.jsonl --concurrency 8
+    python batch_transcribe.py manifest.txt -o transcripts.jsonl --url http://127.0.0.1:8080
+"""
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import random
+import time
+import wave
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Set
+
+import httpx
+
+from STT import STT
+from ratelimit import retry_after
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [BATCH] %(message)s')
+logger = logging.getLogger(__name__)
+
+# 확장자 → Deepgram에 보낼 MIME 타입
+AUDIO_TYPES = {
+    ".wav": "audio/wav",
+    ".mp3": "audio/mpeg",
+    ".ogg": "audio/ogg",
+    ".webm": "audio/webm",
+    ".m4a": "audio/mp4",
+    ".flac": "audio/flac",
+}
+
+# 다시 실행할 때 건너뛸 결과 (failed는 다음 실행에서 다시 시도)
+DONE_STATUSES = ("ok", "empty")
+
+
+def discover(inputs: Iterable[str], pattern: str = "*") -> Iterator[Path]:
+    """
+    인식할 오디오 파일 목록 (필요할 때 하나씩)
+
+    Args:
+        inputs: 디렉터리(하위까지), 오디오 파일, 목록 파일(.txt 한 줄에 경로 하나,
+            .jsonl은 "path" 필드, 상대 경로는 목록 파일 기준)
+        pattern: 디렉터리에서 고를 파일 이름 패턴
+    """
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            for found in sorted(path.rglob(pattern)):
+                if found.suffix.lower() in AUDIO_TYPES:
+                    yield found
+        elif path.suffix.lower() in (".txt", ".jsonl"):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line or line.startswith("#"):
+                        continue
+                    entry = json.loads(line)["path"] if path.suffix.lower() == ".jsonl" else line
+                    yield path.parent / entry
+        else:
+            yield path
+
+
+def load_done(out_path: Path) -> Set[str]:
+    """이전 실행에서 끝난 파일 (중간에 끊겨 깨진 마지막 줄은 무시)"""
+    done: Set[str] = set()
+    if not out_path.exists():
+        return done
+    with open(out_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("status") in DONE_STATUSES:
+                done.add(record["path"])
+    return done
+
+
+def is_transient(error: BaseException) -> bool:
+    """다시 시도하면 될 수 있는 오류인지 (연결/시간 초과, 429, 5xx)"""
+    if isinstance(error, httpx.TransportError):
+        return True
+    try:
+        status = int(getattr(error, "status", 0) or 0)
+    except ValueError:
+        return False
+    return status == 429 or status >= 500
+
+
+def audio_duration(audio: bytes, response=None) -> float:
+    """오디오 길이 (초, 응답 메타데이터 → WAV 헤더 순)"""
+    duration = getattr(getattr(response, "metadata", None), "duration", None)
+    if duration:
+        return float(duration)
+    try:
+        with wave.open(io.BytesIO(audio), "rb") as wf:
+            return wf.getnframes() / float(wf.getframerate())
+    except (wave.Error, EOFError):
+        return 0.0
+
+
+class BatchTranscriber:
+    """
+    일괄 인식기 (작업자 concurrency개가 대기열에서 파일을 꺼내 인식)
+
+    사용 예:
+        batch = BatchTranscriber(STT(pool_size=8), concurrency=8)
+        asyncio.run(batch.run(discover(["recordings/"]), Path("transcripts.jsonl")))
+    """
+
+    def __init__(
+        self,
+        stt: STT,
+        concurrency: int = 8,
+        retries: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 10.0,
+        progress_every: int = 100,
+    ):
+        """
+        Args:
+            stt: 음성 인식 모듈 (연결 풀 크기를 concurrency 이상으로)
+            concurrency: 동시에 보낼 최대 요청 수
+            retries: 일시적 오류 재시도 횟수
+            base_delay: 백오프 시작 대기 (초)
+            max_delay: 백오프 최대 대기 (초)
+            progress_every: 이 개수마다 진행 상황 로그
+        """
+        self.stt = stt
+        self.concurrency = max(1, concurrency)
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.progress_every = progress_every
+        self.stats: Dict[str, float] = {
+            "files": 0, "ok": 0, "empty": 0, "failed": 0, "skipped": 0,
+            "retries": 0, "audio_seconds": 0.0, "bytes": 0, "elapsed": 0.0,
+        }
+
+    async def run(self, paths: Iterable[Path], out_path: Path) -> Dict:
+        """
+        전체 실행 (결과는 out_path에 이어 쓰기)
+
+        Returns:
+            summary() 결과
+        """
+        done = load_done(out_path)
+        if done:
+            logger.info(f"이전 실행에서 끝난 파일 {len(done)}개 건너뜀")
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        start = time.perf_counter()
+
+        with open(out_path, "a", encoding="utf-8") as out:
+            async def produce():
+                for path in paths:
+                    if str(path.resolve()) in done:
+                        self.stats["skipped"] += 1
+                        continue
+                    await queue.put(path)
+                for _ in range(self.concurrency):
+                    await queue.put(None)
+
+            async def work():
+                while True:
+                    path = await queue.get()
+                    if path is None:
+                        return
+                    record = await self._transcribe(path)
+                    # 파일 하나 끝날 때마다 바로 기록 (중단돼도 여기까지는 남음)
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    out.flush()
+                    self._count(record)
+
+            try:
+                await asyncio.gather(produce(), *(work() for _ in range(self.concurrency)))
+            finally:
+                self.stats["elapsed"] = time.perf_counter() - start
+        return self.summary()
+
+    async def _transcribe(self, path: Path) -> Dict:
+        """파일 하나 인식 (일시적 오류는 지수 백오프로 재시도)"""
+        record: Dict = {"path": str(path.resolve())}
+        start = time.perf_counter()
+        try:
+            audio = await asyncio.to_thread(path.read_bytes)
+        except OSError as e:
+            return {**record, "status": "failed", "error": f"읽기 실패: {e}", "attempts": 0}
+        mime_type = AUDIO_TYPES.get(path.suffix.lower(), "audio/wav")
+        record["bytes"] = len(audio)
+
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = await asyncio.to_thread(self.stt.request, audio, mime_type)
+                break
+            except Exception as e:
+                if attempt > self.retries or not is_transient(e):
+                    logger.warning(f"인식 실패 ({attempt}회): {path} - {e}")
+                    return {**record, "status": "failed", "error": str(e), "attempts": attempt,
+                            "ms": round((time.perf_counter() - start) * 1000, 1)}
+                self.stats["retries"] += 1
+                await asyncio.sleep(self._backoff(attempt, e))
+
+        try:
+            alternative = response.results.channels[0].alternatives[0]
+            transcript = (alternative.transcript or "").strip()
+        except (AttributeError, IndexError, TypeError) as e:
+            # 채널/후보가 빈 응답 - 작업자가 죽지 않도록 실패로 기록하고 다음 파일로
+            logger.warning(f"응답 형식 오류: {path} - {e!r}")
+            return {**record, "status": "failed", "error": f"응답 형식 오류: {e!r}", "attempts": attempt,
+                    "ms": round((time.perf_counter() - start) * 1000, 1)}
+        return {
+            **record,
+            "status": "ok" if transcript else "empty",
+            "transcript": transcript,
+            "confidence": getattr(alternative, "confidence", None),
+            "duration": round(audio_duration(audio, response), 3),
+            "attempts": attempt,
+            "ms": round((time.perf_counter() - start) * 1000, 1),
+        }
+
+    def _backoff(self, attempt: int, error: BaseException) -> float:
+        """다음 재시도까지 대기 (full jitter, 429의 retry-after보다 짧지 않게)"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        hint = retry_after(error)
+        return max(delay, hint) if hint is not None else delay
+
+    def _count(self, record: Dict):
+        stats = self.stats
+        stats["files"] += 1
+        stats[record["status"]] += 1
+        stats["audio_seconds"] += record.get("duration", 0.0)
+        stats["bytes"] += record.get("bytes", 0)
+        if self.progress_every and stats["files"] % self.progress_every == 0:
+            logger.info(f"{stats['files']}개 처리 (실패 {stats['failed']}, 재시도 {stats['retries']})")
+
+    def summary(self) -> Dict:
+        """처리량 (files/s, 오디오 초/s) 포함 통계"""
+        stats = dict(self.stats)
+        elapsed = stats["elapsed"] or 1e-9
+        stats["files_per_s"] = round(stats["files"] / elapsed, 2)
+        stats["audio_s_per_s"] = round(stats["audio_seconds"] / elapsed, 2)
+        stats["audio_seconds"] = round(stats["audio_seconds"], 1)
+        stats["elapsed"] = round(stats["elapsed"], 2)
+        return stats
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description="저장된 통화 녹음 일괄 음성 인식")
+    parser.add_argument("inputs", nargs="+", help="디렉터리, 오디오 파일, 또는 목록 파일(.txt/.jsonl)")
+    parser.add_argument("-o", "--out", default="transcripts.jsonl", help="결과 JSONL (있으면 이어 씀)")
+    parser.add_argument("--concurrency", type=int, default=8, help="동시 요청 수")
+    parser.add_argument("--retries", type=int, default=3, help="일시적 오류 재시도 횟수")
+    parser.add_argument("--pattern", default="*", help="디렉터리에서 고를 파일 이름 패턴")
+    parser.add_argument("--url", default=None, help="Deepgram REST 주소 (로컬 가짜 서버 등)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="요청당 응답 대기 (초)")
+    args = parser.parse_args(argv)
+
+    # CLI에서는 Streamlit Secrets를 보지 않도록 환경변수에서 바로 읽음
+    stt = STT(api_key=os.getenv("DEEPGRAM_API_KEY"), url=args.url, pool_size=args.concurrency,
+              read_timeout=args.timeout)
+    if not stt.client:
+        parser.error("DEEPGRAM_API_KEY가 필요합니다")
+    batch = BatchTranscriber(stt, concurrency=args.concurrency, retries=args.retries)
+    try:
+        asyncio.run(batch.run(discover(args.inputs, args.pattern), Path(args.out)))
+    except KeyboardInterrupt:
+        logger.info("중단됨 - 다시 실행하면 이어서 처리합니다")
+    finally:
+        stt.close()
+        print(json.dumps({**batch.summary(), "connections": stt.connection_stats()}, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    main()
@@ -0,0 +1,254 @@
+"""
+benchmark.py - 오프라인 종단간 벤치마크
+가짜 Deepgram/Gemini/Edge TTS로 대본 대화를 앱과 같은 파이프라인에 재생하고
+턴 지연(p50/p95/p99), 처리량, 메모리를 보고
+
+사용 예:
+    python benchmark.py --sessions 50 --repeat 2 --streaming
+    python benchmark.py --llm-ms 800 --llm-429 0.05 --json bench.json
+    python benchmark.py --sessions 100 --streaming --dispatch --limits gemini=8 --llm-ms 2000 --background 20
+"""
+import argparse
+import asyncio
+import io
+import json
+import logging
+import math
+import random
+import resource
+import time
+import tracemalloc
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from LLM import LLM
+from STT import STT
+from TTS import TTS
+from VAD import VAD
+from codec import AudioEncoder
+from metrics import MetricsRegistry
+from pipeline import PipelineRunner, Turn
+from dispatcher import BACKGROUND, Dispatcher, parse_limits
+from fake_providers import (
+    EXPECTED_TRANSCRIPT, FakeDeepgramClient, FakeGenerativeModel, LatencyModel, make_fake_communicate,
+)
+
+# 대본 대화 (사용자 발화 = 기대 인식 결과)
+CONVERSATIONS = [
+    ["안녕하세요", "오늘 아침에 밥 먹었어요", "약도 먹었어", "허리가 좀 아파", "고마워"],
+    ["네 먹었어요", "심심해", "손주가 어제 다녀갔어요", "저녁엔 된장찌개 먹을 거야"],
+    ["약 아직 안 먹었어", "아 맞다 지금 먹을게", "점심은 국수 먹었어", "날씨가 좋네"],
+]
+
+
+@dataclass
+class TurnResult:
+    session_id: str
+    turn_ms: float
+    first_audio_ms: float
+    transcript_ok: bool
+    fallback: str
+
+
+def make_utterance_wav(text: str, rng: random.Random, sample_rate: int = 16000) -> bytes:
+    """
+    발화 길이에 맞는 합성 녹음 (앞 0.4초 + 뒤 1.5초 무음, 배경 소음 포함)
+
+    VAD가 실제처럼 앞뒤 무음을 잘라낼 수 있도록 만든 오디오 픽스처
+    """
+    speech_s = max(0.5, len(text) * 0.12)
+    lead, trail = 0.4, 1.5
+    n = int((lead + speech_s + trail) * sample_rate)
+    gen = np.random.default_rng(rng.randrange(1 << 30))
+    x = gen.normal(0.0, 0.002, n)
+    t = np.arange(int(speech_s * sample_rate)) / sample_rate
+    pitch = 180 + 40 * np.sin(2 * np.pi * 0.7 * t)
+    voiced = 0.25 * np.sin(2 * np.pi * np.cumsum(pitch) / sample_rate) * (0.6 + 0.4 * np.sin(2 * np.pi * 4 * t))
+    start = int(lead * sample_rate)
+    x[start:start + len(voiced)] += voiced
+
+    out = io.BytesIO()
+    with wave.open(out, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes((np.clip(x, -1, 1) * 32767).astype("<i2").tobytes())
+    return out.getvalue()
+
+
+def percentile(values: List[float], p: float) -> float:
+    """nearest-rank 퍼센타일"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def build_pipeline(args) -> PipelineRunner:
+    """가짜 공급자를 주입한 실제 STT/LLM/TTS + 앱과 같은 파이프라인"""
+    seed = args.seed
+    # api_key를 넘겨 Streamlit Secrets 조회(베어 모드 경고)를 건너뜀
+    stt = STT(api_key="offline", client=FakeDeepgramClient(
+        LatencyModel(args.stt_ms, args.stt_p95_ms, args.stt_error, 0.0, seed)))
+    llm = LLM(api_key="offline", model=FakeGenerativeModel(
+        LatencyModel(args.llm_ms, args.llm_p95_ms, args.llm_error, args.llm_429, seed + 1),
+        token_ms=args.token_ms), max_sessions=max(256, args.sessions * 2), fast_path=not args.no_fast_path,
+        rpm=args.rpm, turn_deadline=args.deadline)
+    tts = TTS(communicate=make_fake_communicate(
+        LatencyModel(args.tts_ms, args.tts_p95_ms, args.tts_error, 0.0, seed + 2)))
+    metrics = MetricsRegistry()
+    dispatcher = None
+    if args.dispatch:
+        dispatcher = Dispatcher(parse_limits(args.limits), max_calls=args.max_calls or args.sessions, metrics=metrics)
+    return PipelineRunner(stt, llm, tts, vad=VAD(), encoder=AudioEncoder(args.codec),
+                          metrics=metrics, dispatcher=dispatcher)
+
+
+async def run_session(pipeline: PipelineRunner, session_id: str, script: List[str],
+                      fixtures: Dict[str, bytes], args, results: List[TurnResult]):
+    """대본 대화 하나를 턴 단위로 재생"""
+    for text in script:
+        EXPECTED_TRANSCRIPT.set(text)
+        start = time.perf_counter()
+        first_audio: Optional[float] = None
+
+        if args.streaming:
+            trace = pipeline.start_trace(session_id)
+            user_text = await pipeline.transcribe(fixtures[text], trace=trace)
+            turn = Turn(session_id=session_id, user_text=user_text, trace=trace)
+            async for _ in pipeline.stream_reply(turn):
+                if first_audio is None:
+                    first_audio = time.perf_counter()
+        else:
+            turn = await pipeline.run_turn(fixtures[text], session_id)
+
+        end = time.perf_counter()
+        turn.trace.finish()
+        results.append(TurnResult(
+            session_id=session_id,
+            turn_ms=(end - start) * 1000,
+            first_audio_ms=((first_audio or end) - start) * 1000,
+            transcript_ok=turn.user_text == text,
+            fallback=turn.trace.tags.get("fallback", "none"),
+        ))
+        if args.think_ms:
+            await asyncio.sleep(args.think_ms / 1000.0)
+
+
+async def run_background(pipeline: PipelineRunner, worker: int, count: int, results: List[float]):
+    """배경 작업 (미리 합성 등) - 실시간 턴보다 낮은 우선순위로 TTS 자리를 씀"""
+    for i in range(count):
+        start = time.perf_counter()
+        await pipeline.speak(f"배경 합성 문장 {worker}-{i} 입니다.", pipeline.start_trace(f"bg-{worker}"),
+                             priority=BACKGROUND)
+        results.append((time.perf_counter() - start) * 1000)
+
+
+async def run_benchmark(args) -> Dict:
+    loop = asyncio.get_running_loop()
+    # 동기 SDK 호출(to_thread)이 동시 세션 수만큼 겹칠 수 있게
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=max(32, args.sessions * 3)))
+
+    pipeline = build_pipeline(args)
+    rng = random.Random(args.seed)
+    fixtures = {text: make_utterance_wav(text, rng) for script in CONVERSATIONS for text in script}
+
+    results: List[TurnResult] = []
+    tasks = []
+    for i in range(args.sessions):
+        script = CONVERSATIONS[i % len(CONVERSATIONS)] * args.repeat
+        session = run_session(pipeline, f"bench-{i}", script, fixtures, args, results)
+        if pipeline.dispatcher is not None:
+            session = pipeline.dispatcher.run_call(f"bench-{i}", lambda session=session: session)
+        tasks.append(session)
+    background_ms: List[float] = []
+    for i in range(args.background):
+        tasks.append(run_background(pipeline, i, args.repeat * 5, background_ms))
+
+    start = time.perf_counter()
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    turn_ms = [r.turn_ms for r in results]
+    first_ms = [r.first_audio_ms for r in results]
+    fallbacks: Dict[str, int] = {}
+    for r in results:
+        fallbacks[r.fallback] = fallbacks.get(r.fallback, 0) + 1
+
+    return {
+        "mode": "streaming" if args.streaming else "batch",
+        "sessions": args.sessions,
+        "turns": len(results),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_turns_per_s": round(len(results) / elapsed, 2) if elapsed else 0.0,
+        "turn_ms": {f"p{p}": round(percentile(turn_ms, p), 1) for p in (50, 95, 99)},
+        "first_audio_ms": {f"p{p}": round(percentile(first_ms, p), 1) for p in (50, 95, 99)},
+        "transcript_accuracy": round(sum(r.transcript_ok for r in results) / len(results), 4) if results else 0.0,
+        "fallbacks": fallbacks,
+        "upload_bytes": pipeline.stt.client.bytes_received,
+        "llm_prompt_chars": pipeline.llm.model.prompt_chars,
+        "llm_tokens": pipeline.llm.token_usage(),
+        "llm_calls": pipeline.llm.model.calls,
+        "intent_fast_path": pipeline.llm.intents.summary(),
+        "rate_limiter": pipeline.llm.limiter.stats,
+        "tts_output": pipeline.tts.encoder.summary(),
+        "live_sessions": pipeline.llm.session_count,
+        **({"background_ms": {f"p{p}": round(percentile(background_ms, p), 1) for p in (50, 95)}}
+           if background_ms else {}),
+        **({"dispatcher": pipeline.dispatcher.snapshot()} if pipeline.dispatcher is not None else {}),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Haii-Call 오프라인 종단간 벤치마크")
+    parser.add_argument("--sessions", type=int, default=20, help="동시 통화 세션 수")
+    parser.add_argument("--repeat", type=int, default=1, help="세션마다 대본을 반복할 횟수")
+    parser.add_argument("--streaming", action="store_true", help="LLM → TTS 스트리밍 경로 사용 (앱 기본 경로)")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="턴 사이 사용자 생각 시간")
+    parser.add_argument("--codec", default="flac", choices=["wav", "flac", "opus"], help="STT 업로드 코덱")
+    parser.add_argument("--stt-ms", type=float, default=300.0)
+    parser.add_argument("--stt-p95-ms", type=float, default=None)
+    parser.add_argument("--stt-error", type=float, default=0.0)
+    parser.add_argument("--llm-ms", type=float, default=600.0, help="LLM 첫 토큰 지연 중앙값")
+    parser.add_argument("--llm-p95-ms", type=float, default=None)
+    parser.add_argument("--llm-error", type=float, default=0.0)
+    parser.add_argument("--llm-429", type=float, default=0.0, help="LLM 429 주입 비율")
+    parser.add_argument("--no-fast-path", action="store_true", help="정형 의도 로컬 응답 끄기 (모든 턴을 LLM으로)")
+    parser.add_argument("--rpm", type=float, default=6000.0, help="LLM 키 쿼터 (분당 요청 수)")
+    parser.add_argument("--deadline", type=float, default=6.0, help="LLM 턴 마감 (초)")
+    parser.add_argument("--token-ms", type=float, default=15.0, help="LLM 토큰 간 간격")
+    parser.add_argument("--tts-ms", type=float, default=200.0, help="TTS 첫 바이트 지연 중앙값")
+    parser.add_argument("--tts-p95-ms", type=float, default=None)
+    parser.add_argument("--tts-error", type=float, default=0.0)
+    parser.add_argument("--dispatch", action="store_true", help="공급자별 동시 요청 제한 사용")
+    parser.add_argument("--limits", default=None, help="공급자별 동시 요청 수 (예: deepgram=16,gemini=4,edge_tts=12)")
+    parser.add_argument("--max-calls", type=int, default=0, help="동시 통화 수 (0이면 세션 수)")
+    parser.add_argument("--background", type=int, default=0, help="함께 돌릴 배경 합성 작업 수")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--tracemalloc", action="store_true", help="Python 힙 최대 사용량 측정 (느려짐)")
+    parser.add_argument("--json", dest="json_path", help="결과를 JSON 파일로 저장")
+    args = parser.parse_args()
+
+    # 공급자 호출마다 찍히는 INFO 로그는 측정을 왜곡하므로 끔
+    logging.getLogger().setLevel(logging.WARNING)
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    report = asyncio.run(run_benchmark(args))
+    report["max_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    if args.tracemalloc:
+        report["py_heap_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 1)
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "report": report}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
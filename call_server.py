@@ -0,0 +1,675 @@
+"""
+call_server.py - 웹소켓 통화 서버 (Streamlit 재실행과 분리된 STT → LLM → TTS)
+프로세스 하나가 여러 통화를 동시에 처리: 오디오를 받아 인식 결과, 응답 텍스트,
+합성 오디오 청크를 돌려줌 (연결별 송신 대기열이 차면 합성을 멈추는 역압)
+
+프로토콜 (텍스트 메시지 = JSON, 바이너리 메시지 = 오디오):
+    클라이언트 → 서버
+        {"type": "start", "session_id": "...", "elder_id": "...", "mode": "clip"|"live", "sample_rate": 16000, "greeting": false}
+        {"type": "clip", "turn": n, "mime": "audio/wav"} + 바이너리   발화 하나 (clip 모드)
+        바이너리                                                      16-bit PCM 프레임 (live 모드)
+        {"type": "text", "turn": n, "text": "..."}                    인식 없이 바로 응답
+        {"type": "stop"}                                              말하던 응답 끊기
+        {"type": "end"}                                               live: 오디오 전송 끝
+    서버 → 클라이언트
+        {"type": "ready", "session_id": "...", "audio": "audio/mpeg"}   audio: 합성 오디오 MIME 타입 (TTS_FORMAT)
+        {"type": "transcript", "turn": n, "text": "...", "final": bool}   live 모드는 turn 없음
+        {"type": "reply", "turn": n, "text": "..."} + 바이너리         문장 하나와 그 오디오 (ready의 audio 형식)
+        {"type": "turn_end", "turn": n, "user": "...", "reply": "...", "interrupted": null|"barge_in"|"stop"}
+        {"type": "busy"}                                              동시 통화 수 초과 (바로 닫힘)
+        {"type": "error", "message": "..."}
+
+사용 예:
+    python call_server.py --port 8765
+    python call_server.py --offline          # 가짜 공급자로 API 키 없이 (live 모드 인식도 로컬 가짜 서버)
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import uuid
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, List, Optional, Union
+
+import websockets
+
+from STT import DEEPGRAM_LISTEN_URL, StreamingSTT, TranscriptEvent
+from pipeline import PipelineRunner, Turn
+from transcript_store import TranscriptStore
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [CALL] %(message)s')
+logger = logging.getLogger(__name__)
+
+# 동시 통화 수 초과 (RFC 6455 1013 Try Again Later)
+CLOSE_BUSY = 1013
+# 보낸 메시지를 제때 받지 않는 클라이언트 (1008 Policy Violation)
+CLOSE_SLOW = 1008
+
+
+class _EventFeed:
+    """실시간 인식 이벤트 대기열 (턴 처리와 말 끊기 감시가 차례로 이어 받음)"""
+
+    def __init__(self):
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._pushed: List[TranscriptEvent] = []
+        self.closed = False
+
+    def put(self, event: Optional[TranscriptEvent]):
+        """이벤트 추가 (None = 인식 연결 종료)"""
+        self._queue.put_nowait(event)
+
+    def push_back(self, event: TranscriptEvent):
+        """말 끊기를 일으킨 이벤트를 다음 턴이 다시 받도록 되돌려 넣음"""
+        self._pushed.append(event)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> TranscriptEvent:
+        if self._pushed:
+            return self._pushed.pop()
+        if self.closed:
+            raise StopAsyncIteration
+        event = await self._queue.get()
+        if event is None:
+            self.closed = True
+            raise StopAsyncIteration
+        return event
+
+
+class CallSession:
+    """연결 하나 = 통화 하나 (턴은 한 번에 하나, 새 턴이 오면 말하던 턴은 끊음)"""
+
+    def __init__(self, server: "CallServer", ws):
+        self.server = server
+        self.pipeline = server.pipeline
+        self.ws = ws
+        self.session_id = uuid.uuid4().hex
+        self.mode = "clip"
+        self.mime = "audio/wav"
+        self.sample_rate = 16000
+        # 보낼 메시지 (가득 차면 합성 쪽이 기다림 = 느린 클라이언트에 대한 역압)
+        self._outbox: asyncio.Queue = asyncio.Queue(maxsize=server.send_queue)
+        self._turn: Optional[Turn] = None
+        self._task: Optional[asyncio.Task] = None
+        self._turn_ids = itertools.count(1)
+        self._stream: Optional[StreamingSTT] = None
+        self._clip: Optional[Dict] = None
+        self.call_id: Optional[str] = None
+
+    # ─────────────────────────────────────────────
+    # 송신
+    # ─────────────────────────────────────────────
+    async def _send(self, *messages: Union[str, bytes]):
+        """메시지 묶음을 순서대로 보냄 (reply + 오디오처럼 사이에 다른 메시지가 끼면 안 되는 것)"""
+        await self._outbox.put(messages)
+
+    async def _send_json(self, **payload):
+        await self._send(json.dumps(payload, ensure_ascii=False))
+
+    async def _sender(self):
+        try:
+            while True:
+                messages = await self._outbox.get()
+                for message in messages:
+                    await asyncio.wait_for(self.ws.send(message), self.server.send_timeout)
+        except asyncio.TimeoutError:
+            # 클라이언트가 send_timeout 동안 받지 않음 → 버퍼가 무한히 쌓이지 않게 연결 종료
+            self.server.count("dropped_slow")
+            logger.warning(f"느린 클라이언트 연결 종료: {self.session_id}")
+            await self.ws.close(CLOSE_SLOW, "client too slow")
+
+    # ─────────────────────────────────────────────
+    # 수신
+    # ─────────────────────────────────────────────
+    async def run(self):
+        start = json.loads(await asyncio.wait_for(self.ws.recv(), self.server.start_timeout))
+        if start.get("type") != "start":
+            raise ValueError("첫 메시지는 start여야 합니다")
+        self.session_id = start.get("session_id") or self.session_id
+        self.mode = start.get("mode", "clip")
+        self.mime = start.get("mime", self.mime)
+        self.sample_rate = int(start.get("sample_rate", self.sample_rate))
+        if self.server.store is not None:
+            self.call_id = self.server.store.start_call(start.get("elder_id") or self.session_id,
+                                                        session_id=self.session_id)
+
+        sender = asyncio.create_task(self._sender())
+        live = None
+        try:
+            tts = self.pipeline.tts
+            await self._send_json(type="ready", session_id=self.session_id,
+                                  audio=tts.mime_type if tts else "audio/mpeg")
+            greeting = bool(start.get("greeting") and self.pipeline.llm)
+            if greeting and self.mode != "live":
+                self._begin(self._greeting_turn())
+            if self.mode == "live":
+                self._stream = StreamingSTT(api_key=self.server.live_api_key, url=self.server.live_url,
+                                            sample_rate=self.sample_rate,
+                                            utterance_end_ms=self.server.utterance_end_ms)
+                await self._stream.start()
+                live = asyncio.create_task(self._live(greeting))
+
+            async for message in self.ws:
+                if isinstance(message, bytes):
+                    await self._on_audio(message)
+                else:
+                    await self._on_control(json.loads(message))
+        finally:
+            if self._turn is not None:
+                self.pipeline.interrupt(self._turn, "closed")
+            tasks = [task for task in (self._task, live) if task is not None]
+            for task in tasks:
+                task.cancel()
+            # 턴 정리(끊긴 데까지 문맥 기록)가 끝날 때까지 대기
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if self._stream is not None:
+                await self._stream.close()
+            sender.cancel()
+            if self.call_id is not None:
+                self.server.store.end_call(self.call_id)
+
+    async def _on_audio(self, data: bytes):
+        if self.mode == "live":
+            await self._stream.send(data)
+            return
+        header, self._clip = self._clip or {}, None
+        turn_id = header.get("turn") or next(self._turn_ids)
+        self._begin(self._clip_turn(turn_id, data, header.get("mime", self.mime)))
+
+    async def _on_control(self, data: Dict):
+        kind = data.get("type")
+        if kind == "clip":
+            self._clip = data
+        elif kind == "text":
+            self._begin(self._text_turn(data.get("turn") or next(self._turn_ids), data.get("text", "")))
+        elif kind == "stop":
+            if self._turn is not None:
+                self.pipeline.interrupt(self._turn, "stop")
+        elif kind == "end":
+            if self._stream is not None:
+                await self._stream.finish()
+        else:
+            await self._send_json(type="error", message=f"알 수 없는 메시지: {kind}")
+
+    # ─────────────────────────────────────────────
+    # 턴
+    # ─────────────────────────────────────────────
+    def _begin(self, coro):
+        """새 턴 시작 (말하던 턴은 끊고, 이전 턴이 정리된 뒤 순서대로 실행)"""
+        if self._turn is not None:
+            self.pipeline.interrupt(self._turn, "barge_in")
+        previous = self._task
+        self._task = asyncio.create_task(self._after(previous, coro))
+
+    async def _after(self, previous: Optional[asyncio.Task], coro):
+        if previous is not None:
+            await asyncio.gather(previous, return_exceptions=True)
+        try:
+            await coro
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"턴 처리 실패 ({self.session_id}): {e}")
+            await self._send_json(type="error", message=str(e))
+
+    def _record(self, user_text: Optional[str], reply: str, trace: Optional[Dict] = None):
+        """통화 기록 저장 (대기열에 넣기만 함)"""
+        if self.call_id is not None and (user_text or reply):
+            self.server.store.record_turn(self.call_id, user_text, reply, trace)
+
+    def _new_turn(self, turn_id: int) -> Turn:
+        turn = Turn(session_id=self.session_id, trace=self.pipeline.start_trace(self.session_id))
+        turn.trace.tags["transport"] = "ws"
+        turn.trace.tags["turn"] = turn_id
+        return turn
+
+    async def _greeting_turn(self, feed: Optional[_EventFeed] = None) -> Optional[TranscriptEvent]:
+        """인사말 (turn 0, 다른 턴처럼 정지/말 끊기로 멈춤)"""
+        turn = self._new_turn(0)
+        self._turn = turn
+        turn.reply_parts.append(self.pipeline.llm.get_greeting())
+        return await self._speak(0, turn, self._greeting_audio(turn), feed)
+
+    async def _greeting_audio(self, turn: Turn) -> AsyncIterator[bytes]:
+        audio = await self.pipeline.speak(turn.reply, turn.trace, cancel=turn.cancel)
+        if audio and not turn.cancel.cancelled:
+            turn.spoken = 1
+            yield audio
+
+    async def _clip_turn(self, turn_id: int, audio: bytes, mime_type: str):
+        turn = self._new_turn(turn_id)
+        self._turn = turn
+        turn.user_text = await self.pipeline.transcribe(audio, mime_type, turn.trace)
+        await self._send_json(type="transcript", turn=turn_id, text=turn.user_text or "", final=True)
+        await self._speak(turn_id, turn, self.pipeline.stream_reply(turn))
+
+    async def _text_turn(self, turn_id: int, text: str):
+        turn = self._new_turn(turn_id)
+        self._turn = turn
+        turn.user_text = text.strip() or None
+        await self._speak(turn_id, turn, self.pipeline.stream_reply(turn))
+
+    async def _speak(self, turn_id: int, turn: Turn, audio_stream: AsyncIterator[bytes],
+                     feed: Optional[_EventFeed] = None) -> Optional[TranscriptEvent]:
+        """
+        응답 오디오를 문장 단위로 보내고 turn_end로 마무리
+
+        feed를 주면 말하는 동안 실시간 인식을 감시해 사용자가 말을 시작하면 끊습니다.
+
+        Returns:
+            말 끊기를 일으킨 인식 이벤트 (없으면 None)
+        """
+        watcher = None
+        try:
+            async for audio in audio_stream:
+                if feed is not None and watcher is None:
+                    watcher = asyncio.create_task(
+                        self.pipeline.watch_barge_in(feed, turn, self.server.barge_in_chars))
+                text = turn.reply_parts[turn.spoken - 1] if turn.spoken else ""
+                await self._send(json.dumps({"type": "reply", "turn": turn_id, "text": text}, ensure_ascii=False), audio)
+        finally:
+            await audio_stream.aclose()
+            if self._turn is turn:
+                self._turn = None
+        if feed is not None and not turn.user_text and not turn.reply_parts:
+            # live: 아무 말 없이 인식이 끝남
+            return None
+
+        trigger = None
+        if watcher is not None:
+            if watcher.done():
+                trigger = watcher.result()
+            else:
+                watcher.cancel()
+        record = turn.trace.finish()
+        reply = turn.spoken_reply if turn.interrupted else turn.reply
+        self._record(turn.user_text, reply, record)
+        self.server.count("turns")
+        if turn.interrupted:
+            self.server.count("interrupted")
+        await self._send_json(
+            type="turn_end", turn=turn_id, user=turn.user_text, reply=reply,
+            interrupted=turn.interrupted, total_ms=record["total_ms"],
+        )
+        return trigger
+
+    async def _live(self, greeting: bool = False):
+        """실시간 인식 → (추측 생성) → 응답, UtteranceEnd마다 한 턴 (greeting이면 인사말부터)"""
+        feed = _EventFeed()
+
+        async def pump():
+            # 인식 이벤트를 클라이언트에 중계하면서 턴 처리 쪽으로 넘김
+            try:
+                async for event in self._stream.events():
+                    if event.text:
+                        await self._send_json(type="transcript", text=event.text, final=event.is_final)
+                    feed.put(event)
+            finally:
+                feed.put(None)
+
+        pumping = asyncio.create_task(pump())
+        try:
+            if greeting:
+                # 인사말 중에 말을 시작하면 끊고 그 말로 첫 턴
+                trigger = await self._greeting_turn(feed)
+                if trigger is not None:
+                    feed.push_back(trigger)
+            while not feed.closed:
+                turn_id = next(self._turn_ids)
+                turn = self._new_turn(turn_id)
+                self._turn = turn
+                trigger = await self._speak(turn_id, turn, self.pipeline.speculative_reply(feed, turn), feed)
+                if trigger is not None:
+                    feed.push_back(trigger)
+        finally:
+            pumping.cancel()
+
+
+class CallServer:
+    """
+    웹소켓 통화 서버
+
+    사용 예:
+        async with CallServer(pipeline, port=8765) as server:
+            await asyncio.Future()   # 계속 실행
+    """
+
+    def __init__(
+        self,
+        pipeline: PipelineRunner,
+        host: Optional[str] = None,
+        port: int = 8765,
+        max_calls: int = 64,
+        send_queue: int = 16,
+        send_timeout: float = 10.0,
+        start_timeout: float = 10.0,
+        live_url: str = DEEPGRAM_LISTEN_URL,
+        live_api_key: Optional[str] = None,
+        utterance_end_ms: int = 1000,
+        barge_in_chars: int = 2,
+        store: Optional[TranscriptStore] = None,
+    ):
+        """
+        Args:
+            pipeline: STT/LLM/TTS 파이프라인 (모든 통화가 공유)
+            host: 바인딩 주소 (None이면 CALL_SERVER_HOST 또는 127.0.0.1, 인증이 없으므로
+                다른 기기에서 접속할 때만 0.0.0.0)
+            port: 포트 (0이면 자동 할당)
+            max_calls: 동시 통화 수 (넘으면 busy로 거절)
+            send_queue: 연결별 송신 대기 메시지 수 (가득 차면 합성이 기다림)
+            send_timeout: 클라이언트가 이 시간 동안 받지 않으면 연결 종료 (초)
+            start_timeout: 연결 후 start 메시지 대기 (초)
+            live_url: 실시간 인식 주소 (live 모드, 로컬 가짜 서버로 바꿀 수 있음)
+            live_api_key: 실시간 인식 API 키 (None이면 환경변수/Secrets에서 로드)
+            utterance_end_ms: live 모드 턴 종료로 볼 단어 사이 공백 (ms)
+            barge_in_chars: 말하는 중 이만큼 인식되면 응답을 끊음
+            store: 통화 기록 저장소 (None이면 기록 안 함)
+        """
+        self.pipeline = pipeline
+        self.host = host or os.getenv("CALL_SERVER_HOST", "127.0.0.1")
+        self.port = port
+        self.max_calls = max_calls
+        self.send_queue = send_queue
+        self.send_timeout = send_timeout
+        self.start_timeout = start_timeout
+        self.live_url = live_url
+        self.live_api_key = live_api_key
+        self.utterance_end_ms = utterance_end_ms
+        self.barge_in_chars = barge_in_chars
+        self.store = store
+        self.url: Optional[str] = None
+        self.stats: Dict[str, int] = {
+            "active": 0, "calls": 0, "rejected": 0, "turns": 0, "interrupted": 0, "dropped_slow": 0, "errors": 0,
+        }
+        self._server = None
+
+    def count(self, key: str, amount: int = 1):
+        self.stats[key] += amount
+
+    async def start(self):
+        # 수신 대기열을 작게 두면 처리보다 빨리 들어오는 오디오는 TCP 단에서 막힘
+        self._server = await websockets.serve(self._handle, self.host, self.port, max_size=None, max_queue=16)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self.url = f"ws://{'127.0.0.1' if self.host == '0.0.0.0' else self.host}:{self.port}"
+        logger.info(f"통화 서버 시작: {self.url} (최대 {self.max_calls}통화)")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    async def _handle(self, ws, path: Optional[str] = None):
+        if self.stats["active"] >= self.max_calls:
+            self.count("rejected")
+            await ws.send(json.dumps({"type": "busy"}))
+            await ws.close(CLOSE_BUSY, "busy")
+            return
+
+        self.count("active")
+        self.count("calls")
+        session = CallSession(self, ws)
+        try:
+            await session.run()
+        except asyncio.TimeoutError:
+            logger.warning("start 메시지 없이 대기 시간 초과 - 연결 종료")
+        except websockets.ConnectionClosed:
+            pass
+        except Exception as e:
+            self.count("errors")
+            logger.error(f"통화 처리 실패 ({session.session_id}): {e}")
+        finally:
+            self.count("active", -1)
+            await ws.close()
+
+
+# ─────────────────────────────────────────────
+# 클라이언트
+# ─────────────────────────────────────────────
+@dataclass
+class CallEvent:
+    """서버에서 받은 이벤트 하나"""
+    type: str                       # transcript / audio / turn_end / error
+    turn: Optional[int] = None
+    text: str = ""
+    audio: Optional[bytes] = None
+    data: Dict = field(default_factory=dict)
+
+
+class CallClient:
+    """
+    통화 서버 클라이언트 (Streamlit 페이지 같은 얇은 클라이언트용)
+
+    받기는 백그라운드 작업이 계속 하므로 화면이 멈춰 있어도 서버가 막히지 않고,
+    지난 턴의 메시지는 버립니다.
+
+    사용 예:
+        async with CallClient("ws://localhost:8765", session_id) as call:
+            async for event in call.say(wav_bytes):
+                if event.type == "audio":
+                    play(event.audio)
+    """
+
+    def __init__(
+        self,
+        url: str,
+        session_id: Optional[str] = None,
+        mode: str = "clip",
+        mime: str = "audio/wav",
+        greeting: bool = False,
+        elder_id: Optional[str] = None,
+    ):
+        """
+        Args:
+            url: 통화 서버 주소 (ws://...)
+            session_id: 대화 세션 ID (None이면 서버가 정함)
+            mode: clip(발화 단위 업로드) / live(PCM 프레임 스트리밍)
+            mime: clip 모드 기본 오디오 형식
+            greeting: 연결하자마자 인사말 (turn 0)
+            elder_id: 통화 기록에 남길 어르신 ID (None이면 세션 ID)
+        """
+        self.url = url
+        self.session_id = session_id
+        self.mode = mode
+        self.mime = mime
+        self.greeting = greeting
+        self.elder_id = elder_id
+        self.audio_mime = "audio/mpeg"   # 서버가 ready에서 알려 준 합성 오디오 형식
+        self.spoken: List[str] = []     # 지금 턴에서 받은 문장 (말 끊기 시 표시용)
+        self._ws = None
+        self._turn = 0
+        self._stopped = -1
+        self._inbox: asyncio.Queue = asyncio.Queue()
+        self._reader: Optional[asyncio.Task] = None
+
+    @property
+    def closed(self) -> bool:
+        return self._ws is None or self._reader is None or self._reader.done()
+
+    @property
+    def spoken_reply(self) -> str:
+        return " ".join(self.spoken)
+
+    async def connect(self):
+        self._ws = await websockets.connect(self.url, max_size=None)
+        await self._ws.send(json.dumps({
+            "type": "start", "session_id": self.session_id, "elder_id": self.elder_id, "mode": self.mode,
+            "mime": self.mime, "greeting": self.greeting,
+        }))
+        ready = json.loads(await self._ws.recv())
+        if ready.get("type") != "ready":
+            await self._ws.close()
+            self._ws = None
+            raise ConnectionError(f"통화 서버 연결 거절: {ready.get('type')}")
+        self.session_id = ready["session_id"]
+        self.audio_mime = ready.get("audio", self.audio_mime)
+        self._reader = asyncio.create_task(self._read())
+
+    async def close(self):
+        if self._ws is not None:
+            await self._ws.close()
+        if self._reader is not None:
+            await asyncio.gather(self._reader, return_exceptions=True)
+        self._ws = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _read(self):
+        reply = None
+        try:
+            async for message in self._ws:
+                if isinstance(message, bytes):
+                    event = CallEvent("audio", reply.get("turn"), reply.get("text", ""), message, reply)
+                else:
+                    data = json.loads(message)
+                    if data.get("type") == "reply":
+                        reply = data
+                        continue
+                    event = CallEvent(data.get("type", ""), data.get("turn"), data.get("text") or "", None, data)
+                # 끊고 넘어간 지난 턴의 메시지, 멈춘 턴에서 이미 보내져 있던 오디오는 버림
+                if event.turn is not None and 0 < event.turn < self._turn:
+                    continue
+                if event.type == "audio" and event.turn == self._stopped:
+                    continue
+                self._inbox.put_nowait(event)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self._inbox.put_nowait(None)
+
+    async def events(self, turn: Optional[int] = None) -> AsyncIterator[CallEvent]:
+        """
+        한 턴의 이벤트 (turn_end까지)
+
+        Args:
+            turn: 기다릴 턴 번호 (None이면 turn_end가 올 때까지 모든 이벤트, 인사말/live 모드용)
+        """
+        while True:
+            event = await self._inbox.get()
+            if event is None:
+                return
+            if turn is not None and event.turn not in (turn, None):
+                continue
+            if event.type == "audio":
+                self.spoken.append(event.text)
+            yield event
+            if event.type == "turn_end":
+                return
+
+    def _next_turn(self) -> int:
+        self._turn += 1
+        self.spoken = []
+        return self._turn
+
+    async def say(self, audio: bytes, mime: Optional[str] = None) -> AsyncIterator[CallEvent]:
+        """발화 하나를 보내고 인식 결과, 문장별 오디오, turn_end를 차례로 받음"""
+        turn = self._next_turn()
+        await self._ws.send(json.dumps({"type": "clip", "turn": turn, "mime": mime or self.mime}))
+        await self._ws.send(audio)
+        async for event in self.events(turn):
+            yield event
+
+    async def say_text(self, text: str) -> AsyncIterator[CallEvent]:
+        """텍스트로 한 턴 (인식 없이)"""
+        turn = self._next_turn()
+        await self._ws.send(json.dumps({"type": "text", "turn": turn, "text": text}, ensure_ascii=False))
+        async for event in self.events(turn):
+            yield event
+
+    async def send_pcm(self, pcm: bytes):
+        """live 모드 PCM 프레임"""
+        await self._ws.send(pcm)
+
+    async def stop(self):
+        """말하던 응답 끊기"""
+        if self._ws is not None:
+            self._stopped = self._turn
+            await self._ws.send(json.dumps({"type": "stop"}))
+
+
+def build_pipeline(offline: bool = False) -> PipelineRunner:
+    """앱과 같은 구성의 파이프라인 (offline이면 가짜 공급자)"""
+    from LLM import LLM
+    from STT import STT
+    from TTS import TTS
+    from VAD import VAD
+    from audio_cache import AudioCache
+    from codec import AudioEncoder
+    from dispatcher import dispatcher_from_env
+    from metrics import MetricsRegistry, TraceLog
+
+    if offline:
+        from fake_providers import FakeDeepgramClient, FakeGenerativeModel, LatencyModel, make_fake_communicate
+        stt = STT(api_key="offline", client=FakeDeepgramClient(LatencyModel(300)))
+        llm = LLM(api_key="offline", model=FakeGenerativeModel(LatencyModel(600)))
+        tts = TTS(communicate=make_fake_communicate(LatencyModel(250)))
+    else:
+        # 키는 각 모듈이 환경변수/Secrets에서 (DEEPGRAM_API_KEY, GOOGLE_API_KEY)
+        stt = STT()
+        if stt.client:
+            stt.warm_up(background=True)
+        llm = LLM()
+        tts = TTS(voice="female_warm", rate="-5%", cache=AudioCache(),
+                  output_format=os.getenv("TTS_FORMAT", "mp3"), bitrate=int(os.getenv("TTS_BITRATE", "0")) or None)
+    metrics = MetricsRegistry()
+    return PipelineRunner(stt, llm, tts, vad=VAD(),
+                          encoder=AudioEncoder(os.getenv("STT_CODEC", "flac")),
+                          metrics=metrics,
+                          trace_log=TraceLog(os.getenv("TRACE_LOG", "logs/turns.jsonl")),
+                          dispatcher=dispatcher_from_env(metrics))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Haii-Call 웹소켓 통화 서버")
+    parser.add_argument("--host", default=None, help="바인딩 주소 (기본 CALL_SERVER_HOST 또는 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=int(os.getenv("CALL_SERVER_PORT", "8765")))
+    parser.add_argument("--max-calls", type=int, default=64, help="동시 통화 수")
+    parser.add_argument("--offline", action="store_true", help="가짜 공급자 사용 (API 키 없이 시험)")
+    args = parser.parse_args()
+
+    pipeline = build_pipeline(args.offline)
+    store = TranscriptStore(os.getenv("TRANSCRIPT_DB", "data/transcripts.db"))
+
+    async def serve():
+        # --offline이면 live 모드 실시간 인식도 로컬 가짜 Deepgram 서버로
+        fake = None
+        if args.offline:
+            from fake_deepgram import FakeDeepgramServer
+            fake = FakeDeepgramServer()
+            await fake.start()
+        try:
+            async with CallServer(pipeline, host=args.host, port=args.port, max_calls=args.max_calls,
+                                  live_url=fake.url if fake else DEEPGRAM_LISTEN_URL,
+                                  live_api_key="offline" if fake else None, store=store):
+                await asyncio.Future()
+        finally:
+            if fake is not None:
+                await fake.stop()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    main()
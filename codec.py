@@ -0,0 +1,277 @@
+"""
+codec.py - 오디오 압축
+STT 업로드: 녹음 WAV(16-bit PCM) → FLAC(무손실) / Opus(손실) 인코딩 + 턴별 절감량 기록
+TTS 출력: Edge TTS MP3 → 전달 경로에 맞는 형식/비트레이트 (저비트레이트 Opus, 로컬 재생용 PCM 등)
+"""
+import io
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Optional, Tuple
+
+import soundfile as sf
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [CODEC] %(message)s')
+logger = logging.getLogger(__name__)
+
+# 코덱 이름 → (MIME 타입, libsndfile 포맷, 서브타입)
+CODECS = {
+    "wav": ("audio/wav", None, None),
+    "flac": ("audio/flac", "FLAC", "PCM_16"),
+    "opus": ("audio/ogg", "OGG", "OPUS"),
+}
+
+# TTS 출력 형식 → (MIME 타입, 확장자, libsndfile 포맷, 서브타입, 기본 비트레이트 kbps)
+# mp3에 비트레이트를 주지 않으면 Edge TTS 원본(24kHz, 48kbps)을 다시 인코딩하지 않고 그대로
+TTS_FORMATS = {
+    "mp3": ("audio/mpeg", ".mp3", "MP3", "MPEG_LAYER_III", None),
+    "opus": ("audio/ogg", ".ogg", "OGG", "OPUS", 24),
+    "pcm": ("audio/wav", ".wav", "WAV", "PCM_16", None),
+}
+
+# 청크(문장별 파일)를 이어 붙여도 한 스트림으로 재생되는 형식 (MP3는 프레임 단위라 가능,
+# Ogg/WAV는 청크마다 헤더가 있어 따로 재생해야 함)
+CONCATENABLE = ("audio/mpeg",)
+
+# Edge TTS 원본 MP3 비트레이트 (kbps, 디코딩 못 할 때 길이 추정용)
+EDGE_MP3_KBPS = 48
+
+
+@dataclass
+class EncodeStats:
+    """턴 하나의 인코딩 결과"""
+    codec: str
+    raw_bytes: int
+    encoded_bytes: int
+    encode_ms: float
+
+    @property
+    def saved_bytes(self) -> int:
+        return self.raw_bytes - self.encoded_bytes
+
+    @property
+    def ratio(self) -> float:
+        """압축 후 / 압축 전 크기"""
+        return self.encoded_bytes / self.raw_bytes if self.raw_bytes else 1.0
+
+
+class AudioEncoder:
+    """WAV → 선택한 코덱으로 인코딩"""
+
+    def __init__(
+        self,
+        codec: str = "flac",
+        compression_level: Optional[float] = None,
+        history: int = 200,
+    ):
+        """
+        Args:
+            codec: wav(그대로), flac(무손실), opus(손실, 가장 작음)
+            compression_level: libsndfile 압축 수준 (0.0 ~ 1.0, None이면 기본값)
+            history: 보관할 최근 턴 통계 수
+        """
+        if codec not in CODECS:
+            raise ValueError(f"지원하지 않는 코덱: {codec} (가능: {', '.join(CODECS)})")
+        self.codec = codec
+        self.mime_type = CODECS[codec][0]
+        self.compression_level = compression_level
+        self.stats: Deque[EncodeStats] = deque(maxlen=history)
+
+    def encode(self, wav_bytes: bytes) -> Tuple[bytes, str]:
+        """
+        WAV 인코딩
+
+        Args:
+            wav_bytes: 16-bit PCM WAV
+
+        Returns:
+            (인코딩된 바이트, MIME 타입), 실패하면 원본 WAV 그대로
+        """
+        _, fmt, subtype = CODECS[self.codec]
+        if fmt is None:
+            return wav_bytes, "audio/wav"
+
+        start = time.perf_counter()
+        try:
+            data, sample_rate = sf.read(io.BytesIO(wav_bytes), dtype="int16")
+            out = io.BytesIO()
+            sf.write(
+                out, data, sample_rate,
+                format=fmt, subtype=subtype,
+                compression_level=self.compression_level,
+            )
+            encoded = out.getvalue()
+        except Exception as e:
+            logger.warning(f"{self.codec} 인코딩 실패, WAV 그대로 전송: {e}")
+            return wav_bytes, "audio/wav"
+
+        stat = EncodeStats(
+            codec=self.codec,
+            raw_bytes=len(wav_bytes),
+            encoded_bytes=len(encoded),
+            encode_ms=(time.perf_counter() - start) * 1000,
+        )
+        self.stats.append(stat)
+        logger.info(
+            f"{self.codec} 인코딩: {stat.raw_bytes} → {stat.encoded_bytes} bytes "
+            f"({stat.ratio:.0%}, {stat.encode_ms:.1f}ms)"
+        )
+        return encoded, self.mime_type
+
+    def summary(self) -> Dict:
+        """최근 턴 합계 (배포 환경별 코덱 선택용)"""
+        raw = sum(s.raw_bytes for s in self.stats)
+        encoded = sum(s.encoded_bytes for s in self.stats)
+        turns = len(self.stats)
+        return {
+            "codec": self.codec,
+            "turns": turns,
+            "raw_bytes": raw,
+            "encoded_bytes": encoded,
+            "saved_bytes": raw - encoded,
+            "ratio": encoded / raw if raw else 1.0,
+            "avg_encode_ms": sum(s.encode_ms for s in self.stats) / turns if turns else 0.0,
+        }
+
+
+def compression_for(output_format: str, kbps: float, sample_rate: int) -> float:
+    """
+    목표 비트레이트 → libsndfile 압축 수준 (0.0 ~ 1.0)
+
+    libsndfile은 비트레이트 대신 압축 수준을 받습니다. Opus는 256kbps(0.0)에서
+    6kbps(1.0)까지 직선, MP3(고정 비트레이트)는 최대 비트레이트(24kHz 이하 MPEG-2
+    160, 그 위 320)에서 직선으로 내려가다 위쪽 표준 비트레이트로 올림되므로 조금 낮춰 줍니다.
+    """
+    if output_format == "opus":
+        level = (256.0 - kbps) / 250.0
+    else:
+        level = 1.0 - (kbps - 4.0) / (320.0 if sample_rate >= 32000 else 160.0)
+    # MP3는 1.0을 받지 않음
+    return min(max(level, 0.0), 0.99)
+
+
+class SpeechEncoder:
+    """
+    합성 음성(Edge TTS MP3) → 출력 형식 변환 + 음성 1초당 바이트 집계
+
+    사용 예:
+        encoder = SpeechEncoder("opus", bitrate=16)
+        audio = encoder.encode(mp3_bytes)   # Ogg Opus, encoder.mime_type == "audio/ogg"
+    """
+
+    def __init__(self, output_format: str = "mp3", bitrate: Optional[int] = None):
+        """
+        Args:
+            output_format: mp3, opus(브라우저용 저비트레이트), pcm(로컬 재생, 디코딩 없음)
+            bitrate: 목표 비트레이트 (kbps, None이면 형식 기본값, pcm은 무시)
+        """
+        if output_format not in TTS_FORMATS:
+            raise ValueError(f"지원하지 않는 출력 형식: {output_format} (가능: {', '.join(TTS_FORMATS)})")
+        self.output_format = output_format
+        self.mime_type, self.extension, self._format, self._subtype, default = TTS_FORMATS[output_format]
+        self.bitrate = None if output_format == "pcm" else (bitrate or default)
+        # 원본 MP3를 그대로 쓰는지 (변환 없음)
+        self.passthrough = output_format == "mp3" and self.bitrate is None
+        self.stats: Dict[str, float] = {
+            "clips": 0, "failed": 0, "seconds": 0.0, "bytes": 0, "source_bytes": 0, "encode_ms": 0.0,
+        }
+        self._lock = threading.Lock()
+
+    @property
+    def key(self) -> str:
+        """캐시 키에 붙일 형식 이름 (원본 MP3면 빈 문자열 - 기존 캐시 유지)"""
+        if self.passthrough:
+            return ""
+        return f"{self.output_format}@{self.bitrate}" if self.bitrate else self.output_format
+
+    @property
+    def concatenable(self) -> bool:
+        """청크를 이어 붙여 한 스트림으로 보낼 수 있는지"""
+        return self.mime_type in CONCATENABLE
+
+    def encode(self, mp3: bytes) -> Optional[bytes]:
+        """
+        MP3 → 출력 형식
+
+        Returns:
+            변환된 오디오 (원본 MP3 출력이면 그대로), 디코딩/인코딩 실패하면 None
+        """
+        start = time.perf_counter()
+        if self.passthrough:
+            # Edge TTS MP3는 고정 비트레이트라 길이는 크기로 계산 (이벤트 루프에서 불려도 디코딩 없음)
+            self._count(len(mp3) * 8 / (EDGE_MP3_KBPS * 1000), mp3, mp3, start)
+            return mp3
+
+        try:
+            data, sample_rate = sf.read(io.BytesIO(mp3), dtype="int16")
+            out = io.BytesIO()
+            level = compression_for(self.output_format, self.bitrate, sample_rate) if self.bitrate else None
+            sf.write(
+                out, data, sample_rate,
+                format=self._format, subtype=self._subtype,
+                compression_level=level,
+                bitrate_mode="CONSTANT" if self.output_format == "mp3" else None,
+            )
+        except Exception as e:
+            with self._lock:
+                self.stats["failed"] += 1
+            logger.warning(f"{self.output_format} 변환 실패: {e}")
+            return None
+        encoded = out.getvalue()
+        self._count(len(data) / sample_rate, mp3, encoded, start)
+        return encoded
+
+    def _count(self, seconds: float, source: bytes, encoded: bytes, start: float):
+        with self._lock:
+            stats = self.stats
+            stats["clips"] += 1
+            stats["seconds"] += seconds
+            stats["bytes"] += len(encoded)
+            stats["source_bytes"] += len(source)
+            stats["encode_ms"] += (time.perf_counter() - start) * 1000
+
+    def summary(self) -> Dict:
+        """형식별 음성 1초당 바이트 (전달량/대기 중 응답 메모리 비교용)"""
+        with self._lock:
+            stats = dict(self.stats)
+        seconds = stats["seconds"]
+        return {
+            "format": self.output_format,
+            "bitrate": self.bitrate,
+            "mime": self.mime_type,
+            "clips": int(stats["clips"]),
+            "failed": int(stats["failed"]),
+            "speech_seconds": round(seconds, 2),
+            "bytes": int(stats["bytes"]),
+            "bytes_per_second": round(stats["bytes"] / seconds) if seconds else 0,
+            "vs_edge_mp3": round(stats["bytes"] / stats["source_bytes"], 3) if stats["source_bytes"] else 1.0,
+            "avg_encode_ms": round(stats["encode_ms"] / stats["clips"], 2) if stats["clips"] else 0.0,
+        }
+
+
+# 테스트
+if __name__ == "__main__":
+    import numpy as np
+
+    # 실제 Edge TTS 없이: 모음 포먼트 + 억양(피치 변화) + 말 사이 쉼이 있는 음성 비슷한 신호를
+    # Edge TTS와 같은 24kHz 48kbps MP3로 만든 뒤 형식별로 변환
+    rate = 24000
+    t = np.arange(rate * 12) / rate
+    pitch = 190 + 40 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / rate
+    voice = sum(np.sin(k * phase) / k * (1 + np.sin(2 * np.pi * (500 + 700 * (k % 3)) * t / rate * 40)) for k in range(1, 12))
+    envelope = (np.sin(2 * np.pi * 2.5 * t) > -0.3) * (np.sin(2 * np.pi * 0.25 * t) > -0.8)
+    signal = (0.12 * voice * envelope + 0.002 * np.random.default_rng(0).standard_normal(len(t))).astype("float32")
+    source = io.BytesIO()
+    sf.write(source, signal, rate, format="MP3", subtype="MPEG_LAYER_III",
+             compression_level=compression_for("mp3", EDGE_MP3_KBPS, rate), bitrate_mode="CONSTANT")
+    mp3 = source.getvalue()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    for fmt, bitrate in (("mp3", None), ("mp3", 32), ("mp3", 24), ("opus", 32), ("opus", 24), ("opus", 16), ("opus", 12), ("pcm", None)):
+        encoder = SpeechEncoder(fmt, bitrate)
+        for _ in range(3):
+            encoder.encode(mp3)
+        print(encoder.summary())
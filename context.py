@@ -0,0 +1,234 @@
+"""
+context.py - 대화 문맥 관리
+최근 N턴은 그대로, 오래된 턴은 누적 요약으로 접어 요청당 토큰 예산 안에서 프롬프트 구성
+"""
+import logging
+import re
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [CONTEXT] %(message)s')
+logger = logging.getLogger(__name__)
+
+_HANGUL = re.compile(r"[가-힣]")
+
+# 요약을 프롬프트 앞에 넣을 때 쓰는 문구 (user/model 한 쌍)
+SUMMARY_PREFIX = "(지금까지 나눈 이야기 요약: {summary})"
+SUMMARY_ACK = "네, 기억하고 이어서 이야기할게요."
+
+# 사용자가 말을 끊어 응답이 중간에 멈춘 턴 표시 (모델도 보고 이어서 말할 수 있게)
+TRUNCATED_MARK = " …(말이 끊김)"
+
+# (이전 요약, 접을 턴 목록) → 새 요약
+Summarizer = Callable[[str, List[Tuple[str, str]]], str]
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    토큰 수 추정 (API 호출 없이)
+
+    Gemini 토크나이저 기준 한글 음절은 대략 1토큰, 그 외 문자는 4자당 1토큰
+    """
+    if not text:
+        return 0
+    hangul = len(_HANGUL.findall(text))
+    return hangul + (len(text) - hangul + 3) // 4
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """앞부분(오래된 내용)부터 잘라 max_tokens 이하로"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if estimate_tokens(text[mid:]) <= max_tokens:
+            hi = mid
+        else:
+            lo = mid + 1
+    return "…" + text[lo:].lstrip()
+
+
+def extractive_summary(summary: str, turns: List[Tuple[str, str]], max_chars: int = 40) -> str:
+    """
+    LLM 없이 만드는 요약 (어르신 발화 앞부분만 이어 붙임)
+
+    요약 모델이 없거나 실패했을 때의 대체 경로
+    """
+    points = [user[:max_chars].strip() for user, _ in turns if user.strip()]
+    if not points:
+        return summary
+    added = "어르신 말씀: " + " / ".join(points)
+    return f"{summary} {added}".strip() if summary else added
+
+
+class ContextWindow:
+    """
+    세션 하나의 대화 문맥
+
+    사용 예:
+        window = ContextWindow(max_turns=6, token_budget=1500)
+        contents = window.build("약 먹었어")     # Gemini contents 형식
+        ...
+        window.add("약 먹었어", reply, prompt_tokens=usage.prompt_token_count)
+    """
+
+    def __init__(
+        self,
+        max_turns: int = 6,
+        token_budget: int = 1500,
+        summary_tokens: int = 200,
+        fold_batch: int = 4,
+        summarizer: Optional[Summarizer] = None,
+    ):
+        """
+        Args:
+            max_turns: 그대로 보낼 최근 턴 수 (턴 = 사용자 발화 + 응답)
+            token_budget: 요청 하나의 프롬프트 토큰 상한 (요약 + 최근 턴 + 새 입력)
+            summary_tokens: 누적 요약의 토큰 상한
+            fold_batch: 요약으로 한 번에 접는 턴 수 (요약 호출 빈도 조절)
+            summarizer: 요약 함수 (None이면 extractive_summary)
+        """
+        self.max_turns = max(1, max_turns)
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+        self.fold_batch = max(1, fold_batch)
+        self.summarizer = summarizer
+        self.summary = ""
+        self.turns: Deque[Tuple[str, str]] = deque()
+        self.stats = {
+            "requests": 0,
+            "prompt_tokens": 0,
+            "output_tokens": 0,
+            "last_prompt_tokens": 0,
+            "folded_turns": 0,
+            "dropped_turns": 0,
+            "truncated_turns": 0,
+        }
+
+    # ─────────────────────────────────────────────
+    # 프롬프트 구성
+    # ─────────────────────────────────────────────
+    def build(self, user_input: str) -> List[Dict]:
+        """
+        이번 요청에 보낼 contents (요약 → 최근 턴 → 새 입력)
+
+        예산을 넘으면 오래된 최근 턴부터 이번 요청에서 뺍니다
+        (저장된 턴은 그대로, 다음 접기 때 요약에 반영).
+
+        Args:
+            user_input: 새 사용자 입력
+
+        Returns:
+            [{"role": "user"|"model", "parts": [text]}, ...]
+        """
+        turns = list(self.turns)
+        summary = self.summary
+        used = estimate_tokens(user_input) + self._summary_cost(summary)
+        if summary and used > self.token_budget:
+            # 입력이 아주 길면 요약도 이번 요청에서만 줄임
+            room = self.token_budget - estimate_tokens(user_input) - self._summary_cost("")
+            summary = truncate_tokens(summary, max(0, room)) if room > 0 else ""
+            used = estimate_tokens(user_input) + self._summary_cost(summary)
+        costs = [estimate_tokens(u) + estimate_tokens(a) for u, a in turns]
+        while turns and used + sum(costs) > self.token_budget:
+            turns.pop(0)
+            costs.pop(0)
+            self.stats["dropped_turns"] += 1
+
+        contents: List[Dict] = []
+        if summary:
+            contents.append({"role": "user", "parts": [SUMMARY_PREFIX.format(summary=summary)]})
+            contents.append({"role": "model", "parts": [SUMMARY_ACK]})
+        for user, ai in turns:
+            contents.append({"role": "user", "parts": [user]})
+            contents.append({"role": "model", "parts": [ai]})
+        contents.append({"role": "user", "parts": [user_input]})
+
+        self.stats["last_prompt_tokens"] = used + sum(costs)
+        return contents
+
+    @staticmethod
+    def _summary_cost(summary: str) -> int:
+        if not summary:
+            return 0
+        return estimate_tokens(SUMMARY_PREFIX.format(summary=summary)) + estimate_tokens(SUMMARY_ACK)
+
+    # ─────────────────────────────────────────────
+    # 턴 기록
+    # ─────────────────────────────────────────────
+    def add(
+        self,
+        user_input: str,
+        reply: str,
+        prompt_tokens: Optional[int] = None,
+        output_tokens: Optional[int] = None,
+        truncated: bool = False,
+    ):
+        """
+        완료된 턴 기록 + 토큰 집계 (최근 턴이 넘치면 요약으로 접음)
+
+        Args:
+            user_input: 사용자 입력
+            reply: 응답 (끊긴 경우 실제로 내보낸 부분까지)
+            prompt_tokens: API가 알려준 프롬프트 토큰 수 (없으면 build 시 추정값)
+            output_tokens: API가 알려준 응답 토큰 수 (없으면 추정)
+            truncated: 사용자가 말을 끊어 응답이 중간에 멈춤
+        """
+        prompt = prompt_tokens if prompt_tokens is not None else self.stats["last_prompt_tokens"]
+        self.stats["requests"] += 1
+        self.stats["last_prompt_tokens"] = prompt
+        self.stats["prompt_tokens"] += prompt
+        self.stats["output_tokens"] += output_tokens if output_tokens is not None else estimate_tokens(reply)
+        self.remember(user_input, reply, truncated)
+
+    def remember(self, user_input: str, reply: str, truncated: bool = False):
+        """토큰 집계 없이 턴만 기록 (LLM을 거치지 않은 로컬 응답용)"""
+        if truncated:
+            reply = reply.strip() + TRUNCATED_MARK
+            self.stats["truncated_turns"] += 1
+        self.turns.append((user_input, reply))
+        # 요약 호출은 fold_batch 턴마다 한 번
+        if len(self.turns) >= self.max_turns + self.fold_batch:
+            self.fold(len(self.turns) - self.max_turns)
+
+    def fold(self, count: int):
+        """가장 오래된 count턴을 누적 요약으로 접음"""
+        old = [self.turns.popleft() for _ in range(min(count, len(self.turns)))]
+        if not old:
+            return
+        summary = None
+        if self.summarizer:
+            try:
+                summary = self.summarizer(self.summary, old)
+            except Exception as e:
+                logger.warning(f"요약 실패, 발화 발췌로 대체: {e}")
+        if not summary:
+            summary = extractive_summary(self.summary, old)
+        self.summary = truncate_tokens(summary.strip(), self.summary_tokens)
+        self.stats["folded_turns"] += len(old)
+        logger.info(f"{len(old)}턴 요약으로 접음 (요약 {estimate_tokens(self.summary)}토큰)")
+
+    @property
+    def history(self) -> List[Dict]:
+        """최근 턴 (role: user/ai, content, 끊긴 응답은 truncated=True)"""
+        out = []
+        for user, ai in self.turns:
+            out.append({"role": "user", "content": user})
+            if ai.endswith(TRUNCATED_MARK):
+                out.append({"role": "ai", "content": ai[:-len(TRUNCATED_MARK)], "truncated": True})
+            else:
+                out.append({"role": "ai", "content": ai})
+        return out
+
+
+# 테스트
+if __name__ == "__main__":
+    window = ContextWindow(max_turns=3, token_budget=200, summary_tokens=60, fold_batch=2)
+    for i in range(10):
+        text = f"{i}번째 이야기예요, 오늘은 산책을 다녀왔어요"
+        contents = window.build(text)
+        window.add(text, "잘 다녀오셨네요! 날씨는 어땠어요?")
+        print(f"턴 {i}: 메시지 {len(contents)}개, 프롬프트 {window.stats['last_prompt_tokens']}토큰")
+    print(f"요약: {window.summary}")
+    print(window.stats)
@@ -0,0 +1,306 @@
+"""
+dispatcher.py - 공급자별 동시 요청 제한 + 통화 입장 제어
+여러 통화가 Deepgram, Gemini, Edge TTS를 나눠 쓸 때 공급자마다 따로 자리(slot)를 두어
+느린 공급자 하나가 다른 단계까지 막지 않게 하고, 대기 중에는 실시간 턴을 배경 작업보다
+먼저, 같은 우선순위 안에서는 세션을 번갈아 가며 자리를 줍니다.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, nullcontext
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [DISPATCH] %(message)s')
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 우선순위 (작을수록 먼저)
+LIVE = 0            # 어르신이 기다리는 턴
+BACKGROUND = 1      # 미리 합성, 녹음 일괄 인식, 발신 준비 등
+PRIORITY_NAMES = {LIVE: "live", BACKGROUND: "background"}
+
+# 공급자별 기본 동시 요청 수 (DISPATCH_LIMITS=deepgram=16,gemini=8,edge_tts=12 로 변경)
+DEFAULT_LIMITS = {"deepgram": 16, "gemini": 8, "edge_tts": 12}
+
+
+def parse_limits(text: Optional[str]) -> Dict[str, int]:
+    """ "deepgram=16,gemini=8" → {"deepgram": 16, "gemini": 8} (빠진 공급자는 기본값)"""
+    limits = dict(DEFAULT_LIMITS)
+    for item in (text or "").split(","):
+        name, sep, value = item.partition("=")
+        if sep:
+            limits[name.strip()] = int(value)
+    return limits
+
+
+class ProviderPool:
+    """
+    공급자 하나의 동시 요청 자리
+
+    자리가 나면 가장 높은 우선순위에서, 기다리는 세션들을 돌아가며 한 건씩 줍니다
+    (한 세션이 요청을 여러 개 쌓아도 다른 세션이 뒤로 밀리지 않음). 자리는 끝난
+    요청에서 다음 요청으로 바로 넘어가므로 새로 온 요청이 새치기하지 않습니다.
+    """
+
+    def __init__(self, name: str, limit: int, metrics=None):
+        """
+        Args:
+            name: 공급자 이름 (지표 라벨)
+            limit: 동시에 보낼 최대 요청 수
+            metrics: 대기 시간/대기열 지표를 남길 MetricsRegistry (None이면 stats만)
+        """
+        self.name = name
+        self.limit = max(1, limit)
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._depth = 0
+        # 우선순위 → (세션 → 대기 중인 요청들), 세션 순서가 곧 다음 차례
+        self._waiting: Dict[int, "OrderedDict[str, Deque[asyncio.Future]]"] = {
+            priority: OrderedDict() for priority in PRIORITY_NAMES
+        }
+        self.stats: Dict[str, float] = {
+            "admitted": 0, "waited": 0, "cancelled": 0, "wait_seconds": 0.0,
+            "max_wait_s": 0.0, "max_depth": 0, "max_in_flight": 0,
+        }
+
+    # ─────────────────────────────────────────────
+    # 자리 얻기 / 돌려주기
+    # ─────────────────────────────────────────────
+    async def acquire(self, session_id: str, priority: int = LIVE) -> float:
+        """
+        자리가 날 때까지 대기
+
+        Returns:
+            기다린 시간 (초)
+        """
+        start = time.monotonic()
+        with self._lock:
+            if self._in_flight < self.limit and not self._depth:
+                self._in_flight += 1
+                self._admitted(0.0, priority)
+                fast = True
+            else:
+                fast = False
+                future = asyncio.get_running_loop().create_future()
+                self._waiting[priority].setdefault(session_id, deque()).append(future)
+                self._depth += 1
+                self.stats["max_depth"] = max(self.stats["max_depth"], self._depth)
+        self._gauges()
+        if fast:
+            return 0.0
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                self.stats["cancelled"] += 1
+                granted = future.done() and not future.cancelled()
+                if not granted:
+                    self._forget(future, session_id, priority)
+            if granted:
+                self.release()
+            raise
+        wait = time.monotonic() - start
+        with self._lock:
+            self._admitted(wait, priority)
+        return wait
+
+    def release(self):
+        """자리 돌려주기 (다른 스레드에서 불러도 됨)"""
+        with self._lock:
+            future = self._next()
+            if future is None:
+                self._in_flight -= 1
+        self._gauges()
+        if future is not None:
+            future.get_loop().call_soon_threadsafe(self._grant, future)
+
+    def _grant(self, future: asyncio.Future):
+        # 넘겨주기 전에 취소된 요청이면 그다음 요청에 넘김
+        if future.done():
+            self.release()
+        else:
+            future.set_result(None)
+
+    def _next(self) -> Optional[asyncio.Future]:
+        """다음 차례 (높은 우선순위 먼저, 같은 우선순위는 세션을 돌아가며)"""
+        for priority in sorted(self._waiting):
+            sessions = self._waiting[priority]
+            if sessions:
+                session_id, futures = sessions.popitem(last=False)
+                future = futures.popleft()
+                if futures:
+                    sessions[session_id] = futures
+                self._depth -= 1
+                return future
+        return None
+
+    def _forget(self, future: asyncio.Future, session_id: str, priority: int):
+        futures = self._waiting[priority].get(session_id)
+        if futures and future in futures:
+            futures.remove(future)
+            self._depth -= 1
+            if not futures:
+                del self._waiting[priority][session_id]
+
+    def _admitted(self, wait: float, priority: int):
+        stats = self.stats
+        stats["admitted"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], self._in_flight)
+        if wait > 0:
+            stats["waited"] += 1
+            stats["wait_seconds"] += wait
+            stats["max_wait_s"] = max(stats["max_wait_s"], wait)
+        if self.metrics is not None:
+            self.metrics.dispatch_wait_seconds.observe(
+                wait, provider=self.name, priority=PRIORITY_NAMES.get(priority, priority))
+
+    def _gauges(self):
+        if self.metrics is not None:
+            self.metrics.dispatch_in_flight.set(self._in_flight, provider=self.name)
+            self.metrics.dispatch_queued.set(self._depth, provider=self.name)
+
+    @asynccontextmanager
+    async def slot(self, session_id: str, priority: int = LIVE) -> AsyncIterator[float]:
+        """async with pool.slot(...) as wait: (나올 때 자리 반납)"""
+        wait = await self.acquire(session_id, priority)
+        try:
+            yield wait
+        finally:
+            self.release()
+
+    # ─────────────────────────────────────────────
+    # 상태
+    # ─────────────────────────────────────────────
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queued(self) -> int:
+        """지금 자리를 기다리는 요청 수"""
+        return self._depth
+
+    def snapshot(self) -> Dict:
+        """대기열 깊이, 대기 시간 포함 상태"""
+        with self._lock:
+            stats = dict(self.stats)
+            queued = {PRIORITY_NAMES[p]: sum(len(f) for f in s.values()) for p, s in self._waiting.items()}
+            in_flight = self._in_flight
+        return {
+            "limit": self.limit,
+            "in_flight": in_flight,
+            "queued": queued,
+            "admitted": int(stats["admitted"]),
+            "waited": int(stats["waited"]),
+            "avg_wait_ms": round(stats["wait_seconds"] / stats["waited"] * 1000, 1) if stats["waited"] else 0.0,
+            "max_wait_ms": round(stats["max_wait_s"] * 1000, 1),
+            "max_depth": int(stats["max_depth"]),
+            "max_in_flight": int(stats["max_in_flight"]),
+        }
+
+
+class Dispatcher:
+    """
+    통화 입장 + 공급자별 자리 관리 (프로세스에 하나)
+
+    사용 예:
+        dispatcher = Dispatcher(parse_limits(os.getenv("DISPATCH_LIMITS")), max_calls=64)
+        pipeline = PipelineRunner(stt, llm, tts, dispatcher=dispatcher)
+        await dispatcher.run_call("elder-01", lambda: outbound_call("elder-01"), priority=BACKGROUND)
+    """
+
+    def __init__(self, limits: Optional[Dict[str, int]] = None, max_calls: int = 64, metrics=None):
+        """
+        Args:
+            limits: 공급자 → 동시 요청 수 (None이면 DEFAULT_LIMITS)
+            max_calls: 동시에 진행할 통화 수 (넘으면 run_call이 차례를 기다림)
+            metrics: 지표를 남길 MetricsRegistry
+        """
+        self.pools: Dict[str, ProviderPool] = {
+            name: ProviderPool(name, limit, metrics) for name, limit in (limits or DEFAULT_LIMITS).items()
+        }
+        self.calls = ProviderPool("calls", max_calls, metrics)
+        self.stats: Dict[str, int] = {"started": 0, "completed": 0, "failed": 0}
+        logger.info(f"디스패처: 통화 {max_calls}, " + ", ".join(f"{p.name} {p.limit}" for p in self.pools.values()))
+
+    def slot(self, provider: str, session_id: str, priority: int = LIVE):
+        """공급자 자리 (제한이 없는 공급자면 바로 통과)"""
+        pool = self.pools.get(provider)
+        return pool.slot(session_id, priority) if pool else nullcontext(0.0)
+
+    async def hold(self, provider: str, session_id: str, priority: int = LIVE) -> Callable[[], None]:
+        """
+        공급자 자리를 얻고 반납 함수를 돌려줌 (여러 번 불러도 한 번만 반납)
+
+        스트리밍처럼 자리를 잡은 곳과 놓는 곳이 다를 때 (다른 스레드에서 놓아도 됨)
+        """
+        pool = self.pools.get(provider)
+        if pool is None:
+            return lambda: None
+        await pool.acquire(session_id, priority)
+        once = threading.Lock()
+
+        def release():
+            if once.acquire(blocking=False):
+                pool.release()
+        return release
+
+    async def run_call(self, session_id: str, call: Callable[[], Awaitable[T]], priority: int = LIVE) -> T:
+        """
+        통화 하나 실행 (동시 통화 수가 찼으면 자리가 날 때까지 대기)
+
+        Args:
+            session_id: 통화 세션 ID
+            call: 통화 전체를 진행하는 코루틴 함수
+            priority: LIVE(걸려 온 전화) 또는 BACKGROUND(예약 발신 등)
+        """
+        async with self.calls.slot(session_id, priority):
+            self.stats["started"] += 1
+            try:
+                result = await call()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.stats["failed"] += 1
+                raise
+            self.stats["completed"] += 1
+            return result
+
+    def snapshot(self) -> Dict:
+        """공급자별 자리/대기열 상태 + 통화 수"""
+        return {
+            "calls": {**self.stats, **self.calls.snapshot()},
+            **{name: pool.snapshot() for name, pool in self.pools.items()},
+        }
+
+
+def dispatcher_from_env(metrics=None) -> Dispatcher:
+    """DISPATCH_LIMITS, MAX_CALLS 환경변수로 만든 디스패처"""
+    return Dispatcher(parse_limits(os.getenv("DISPATCH_LIMITS")),
+                      max_calls=int(os.getenv("MAX_CALLS", "64")), metrics=metrics)
+
+
+# 테스트
+if __name__ == "__main__":
+    async def demo():
+        pool = ProviderPool("gemini", limit=2)
+        order = []
+
+        async def job(session_id, priority, seconds=0.05):
+            async with pool.slot(session_id, priority):
+                order.append(f"{session_id}/{PRIORITY_NAMES[priority]}")
+                await asyncio.sleep(seconds)
+
+        # 세션 a가 요청 6개를 먼저 쌓아도 b, c와 번갈아 받고, 실시간 턴이 배경 작업보다 먼저
+        jobs = [job("a", LIVE) for _ in range(6)] + [job("bg", BACKGROUND) for _ in range(3)]
+        jobs += [job("b", LIVE), job("c", LIVE)]
+        await asyncio.gather(*jobs)
+        print(" → ".join(order))
+        print(pool.snapshot())
+
+    asyncio.run(demo())
@@ -0,0 +1,284 @@
+"""
+fake_deepgram.py - 오프라인 테스트용 가짜 Deepgram 서버
+실시간(websocket) 인식 프로토콜을 흉내 냄: PCM 수신 → 중간/최종 결과 전송
+사전 녹음(REST) 인식도 흉내 냄: POST /v1/listen → 인식 결과 JSON (지연/오류 주입)
+"""
+import asyncio
+import io
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+import websockets
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [FAKE-DG] %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class FakeDeepgramServer:
+    """
+    로컬 가짜 Deepgram 실시간 서버
+
+    받은 오디오 바이트가 bytes_per_word를 넘을 때마다 단어를 하나씩 늘린
+    중간 결과를 보내고, 마지막 단어까지 들으면 엔드포인팅(is_final +
+    speech_final) 결과를 보냅니다. more를 주면 잠깐 멈췄다가 이어 말하는
+    경우처럼 그 뒤에 새 구간을 이어서 인식합니다. CloseStream을 받으면 남은
+    확정 결과와 UtteranceEnd를 보낸 뒤 닫습니다.
+
+    사용 예:
+        async with FakeDeepgramServer("네 먹었어요") as server:
+            stream = StreamingSTT(api_key="test", url=server.url)
+    """
+
+    def __init__(
+        self,
+        transcript: str = "네 먹었어요",
+        bytes_per_word: int = 6400,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        more: Optional[str] = None,
+    ):
+        """
+        Args:
+            transcript: 인식 결과로 돌려줄 문장
+            bytes_per_word: 단어 하나를 인식하는 데 필요한 오디오 바이트 (16kHz 16-bit 기준 0.2초)
+            host: 바인딩 주소
+            port: 포트 (0이면 자동 할당)
+            more: 첫 엔드포인팅 뒤에 이어 말할 문장 (추측 응답이 빗나가는 경우 흉내)
+        """
+        self.segments = [transcript.split()] + ([more.split()] if more else [])
+        self.words = [w for seg in self.segments for w in seg]
+        self.bytes_per_word = bytes_per_word
+        self.host = host
+        self.port = port
+        self.url: Optional[str] = None
+        self.requests: List[str] = []
+        self._server = None
+
+    async def start(self):
+        self._server = await websockets.serve(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self.url = f"ws://{self.host}:{self.port}/v1/listen"
+        logger.info(f"가짜 Deepgram 서버 시작: {self.url}")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    async def _handle(self, ws, path: Optional[str] = None):
+        self.requests.append(path or getattr(ws, "path", ""))
+        received = 0
+        spoken = 0
+        start = 0   # 현재 구간의 첫 단어 위치
+        ends = [sum(len(s) for s in self.segments[:i + 1]) for i in range(len(self.segments))]
+
+        async for message in ws:
+            if isinstance(message, bytes):
+                received += len(message)
+                words = min(len(self.words), received // self.bytes_per_word)
+                if words > spoken:
+                    spoken = words
+                    end = next(e for e in ends if e > start)
+                    done = spoken >= end
+                    # 구간의 마지막 단어 뒤에는 엔드포인팅이 발화 종료를 알림
+                    await ws.send(self._result(" ".join(self.words[start:min(spoken, end)]), done, done))
+                    if done:
+                        start = end
+                continue
+
+            data = json.loads(message)
+            if data.get("type") == "CloseStream":
+                if start < len(self.words):
+                    await ws.send(self._result(" ".join(self.words[start:]), True, True))
+                await ws.send(json.dumps({"type": "UtteranceEnd", "last_word_end": received / 32000}))
+                await ws.send(json.dumps({"type": "Metadata", "duration": received / 32000}))
+                await ws.close()
+                return
+
+    @staticmethod
+    def _result(text: str, is_final: bool, speech_final: bool) -> str:
+        return json.dumps({
+            "type": "Results",
+            "is_final": is_final,
+            "speech_final": speech_final,
+            "channel": {"alternatives": [{"transcript": text, "confidence": 0.99}]},
+        }, ensure_ascii=False)
+
+
+def wav_duration(body: bytes) -> float:
+    """오디오 길이 (초, WAV가 아니면 16kHz 16-bit 모노로 가정)"""
+    try:
+        with wave.open(io.BytesIO(body), "rb") as wf:
+            return wf.getnframes() / float(wf.getframerate())
+    except (wave.Error, EOFError):
+        return len(body) / 32000.0
+
+
+class FakeDeepgramREST:
+    """
+    로컬 가짜 Deepgram REST 서버 (사전 녹음 인식)
+
+    HTTP/1.1 keep-alive로 응답하므로 STT의 연결 풀 재사용도 그대로 확인할 수
+    있습니다. fail_rate만큼 fail_status 오류를 돌려줘 재시도 경로를 시험합니다.
+
+    사용 예:
+        with FakeDeepgramREST("네 먹었어요", latency=0.05) as server:
+            stt = STT(api_key="test", url=server.url)
+    """
+
+    def __init__(
+        self,
+        transcript: str = "네 먹었어요",
+        latency: float = 0.05,
+        realtime_factor: float = 0.0,
+        fail_rate: float = 0.0,
+        fail_status: int = 503,
+        retry_after: Optional[float] = None,
+        transcriber: Optional[Callable[[bytes], str]] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        seed: Optional[int] = None,
+    ):
+        """
+        Args:
+            transcript: 인식 결과로 돌려줄 문장
+            latency: 요청당 고정 지연 (초)
+            realtime_factor: 오디오 1초당 추가 지연 (초, 긴 파일일수록 느리게)
+            fail_rate: 오류로 응답할 확률 (0~1)
+            fail_status: 오류 응답 상태 코드 (503, 429 등)
+            retry_after: 429일 때 알려줄 재시도 대기 (초)
+            transcriber: 오디오 바이트 → 인식 결과 (주면 transcript 대신 사용)
+            host: 바인딩 주소
+            port: 포트 (0이면 자동 할당)
+            seed: 오류 주입 난수 시드
+        """
+        self.transcript = transcript
+        self.latency = latency
+        self.realtime_factor = realtime_factor
+        self.fail_rate = fail_rate
+        self.fail_status = fail_status
+        self.retry_after = retry_after
+        self.transcriber = transcriber
+        self.host = host
+        self.port = port
+        self.url: Optional[str] = None
+        self.stats: Dict[str, int] = {"requests": 0, "failures": 0, "bytes_received": 0}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._server = ThreadingHTTPServer((self.host, self.port), self._handler())
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self.url = f"http://{self.host}:{self.port}"
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-dg-rest", daemon=True)
+        self._thread.start()
+        logger.info(f"가짜 Deepgram REST 서버 시작: {self.url}")
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _respond(self, body: bytes, content_type: str = ""):
+        """요청 한 건 → (상태 코드, 헤더, JSON 본문) (content_type: 요청의 Content-Type)"""
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["bytes_received"] += len(body)
+            fail = self._rng.random() < self.fail_rate
+            if fail:
+                self.stats["failures"] += 1
+        duration = wav_duration(body)
+        time.sleep(self.latency + duration * self.realtime_factor)
+
+        if fail:
+            headers = {}
+            message = f"fake error {self.fail_status}"
+            if self.fail_status == 429 and self.retry_after is not None:
+                headers["Retry-After"] = f"{self.retry_after:g}"
+                message = f"Too many requests, retry after {self.retry_after:g}s"
+            return self.fail_status, headers, {"err_code": "FAKE_ERROR", "err_msg": message}
+
+        text = self.transcriber(body) if self.transcriber else self.transcript
+        return 200, {}, {
+            "metadata": {"request_id": uuid.uuid4().hex, "duration": duration, "channels": 1},
+            "results": {"channels": [{"alternatives": [
+                {"transcript": text, "confidence": 0.99, "words": []},
+            ]}]},
+        }
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"   # keep-alive
+
+            def do_HEAD(self):
+                self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length)
+                if not self.path.startswith("/v1/listen"):
+                    status, headers, payload = 404, {}, {"err_code": "NOT_FOUND", "err_msg": self.path}
+                else:
+                    status, headers, payload = server._respond(body, self.headers.get("Content-Type", ""))
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+# 테스트
+if __name__ == "__main__":
+    from STT import StreamingSTT
+
+    async def test():
+        async with FakeDeepgramServer("네 할머니 약 먹었어요") as server:
+            async with StreamingSTT(api_key="test", url=server.url) as stream:
+                # 20ms 프레임(640 bytes)씩 1초 분량 전송
+                for _ in range(50):
+                    await stream.send(b"\x00" * 640)
+                    await asyncio.sleep(0.02)
+                await stream.finish()
+                async for event in stream.events():
+                    print(f"{'확정' if event.is_final else '중간'}: {event.text}")
+                print(f"최종: {stream.transcript}")
+
+    asyncio.run(test())
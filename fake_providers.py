@@ -0,0 +1,203 @@
+"""
+fake_providers.py - 벤치마크용 가짜 Deepgram / Gemini / Edge TTS (프로세스 내부)
+실제 STT, LLM, TTS 클래스에 주입해 지연 분포, 오류율, 429를 흉내 냄
+"""
+import asyncio
+import contextvars
+import math
+import random
+import threading
+import time
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+from LLM import DEMO_DEFAULT
+from intent import IntentEngine
+
+# 현재 턴에서 가짜 Deepgram이 돌려줄 인식 결과 (세션 태스크별로 설정)
+EXPECTED_TRANSCRIPT: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "expected_transcript", default=""
+)
+
+
+class ProviderError(Exception):
+    """주입된 일반 오류"""
+
+
+class RateLimitError(Exception):
+    """주입된 429 (LLM의 쿼터 감지 문구와 같은 메시지)"""
+
+    def __init__(self, retry_after: float = 1.0):
+        super().__init__(f"429 Resource has been exhausted (e.g. check quota). retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class LatencyModel:
+    """로그정규 지연 분포 + 오류/429 주입"""
+
+    def __init__(
+        self,
+        median_ms: float,
+        p95_ms: Optional[float] = None,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        """
+        Args:
+            median_ms: 지연 중앙값 (ms)
+            p95_ms: 지연 95퍼센타일 (ms, None이면 중앙값의 2배)
+            error_rate: 일반 오류 비율 (0~1)
+            rate_limit_rate: 429 비율 (0~1)
+            seed: 난수 시드 (재현용)
+        """
+        self.median = median_ms / 1000.0
+        p95 = (p95_ms if p95_ms is not None else median_ms * 2) / 1000.0
+        self.sigma = math.log(max(p95, self.median * 1.0001) / self.median) / 1.645 if self.median > 0 else 0.0
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self) -> float:
+        """지연 (초)"""
+        if self.median <= 0:
+            return 0.0
+        with self._lock:
+            return self._rng.lognormvariate(math.log(self.median), self.sigma)
+
+    def check(self):
+        """오류/429 주입"""
+        with self._lock:
+            roll = self._rng.random()
+        if roll < self.rate_limit_rate:
+            raise RateLimitError()
+        if roll < self.rate_limit_rate + self.error_rate:
+            raise ProviderError("injected provider error")
+
+
+# ─────────────────────────────────────────────
+# Deepgram
+# ─────────────────────────────────────────────
+class FakeDeepgramClient:
+    """client.listen.rest.v("1").transcribe_file(...) 흉내"""
+
+    def __init__(self, latency: LatencyModel):
+        self.latency = latency
+        self.calls = 0
+        self.bytes_received = 0
+        self.listen = SimpleNamespace(rest=SimpleNamespace(v=lambda version: self))
+
+    def transcribe_file(self, source: Dict, options=None, addons=None, headers=None, **kwargs):
+        body = source["buffer"] if "buffer" in source else source["stream"].read()
+        self.calls += 1
+        self.bytes_received += len(body)
+        time.sleep(self.latency.sample())
+        self.latency.check()
+        alternative = SimpleNamespace(transcript=EXPECTED_TRANSCRIPT.get(), confidence=0.99)
+        channel = SimpleNamespace(alternatives=[alternative])
+        return SimpleNamespace(results=SimpleNamespace(channels=[channel]))
+
+
+# ─────────────────────────────────────────────
+# Gemini
+# ─────────────────────────────────────────────
+_REPLIES = IntentEngine()
+
+
+def fake_reply(text: str) -> str:
+    """입력에 맞는 두 문장짜리 응답 (문장 단위 스트리밍이 의미 있도록)"""
+    first = _REPLIES.fallback(text, DEMO_DEFAULT)
+    return f"{first} 오늘도 건강하게 좋은 하루 보내세요."
+
+
+class FakeGenerativeModel:
+    """genai.GenerativeModel 흉내 (generate_content / generate_content_async)"""
+
+    def __init__(self, latency: LatencyModel, token_ms: float = 15.0, chars_per_token: int = 3):
+        """
+        Args:
+            latency: 첫 토큰까지의 지연 분포
+            token_ms: 이후 토큰 간 간격 (ms)
+            chars_per_token: 토큰 하나에 해당하는 글자 수
+        """
+        self.latency = latency
+        self.token_s = token_ms / 1000.0
+        self.chars_per_token = chars_per_token
+        self.calls = 0
+        self.prompt_chars = 0
+
+    def _begin(self, contents) -> str:
+        """호출 기록 + 오류 주입 → 응답 텍스트"""
+        if isinstance(contents, str):
+            contents = [{"role": "user", "parts": [contents]}]
+        self.calls += 1
+        # 실제로 보내는 프롬프트 크기 (문맥 관리 효과 확인용)
+        self.prompt_chars += sum(len(p) for c in contents for p in c["parts"])
+        self.latency.check()
+        return fake_reply(contents[-1]["parts"][0])
+
+    def _parts(self, reply: str) -> List[str]:
+        n = self.chars_per_token
+        return [reply[i:i + n] for i in range(0, len(reply), n)]
+
+    def generate_content(self, contents, stream: bool = False):
+        reply = self._begin(contents)
+        if stream:
+            return self._stream(reply)
+        time.sleep(self.latency.sample() + self.token_s * len(self._parts(reply)))
+        return SimpleNamespace(text=reply)
+
+    def _stream(self, reply: str):
+        time.sleep(self.latency.sample())
+        for part in self._parts(reply):
+            yield SimpleNamespace(text=part)
+            time.sleep(self.token_s)
+
+    async def generate_content_async(self, contents):
+        reply = self._begin(contents)
+        await asyncio.sleep(self.latency.sample() + self.token_s * len(self._parts(reply)))
+        return SimpleNamespace(text=reply)
+
+
+# ─────────────────────────────────────────────
+# Edge TTS
+# ─────────────────────────────────────────────
+def make_fake_communicate(
+    latency: LatencyModel,
+    bytes_per_second: int = 6000,
+    chars_per_second: float = 7.0,
+    chunk_bytes: int = 1440,
+    realtime_factor: float = 0.1,
+):
+    """
+    edge_tts.Communicate 대체 클래스 생성
+
+    Args:
+        latency: 첫 바이트까지의 지연 분포
+        bytes_per_second: 음성 1초당 바이트 (48kbps MP3 ≈ 6000)
+        chars_per_second: 한국어 발화 속도 (글자/초)
+        chunk_bytes: stream()이 한 번에 내보내는 오디오 크기
+        realtime_factor: 합성 시간 / 음성 길이
+    """
+
+    class FakeCommunicate:
+        calls = 0
+
+        def __init__(self, text: str, voice: str = "", rate: str = "+0%", **kwargs):
+            self.text = text
+            FakeCommunicate.calls += 1
+
+        async def stream(self):
+            await asyncio.sleep(latency.sample())
+            latency.check()
+            seconds = max(0.3, len(self.text) / chars_per_second)
+            total = int(seconds * bytes_per_second)
+            n_chunks = max(1, math.ceil(total / chunk_bytes))
+            delay = seconds * realtime_factor / n_chunks
+            for i in range(n_chunks):
+                size = min(chunk_bytes, total - i * chunk_bytes)
+                yield {"type": "audio", "data": b"\xff" * size}
+                await asyncio.sleep(delay)
+
+    return FakeCommunicate
@@ -0,0 +1,353 @@
+"""
+intent.py - 일상 안부 의도 빠른 경로
+다중 패턴 오토마톤(Aho-Corasick) + 한국어 정규화로 정형화된 턴은 Gemini 없이 바로 응답
+"""
+import logging
+import random
+import re
+import threading
+import time
+import unicodedata
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [INTENT] %(message)s')
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Intent:
+    """의도 하나 (패턴 목록 + 응답)"""
+    name: str
+    patterns: Tuple[str, ...]
+    replies: Tuple[str, ...]
+    # False면 로컬 응답 금지 (건강 호소/응급 등은 항상 Gemini, 폴백 때만 사용)
+    local: bool = True
+    # 부정어(안/못/아직, ~지 않아)가 붙으면 뜻이 뒤집히는 의도
+    polar: bool = False
+    # 뒤집혔을 때의 의도 이름 (None이면 일치로 치지 않음)
+    negated: Optional[str] = None
+
+
+def _combine(heads: Iterable[str], tails: Iterable[str]) -> Tuple[str, ...]:
+    return tuple(h + t for h in heads for t in tails)
+
+
+_MED = ("약", "약을", "약은", "약도", "약이랑")
+_MEAL = ("밥", "밥을", "밥은", "밥도", "식사", "식사는", "점심", "점심은", "저녁", "저녁은", "아침", "아침은")
+_ATE = ("먹었", "먹음", "먹었지", "챙겨먹었", "다먹었", "벌써먹었", "잘먹었", "드셨")
+_NOT_ATE = ("안먹", "못먹", "아직안먹", "아직", "깜빡", "까먹")
+
+# SYSTEM_PROMPT의 대화 목표(안부, 식사, 약 복용, 외로움)에 맞춘 정형 의도
+INTENTS: Tuple[Intent, ...] = (
+    Intent("greeting", ("안녕", "안녕하세요", "여보세요", "반가워", "반갑"),
+           ("안녕하세요 할머니~ 오늘 기분이 어떠세요?",)),
+    Intent("medication_taken", _combine(_MED, _ATE) + ("약챙겼", "약은챙겼"),
+           ("약 잘 챙겨 드셨네요! 정말 잘하셨어요~",), polar=True, negated="medication_missed"),
+    Intent("medication_missed", _combine(_MED, _NOT_ATE),
+           ("아직 안 드셨어요? 지금 꼭 챙겨 드세요~",)),
+    Intent("meal_eaten", _combine(_MEAL, _ATE),
+           ("맛있게 드셨어요? 잘 드셔야 힘이 나요~",), polar=True, negated="meal_missed"),
+    Intent("meal_missed", _combine(_MEAL, _NOT_ATE) + ("배고파", "입맛이없"),
+           ("아직 못 드셨어요? 조금이라도 꼭 챙겨 드세요~",)),
+    Intent("mood_good", ("좋아", "좋네", "괜찮아", "괜찮지", "기분좋"),
+           ("기분 좋으시다니 저도 좋아요! 오늘 뭐 하셨어요?",), polar=True),
+    Intent("lonely", ("심심", "외로", "적적"),
+           ("심심하시면 저랑 이야기해요! 요즘 뭐 하고 지내세요?",)),
+    Intent("thanks", ("고마워", "고맙", "감사"),
+           ("할머니가 건강하게 지내시는 게 저한테는 가장 큰 선물이에요~",)),
+    Intent("goodbye", ("끊을게", "끊자", "잘있어", "다음에또", "내일또", "들어가"),
+           ("네 할머니, 내일 또 전화드릴게요~ 건강하세요!",)),
+    Intent("pain", ("아파", "아프", "쑤셔", "결려", "어지러"),
+           ("어머, 어디가 불편하세요? 많이 아프시면 병원에 가보셔야 해요.",), local=False),
+    Intent("emergency", ("쓰러", "숨이", "숨을", "가슴이", "119", "살려"),
+           ("많이 위급하시면 바로 119에 전화하세요!",), local=False),
+)
+
+# 의도와 무관하게 자주 붙는 말 (커버리지 계산에만 사용)
+FILLERS = (
+    "네", "예", "응", "어", "아", "그래", "그럼", "지금", "오늘", "아까", "방금", "이미", "벌써",
+    "다", "잘", "요", "어요", "에요", "예요", "지", "죠", "에", "는", "은", "도", "했어", "했지",
+    "할머니", "하이야", "얘야", "나", "난", "내가", "그냥", "좀", "많이", "맛있게",
+)
+
+# STT 표기 흔들림/사투리 → 표준형 (정규화 후 적용)
+_VARIANTS = (
+    ("먹엇", "먹었"), ("묵었", "먹었"), ("무웃", "먹었"), ("드셧", "드셨"), ("머겄", "먹었"),
+    ("챙겨서먹", "챙겨먹"), ("고마와", "고마워"), ("감사해", "감사"),
+)
+
+# 의도 앞/뒤에 붙으면 뜻을 뒤집는 말 (안 먹었어, 아직 약은..., 좋지 않아)
+_NEG_BEFORE = ("안", "못", "아직")
+_NEG_AFTER = ("않", "지않", "진않", "지는않", "지못", "못")
+# 묻거나 확실하지 않은 말 (먹었나 모르겠어, 누가 약 먹었어?) → 로컬로 단정하지 않음
+_UNSURE = re.compile(r"모르|몰라|글쎄|누가|누구|(?<!머)(나|냐|니|나요|니까|까|까요|는지|던가)$")
+
+_STRIP = re.compile(r"[^0-9a-z가-힣]+")
+_REPEAT = re.compile(r"(.)\1{2,}")
+
+
+def normalize(text: str) -> str:
+    """
+    한국어 발화 정규화
+
+    NFC 합성, 소문자화, 공백/문장부호 제거(STT 띄어쓰기가 일정하지 않음),
+    3번 이상 반복 글자 축약(네네네 → 네네), 표기 흔들림 치환
+    """
+    text = unicodedata.normalize("NFC", text).lower()
+    text = _STRIP.sub("", text)
+    text = _REPEAT.sub(r"\1\1", text)
+    for src, dst in _VARIANTS:
+        text = text.replace(src, dst)
+    return text
+
+
+def _negated(norm: str, start: int, end: int) -> bool:
+    """norm[start:end] 일치 앞뒤에 부정어가 붙었는지"""
+    before = norm[max(0, start - 4):start]
+    return (before.endswith(_NEG_BEFORE) or "아직" in before
+            or norm.startswith(_NEG_AFTER, end))
+
+
+class AhoCorasick:
+    """다중 문자열 검색 오토마톤 (goto/fail/output을 딕셔너리 배열로)"""
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, object]]] = [[]]
+        self._built = False
+
+    def add(self, pattern: str, payload: object):
+        """패턴 추가 (build 전)"""
+        if not pattern:
+            return
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append((len(pattern), payload))
+        self._built = False
+
+    def build(self):
+        """실패 링크 계산 (BFS)"""
+        queue = deque(self._goto[0].values())
+        for child in queue:
+            self._fail[child] = 0
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                nxt = self._goto[f].get(ch, 0)
+                self._fail[child] = nxt if nxt != child else 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+        self._built = True
+
+    def search(self, text: str) -> List[Tuple[int, int, object]]:
+        """
+        모든 일치 검색
+
+        Returns:
+            [(시작 위치, 끝 위치(포함 안 함), payload), ...]
+        """
+        if not self._built:
+            self.build()
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        found = []
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for length, payload in out[node]:
+                found.append((i + 1 - length, i + 1, payload))
+        return found
+
+    def __len__(self) -> int:
+        return len(self._goto)
+
+
+@dataclass
+class IntentMatch:
+    """의도 판정 결과"""
+    intent: Intent
+    confidence: float
+    normalized: str
+    # 질문/불확실한 말 (로컬 응답 안 함)
+    uncertain: bool = False
+
+    @property
+    def name(self) -> str:
+        return self.intent.name
+
+    @property
+    def reply(self) -> str:
+        return random.choice(self.intent.replies)
+
+
+class IntentEngine:
+    """
+    정형 의도 판정기
+
+    가장 왼쪽-가장 긴 일치로 겹치지 않는 구간을 고른 뒤, 의도 패턴과
+    군더더기 말이 발화를 얼마나 덮는지(커버리지)를 신뢰도로 씁니다.
+    서로 다른 의도가 섞이거나 덮지 못한 내용이 많으면 Gemini로 넘깁니다.
+
+    사용 예:
+        engine = IntentEngine()
+        hit = engine.answer("네 약 먹었어요")
+        if hit:
+            reply = hit.reply   # Gemini 호출 없이 응답
+    """
+
+    def __init__(
+        self,
+        intents: Iterable[Intent] = INTENTS,
+        fillers: Iterable[str] = FILLERS,
+        threshold: float = 0.6,
+        max_chars: int = 24,
+    ):
+        """
+        Args:
+            intents: 판정할 의도 목록
+            fillers: 커버리지 계산 때 덮인 것으로 보는 군더더기 말
+            threshold: 로컬 응답 최소 신뢰도 (0~1)
+            max_chars: 정규화 후 이 길이를 넘는 발화는 로컬 응답 안 함 (긴 이야기는 Gemini)
+        """
+        self.intents = tuple(intents)
+        self._by_name = {intent.name: intent for intent in self.intents}
+        self.threshold = threshold
+        self.max_chars = max_chars
+        self._automaton = AhoCorasick()
+        for intent in self.intents:
+            for pattern in intent.patterns:
+                self._automaton.add(normalize(pattern), intent)
+        for filler in fillers:
+            self._automaton.add(normalize(filler), None)
+        self._automaton.build()
+
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "local": 0, "deferred": 0, "no_match": 0, "total_ns": 0, "max_ns": 0}
+        self.by_intent: Dict[str, int] = {}
+
+    def match(self, text: str) -> Optional[IntentMatch]:
+        """
+        가장 그럴듯한 의도 (신뢰도와 무관하게, 일치가 없으면 None)
+        """
+        norm = normalize(text)
+        if not norm:
+            return None
+
+        # 가장 왼쪽-가장 긴 일치부터 겹치지 않게 선택
+        spans = sorted(self._automaton.search(norm), key=lambda m: (m[0], -(m[1] - m[0])))
+        covered = 0
+        pos = 0
+        weight: Dict[Intent, int] = {}
+        for start, end, intent in spans:
+            if start < pos:
+                continue
+            pos = end
+            if intent is not None and intent.polar and _negated(norm, start, end):
+                # 안 먹었어 → 못 먹은 쪽 의도, 뒤집을 의도가 없으면 (안 좋아) 덮지 않은 것으로
+                intent = self._by_name.get(intent.negated)
+                if intent is None:
+                    continue
+            covered += end - start
+            if intent is not None:
+                weight[intent] = weight.get(intent, 0) + end - start
+        if not weight:
+            return None
+
+        # 건강 호소/응급이 조금이라도 섞이면 그쪽이 우선 (괜찮아 아파 → pain, 로컬 응답 안 함)
+        vetoes = [intent for intent in weight if not intent.local]
+        best = max(vetoes or weight, key=weight.get)
+        confidence = covered / len(norm)
+        # 다른 의도가 섞이면 (예: 밥은 먹었는데 허리가 아파) 신뢰도를 그만큼 깎음
+        others = sum(w for i, w in weight.items() if i is not best)
+        confidence *= weight[best] / (weight[best] + others)
+        if len(norm) > self.max_chars:
+            confidence *= self.max_chars / len(norm)
+        uncertain = "?" in text or bool(_UNSURE.search(norm))
+        return IntentMatch(best, round(confidence, 3), norm, uncertain)
+
+    def accepts(self, hit: Optional[IntentMatch]) -> bool:
+        """로컬로 응답해도 되는 판정인지 (로컬 의도, 신뢰도 이상, 질문/불확실한 말이 아님)"""
+        return (hit is not None and hit.intent.local and not hit.uncertain
+                and hit.confidence >= self.threshold)
+
+    def answer(self, text: str) -> Optional[IntentMatch]:
+        """
+        로컬로 응답해도 되는 턴이면 판정 결과, 아니면 None (Gemini로)
+
+        호출마다 판정 횟수/적중률/소요 시간을 집계합니다.
+        """
+        start = time.perf_counter_ns()
+        hit = self.match(text)
+        local = self.accepts(hit)
+        elapsed = time.perf_counter_ns() - start
+
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats["total_ns"] += elapsed
+            self.stats["max_ns"] = max(self.stats["max_ns"], elapsed)
+            if local:
+                self.stats["local"] += 1
+                self.by_intent[hit.name] = self.by_intent.get(hit.name, 0) + 1
+            elif hit is None:
+                self.stats["no_match"] += 1
+            else:
+                self.stats["deferred"] += 1
+        return hit if local else None
+
+    def fallback(self, text: str, default: str) -> str:
+        """Gemini를 쓸 수 없을 때의 응답 (신뢰도와 무관하게 가장 가까운 의도)"""
+        hit = self.match(text)
+        return hit.reply if hit and not hit.uncertain else default
+
+    def replies(self) -> List[str]:
+        """모든 의도 응답 문장 (TTS 캐시 예열용)"""
+        return [reply for intent in self.intents for reply in intent.replies]
+
+    def summary(self) -> Dict:
+        """적중률/지연 요약 (절약한 LLM 호출 수 = local)"""
+        with self._lock:
+            stats = dict(self.stats)
+            by_intent = dict(self.by_intent)
+        calls = stats["calls"]
+        return {
+            "calls": calls,
+            "local": stats["local"],
+            "deferred": stats["deferred"],
+            "no_match": stats["no_match"],
+            "match_rate": stats["local"] / calls if calls else 0.0,
+            "avg_us": stats["total_ns"] / calls / 1000 if calls else 0.0,
+            "max_us": stats["max_ns"] / 1000,
+            "by_intent": by_intent,
+        }
+
+
+# 테스트
+if __name__ == "__main__":
+    engine = IntentEngine()
+    samples = [
+        "안녕하세요", "네 약 먹었어요", "약도 먹었어", "약 아직 안 먹었어", "오늘 아침에 밥 먹었어요",
+        "점심은 국수 먹었어", "허리가 좀 아파", "밥은 먹었는데 허리가 아파", "고마워",
+        "손주가 어제 다녀갔는데 다음 주에 또 온대", "심심해", "날씨가 좋네",
+        "괜찮아 아파", "안 먹었어", "안 좋아", "약은 먹었나 모르겠어", "누가 약 먹었어?", "괜찮지 않아",
+    ]
+    for text in samples:
+        hit = engine.match(text)
+        local = engine.answer(text)
+        label = f"{hit.name} ({hit.confidence:.2f})" if hit else "-"
+        print(f"{'로컬' if local else 'LLM '} | {text} → {label}")
+    print(engine.summary())
@@ -2,10 +2,11 @@
 app.py - Haii-Call (Polished UI)
 Streamlit Native Chat + 완성도 높은 마이크 버튼 디자인
 """
-import asyncio
-import sys
 import streamlit as st
+import os
 import time
+import uuid
+from contextlib import contextmanager
 from dotenv import load_dotenv
 from audio_recorder_streamlit import audio_recorder
 
@@ -13,12 +14,19 @@ from audio_recorder_streamlit import audio_recorder
 from STT import STT
 from LLM import LLM
 from TTS import TTS
-
-if sys.platform == "win32":
-    asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+from VAD import VAD
+from codec import AudioEncoder
+from audio_cache import AudioCache
+from pipeline import PipelineRunner
+from runtime import get_loop
+from media import MediaServer
+from metrics import MetricsRegistry, TraceLog
 
 load_dotenv()
 
+# 말풍선으로 그릴 최근 메시지 수 (그 이전은 접힌 "이전 대화" 한 덩어리)
+CHAT_WINDOW = 20
+
 # ═══════════════════════════════════════════════════════════════════════════
 # 페이지 설정
 # ═══════════════════════════════════════════════════════════════════════════
@@ -108,10 +116,69 @@ if 'messages' not in st.session_state:
     st.session_state.messages = []
 if 'last_audio' not in st.session_state:
     st.session_state.last_audio = None
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+if 'archived' not in st.session_state:
+    # 창 밖으로 밀려난 메시지 수와 그 마크다운 (새로 밀려난 것만 덧붙임)
+    st.session_state.archived = (0, "")
 
 @st.cache_resource
 def load_modules():
-    return STT(), LLM(), TTS(voice="female_warm", rate="-5%")
+    llm = LLM()
+    tts = TTS(voice="female_warm", rate="-5%", cache=AudioCache(),
+              output_format=os.getenv("TTS_FORMAT", "mp3"), bitrate=int(os.getenv("TTS_BITRATE", "0")) or None)
+    # 첫 화면을 막지 않도록 백그라운드 루프에 넣고 기다리지 않음 (끝나기 전 요청은 그냥 합성)
+    future = get_loop().submit(tts.prewarm(llm.canned_phrases()))
+    future.add_done_callback(
+        lambda f: not f.cancelled() and f.exception() and print(f"TTS 예열 오류: {f.exception()}"))
+    stt = STT()
+    if stt.client:
+        stt.warm_up(background=True)
+    return stt, llm, tts
+
+@st.cache_resource
+def load_metrics():
+    return MetricsRegistry()
+
+@st.cache_resource
+def load_pipeline():
+    return PipelineRunner(*load_modules(), vad=VAD(),
+                          encoder=AudioEncoder(os.getenv("STT_CODEC", "flac")),
+                          metrics=load_metrics(),
+                          trace_log=TraceLog(os.getenv("TRACE_LOG", "logs/turns.jsonl")))
+
+@st.cache_resource
+def load_media():
+    try:
+        return MediaServer(port=int(os.getenv("MEDIA_PORT", "8502")), metrics=load_metrics())
+    except OSError:
+        return None
+
+@contextmanager
+def timed(scope):
+    """스크립트 실행 시간 기록 (/metrics의 haii_rerun_duration_seconds, rerun으로 멈춘 실행은 제외)"""
+    start = time.perf_counter()
+    yield
+    load_metrics().rerun_seconds.observe(time.perf_counter() - start, page=st.session_state.state, scope=scope)
+
+def archived_history():
+    """창 밖으로 밀려난 이전 대화 마크다운 (대화가 길어져도 새로 밀려난 메시지만 변환)"""
+    count, text = st.session_state.archived
+    target = max(0, len(st.session_state.messages) - CHAT_WINDOW)
+    if target < count:
+        count, text = 0, ""
+    if target > count:
+        lines = [f"{'👵' if m['role'] == 'user' else '👧'} {m['text']}" for m in st.session_state.messages[count:target]]
+        text = "\n\n".join(filter(None, [text, *lines]))
+        st.session_state.archived = (target, text)
+    return text
+
+def audio_ref(audio):
+    """st.audio에 넘길 참조 (MEDIA_PUBLIC_URL이 있으면 미디어 서버 URL, 없으면 바이트 그대로)"""
+    media = load_media()
+    if media and media.public:
+        return media.url_for(media.store.put(audio, load_modules()[2].mime_type))
+    return audio
 
 # ═══════════════════════════════════════════════════════════════════════════
 # 로직 함수
@@ -119,22 +186,19 @@ def load_modules():
 def process_audio(audio_bytes):
     if not audio_bytes or len(audio_bytes) < 1000: return
 
-    stt, llm, tts = load_modules()
-
-    # 1. STT
-    text = stt.transcribe(audio_bytes, mime_type="audio/wav")
-    if not text: return
+    # STT → LLM → TTS (백그라운드 루프에서 실행)
+    turn = load_pipeline().process(audio_bytes, session_id=st.session_state.session_id)
+    if not turn.user_text:
+        turn.trace.finish()
+        return
     
-    st.session_state.messages.append({'role': 'user', 'text': text})
-
-    # 2. LLM
-    response = llm.generate(text)
-    st.session_state.messages.append({'role': 'ai', 'text': response})
+    with turn.trace.span("render"):
+        st.session_state.messages.append({'role': 'user', 'text': turn.user_text})
+        st.session_state.messages.append({'role': 'ai', 'text': turn.reply})
 
-    # 3. TTS
-    audio_data = asyncio.run(tts.synthesize(response))
-    if audio_data:
-        st.session_state['autoplay_audio'] = audio_data
+        if turn.audio:
+            st.session_state['autoplay_audio'] = audio_ref(turn.audio)
+    turn.trace.finish()
 
 # ═══════════════════════════════════════════════════════════════════════════
 # 메인 화면
@@ -160,25 +224,24 @@ def main():
                 greeting = llm.get_greeting()
                 st.session_state.messages.append({'role': 'ai', 'text': greeting})
                 
-                audio = asyncio.run(tts.synthesize(greeting))
+                audio = load_pipeline().speak_sync(greeting)
                 if audio:
-                    st.session_state['autoplay_audio'] = audio
+                    st.session_state['autoplay_audio'] = audio_ref(audio)
                 st.rerun()
 
     # --- 2. 통화 화면 ---
     elif st.session_state.state == 'connected':
         # 상단 헤더
-        st.markdown(f"""
-        <div style="text-align: center; padding: 10px; background: #222; border-radius: 10px; margin-bottom: 20px;">
-            <h3 style="margin: 0; color: #4ADE80;">통화 중</h3>
-            <p style="margin: 0; color: gray;">{get_duration()}</p>
-        </div>
-        """, unsafe_allow_html=True)
+        call_header()
 
         # 채팅 영역
         chat_container = st.container(height=400)
         with chat_container:
-            for msg in st.session_state.messages:
+            history = archived_history()
+            if history:
+                with st.expander("이전 대화"):
+                    st.markdown(history)
+            for msg in st.session_state.messages[-CHAT_WINDOW:]:
                 if msg['role'] == 'user':
                     with st.chat_message("user", avatar="👵"):
                         st.write(msg['text'])
@@ -188,7 +251,7 @@ def main():
             
             # 오디오 자동 재생
             if 'autoplay_audio' in st.session_state:
-                st.audio(st.session_state['autoplay_audio'], format="audio/mp3", autoplay=True)
+                st.audio(st.session_state['autoplay_audio'], format=load_modules()[2].mime_type, autoplay=True)
                 del st.session_state['autoplay_audio']
 
         # 하단 컨트롤
@@ -220,21 +283,35 @@ def main():
         if text_input:
             st.session_state.messages.append({'role': 'user', 'text': text_input})
             stt, llm, tts = load_modules()
-            response = llm.generate(text_input)
+            response = llm.generate(text_input, session_id=st.session_state.session_id)
             st.session_state.messages.append({'role': 'ai', 'text': response})
             
-            audio = asyncio.run(tts.synthesize(response))
+            audio = load_pipeline().speak_sync(response)
             if audio:
-                st.session_state['autoplay_audio'] = audio
+                st.session_state['autoplay_audio'] = audio_ref(audio)
             st.rerun()
 
         # 종료 버튼
         st.markdown("<br>", unsafe_allow_html=True)
         if st.button("통화 종료", type="secondary", use_container_width=True):
+            stt, llm, tts = load_modules()
+            llm.reset(st.session_state.session_id)
             st.session_state.state = 'idle'
             st.session_state.messages = []
+            st.session_state.archived = (0, "")
             st.rerun()
 
+@st.fragment(run_every=1)
+def call_header():
+    """통화 시간 (1초마다 이 부분만 갱신)"""
+    with timed("timer"):
+        st.markdown(f"""
+        <div style="text-align: center; padding: 10px; background: #222; border-radius: 10px; margin-bottom: 20px;">
+            <h3 style="margin: 0; color: #4ADE80;">통화 중</h3>
+            <p style="margin: 0; color: gray;">{get_duration()}</p>
+        </div>
+        """, unsafe_allow_html=True)
+
 def get_duration():
     if st.session_state.start_time:
         elapsed = int(time.time() - st.session_state.start_time)
@@ -243,4 +320,5 @@ def get_duration():
     return "00:00"
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with timed("app"):
+        main()
\ No newline at end of file
@@ -0,0 +1,272 @@
+"""
+media.py - 합성 오디오 전달용 미디어 저장소 + HTTP 서버
+페이지에는 짧은 URL만 넣고, 오디오는 별도 포트에서 Range/점진 스트리밍으로 제공
+"""
+import ipaddress
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [MEDIA] %(message)s')
+logger = logging.getLogger(__name__)
+
+_RANGE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+
+class MediaEntry:
+    """저장된 오디오 하나 (합성 중에는 청크가 계속 붙음)"""
+
+    def __init__(self, mime_type: str):
+        self.mime_type = mime_type
+        self.chunks: List[bytes] = []
+        self.size = 0
+        self.complete = False
+        self.created = time.monotonic()
+        self.cond = threading.Condition()
+
+    def append(self, data: bytes):
+        with self.cond:
+            self.chunks.append(data)
+            self.size += len(data)
+            self.cond.notify_all()
+
+    def finish(self):
+        with self.cond:
+            self.complete = True
+            self.cond.notify_all()
+
+    def data(self) -> bytes:
+        with self.cond:
+            return b"".join(self.chunks)
+
+    def wait_chunk(self, index: int, timeout: float) -> Optional[bytes]:
+        """index번째 청크가 올 때까지 대기 (완료됐거나 시간 초과면 None)"""
+        with self.cond:
+            self.cond.wait_for(lambda: index < len(self.chunks) or self.complete, timeout)
+            if index < len(self.chunks):
+                return self.chunks[index]
+            return None
+
+    def wait_complete(self, timeout: float) -> bool:
+        with self.cond:
+            return self.cond.wait_for(lambda: self.complete, timeout)
+
+
+class MediaStore:
+    """id → 오디오 (용량/유효시간 제한)"""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, ttl: float = 600.0):
+        """
+        Args:
+            max_bytes: 보관할 최대 바이트 (초과 시 오래된 것부터 삭제)
+            ttl: 보관 시간 (초)
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, MediaEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, mime_type: str = "audio/mpeg") -> str:
+        """합성 중인 오디오용 빈 항목 생성 (append → finish)"""
+        media_id = uuid.uuid4().hex
+        with self._lock:
+            self._evict()
+            self._entries[media_id] = MediaEntry(mime_type)
+        return media_id
+
+    def put(self, data: bytes, mime_type: str = "audio/mpeg") -> str:
+        """완성된 오디오 저장"""
+        media_id = self.create(mime_type)
+        entry = self.get(media_id)
+        entry.append(data)
+        entry.finish()
+        return media_id
+
+    def append(self, media_id: str, data: bytes):
+        entry = self.get(media_id)
+        if entry is not None and data:
+            entry.append(data)
+
+    def finish(self, media_id: str):
+        entry = self.get(media_id)
+        if entry is not None:
+            entry.finish()
+
+    def get(self, media_id: str) -> Optional[MediaEntry]:
+        with self._lock:
+            return self._entries.get(media_id)
+
+    def _evict(self):
+        """유효시간/용량 초과 항목 정리 (잠금 상태에서 호출)"""
+        now = time.monotonic()
+        total = sum(e.size for e in self._entries.values())
+        while self._entries:
+            media_id, entry = next(iter(self._entries.items()))
+            if now - entry.created < self.ttl and total <= self.max_bytes:
+                break
+            del self._entries[media_id]
+            total -= entry.size
+
+
+class _MediaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    store: MediaStore = None
+    metrics = None
+    stream_timeout = 30.0
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        # 지표는 같은 기기에서만 (공개 주소로 바인딩해도 밖으로는 안 보임)
+        if path == "/metrics" and self.metrics is not None and self._local():
+            body = self.metrics.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self._write(body)
+            return
+        if not path.startswith("/media/"):
+            self.send_error(404)
+            return
+
+        media_id = path[len("/media/"):].rsplit(".", 1)[0]
+        entry = self.store.get(media_id)
+        if entry is None:
+            self.send_error(404)
+            return
+
+        match = _RANGE.match(self.headers.get("Range", "").strip())
+        start = int(match.group(1)) if match and match.group(1) else 0
+
+        # 합성 중: 처음부터 요청하면 도착하는 대로 chunked 전송
+        if not entry.complete and start == 0:
+            self._stream(entry)
+            return
+
+        if not entry.wait_complete(self.stream_timeout):
+            self.send_error(503, "media not ready")
+            return
+        self._send_range(entry.data(), entry.mime_type, match)
+
+    def do_HEAD(self):
+        """GET과 같은 헤더, 본문 없음 (Range 요청 전에 크기/형식을 확인하는 플레이어)"""
+        self.do_GET()
+
+    def _local(self) -> bool:
+        try:
+            return ipaddress.ip_address(self.client_address[0]).is_loopback
+        except ValueError:
+            return False
+
+    def _write(self, body: bytes):
+        if self.command == "HEAD":
+            return
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def _stream(self, entry: MediaEntry):
+        self.send_response(200)
+        self.send_header("Content-Type", entry.mime_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        if self.command == "HEAD":
+            return
+        index = 0
+        try:
+            while True:
+                chunk = entry.wait_chunk(index, self.stream_timeout)
+                if chunk is None:
+                    break
+                self.wfile.write(f"{len(chunk):X}\r\n".encode() + chunk + b"\r\n")
+                self.wfile.flush()
+                index += 1
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def _send_range(self, data: bytes, mime_type: str, match):
+        size = len(data)
+        if match and (match.group(1) or match.group(2)):
+            if match.group(1):
+                start = int(match.group(1))
+                end = int(match.group(2)) if match.group(2) else size - 1
+            else:
+                # bytes=-N: 마지막 N바이트
+                start = max(0, size - int(match.group(2)))
+                end = size - 1
+            end = min(end, size - 1)
+            if start > end:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            body = data[start:end + 1]
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            body = data
+            self.send_response(200)
+
+        self.send_header("Content-Type", mime_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Cache-Control", "private, max-age=600")
+        self.end_headers()
+        self._write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+class MediaServer:
+    """MediaStore를 HTTP로 제공 (백그라운드 스레드, 지표를 주면 /metrics도 같은 기기에만 제공)"""
+
+    def __init__(
+        self,
+        store: Optional[MediaStore] = None,
+        host: Optional[str] = None,
+        port: int = 8502,
+        public_url: Optional[str] = None,
+        metrics=None,
+    ):
+        """
+        Args:
+            store: 제공할 저장소 (None이면 새로 생성)
+            host: 바인딩 주소 (None이면 MEDIA_HOST 또는 127.0.0.1, 다른 기기에서 들을 때만 0.0.0.0)
+            port: 포트 (0이면 자동 할당)
+            public_url: 브라우저에서 접근할 기본 URL (None이면 MEDIA_PUBLIC_URL 또는 http://localhost:<port>,
+                둘 다 없으면 public=False → 화면은 data URI로 전달, 서버는 /metrics용)
+            metrics: /metrics로 내보낼 MetricsRegistry (Prometheus 텍스트)
+        """
+        self.store = store or MediaStore()
+        handler = type("MediaHandler", (_MediaHandler,), {"store": self.store, "metrics": metrics})
+        host = host or os.getenv("MEDIA_HOST", "127.0.0.1")
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        public_url = public_url or os.getenv("MEDIA_PUBLIC_URL")
+        # 브라우저가 다른 기기(원격, Streamlit Cloud)면 localhost 주소는 닿지 않으므로
+        # 공개 주소를 정했을 때만 URL로 전달
+        self.public = bool(public_url)
+        self.public_url = (public_url or f"http://localhost:{self.port}").rstrip("/")
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="media-server", daemon=True)
+        self._thread.start()
+        logger.info(f"미디어 서버 시작: {self.public_url}")
+
+    def url_for(self, media_id: str) -> str:
+        """브라우저용 오디오 URL"""
+        return f"{self.public_url}/media/{media_id}"
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,276 @@
+"""
+metrics.py - 턴별 지연 계측
+단계(span) 기록 → 히스토그램 집계(Prometheus 텍스트) + JSONL 트레이스 로그
+"""
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [METRICS] %(message)s')
+logger = logging.getLogger(__name__)
+
+# 대화 지연 예산 기준 버킷 (초)
+DEFAULT_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0)
+
+# Streamlit 스크립트 실행(rerun) 시간 버킷 (초)
+RERUN_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# 히스토그램 라벨 (세션 ID처럼 값이 많은 태그는 트레이스 로그에만 남김)
+HISTOGRAM_LABELS = ("stage", "provider", "fallback")
+
+
+class Histogram:
+    """누적 버킷 히스토그램 (라벨 조합별)"""
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._series: Dict[Tuple[Tuple[str, str], ...], List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # [버킷별 개수..., 합계, 개수]
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        for key, series in sorted(items):
+            base = ",".join(f'{k}="{_escape(v)}"' for k, v in key)
+            sep = "," if base else ""
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{base}{sep}le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{base}{sep}le="+Inf"}} {series[-1]}')
+            labels = f"{{{base}}}" if base else ""
+            lines.append(f"{self.name}_sum{labels} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+
+class Counter:
+    """라벨 조합별 누적 카운터"""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values: Dict[Tuple[Tuple[str, str], ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            base = ",".join(f'{k}="{_escape(v)}"' for k, v in key)
+            lines.append(f"{self.name}{{{base}}} {value:g}" if base else f"{self.name} {value:g}")
+        return lines
+
+
+class Gauge:
+    """라벨 조합별 현재 값"""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values: Dict[Tuple[Tuple[str, str], ...], float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels):
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            self._values[key] = value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            base = ",".join(f'{k}="{_escape(v)}"' for k, v in key)
+            lines.append(f"{self.name}{{{base}}} {value:g}" if base else f"{self.name} {value:g}")
+        return lines
+
+
+class MetricsRegistry:
+    """프로세스 공용 지표 모음"""
+
+    def __init__(self):
+        self.stage_seconds = Histogram(
+            "haii_stage_duration_seconds", "Per-stage latency within a conversational turn")
+        self.turn_seconds = Histogram(
+            "haii_turn_duration_seconds", "End-to-end latency of a conversational turn")
+        self.stage_bytes = Counter(
+            "haii_stage_bytes_total", "Bytes sent or received per stage")
+        self.turns = Counter(
+            "haii_turns_total", "Completed conversational turns")
+        self.rerun_seconds = Histogram(
+            "haii_rerun_duration_seconds", "Streamlit script run time per rerun (full app or fragment)",
+            RERUN_BUCKETS)
+        self.dispatch_wait_seconds = Histogram(
+            "haii_dispatch_wait_seconds", "Time spent waiting for a provider concurrency slot")
+        self.dispatch_in_flight = Gauge(
+            "haii_dispatch_in_flight", "Provider requests currently holding a slot")
+        self.dispatch_queued = Gauge(
+            "haii_dispatch_queued", "Provider requests waiting for a slot")
+
+    def render_prometheus(self) -> str:
+        """Prometheus 텍스트 포맷"""
+        lines: List[str] = []
+        for metric in (self.stage_seconds, self.turn_seconds, self.stage_bytes, self.turns, self.rerun_seconds,
+                       self.dispatch_wait_seconds, self.dispatch_in_flight, self.dispatch_queued):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class TraceLog:
+    """턴 트레이스를 한 줄씩 JSONL로 기록"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+    def write(self, record: Dict):
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+            except OSError as e:
+                logger.warning(f"트레이스 기록 실패: {e}")
+
+
+class Span:
+    """단계 하나의 구간 (턴 시작 기준 상대 시간)"""
+
+    __slots__ = ("stage", "start", "end", "tags")
+
+    def __init__(self, stage: str, start: float, tags: Dict):
+        self.stage = stage
+        self.start = start
+        self.end: Optional[float] = None
+        self.tags = tags
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else self.start) - self.start
+
+
+class TurnTrace:
+    """
+    대화 한 턴의 단계별 구간 기록
+
+    사용 예:
+        trace = TurnTrace(session_id, registry, trace_log)
+        with trace.span("stt", provider="deepgram") as span:
+            text = stt.transcribe(audio)
+            span.tags["bytes"] = len(audio)
+        trace.mark("llm_first_token", provider="gemini")
+        trace.finish()
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        registry: Optional[MetricsRegistry] = None,
+        trace_log: Optional[TraceLog] = None,
+    ):
+        self.session_id = session_id
+        self.registry = registry
+        self.trace_log = trace_log
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self.spans: List[Span] = []
+        self.tags: Dict = {}
+        self._finished = False
+
+    def _now(self) -> float:
+        return time.perf_counter() - self._t0
+
+    @contextmanager
+    def span(self, stage: str, **tags) -> Iterator[Span]:
+        """구간 측정 (블록 안에서 span.tags에 bytes 등을 추가 가능)"""
+        span = Span(stage, self._now(), tags)
+        try:
+            yield span
+        finally:
+            span.end = self._now()
+            self.spans.append(span)
+
+    def begin(self, stage: str, **tags) -> Span:
+        """구간 시작 (with 블록으로 감쌀 수 없는 비동기 흐름용, end()로 종료)"""
+        return Span(stage, self._now(), tags)
+
+    def end(self, span: Span, **tags):
+        span.end = self._now()
+        span.tags.update(tags)
+        self.spans.append(span)
+
+    def mark(self, stage: str, **tags) -> Span:
+        """턴 시작부터 지금까지를 하나의 구간으로 기록 (첫 토큰/첫 바이트 등)"""
+        span = Span(stage, 0.0, tags)
+        span.end = self._now()
+        self.spans.append(span)
+        return span
+
+    def finish(self) -> Dict:
+        """턴 종료: 히스토그램 반영 + 트레이스 로그 기록 (여러 번 호출해도 한 번만)"""
+        total = self._now()
+        record = {
+            "session_id": self.session_id,
+            "started_at": self.started_at,
+            "total_ms": round(total * 1000, 1),
+            "tags": self.tags,
+            "spans": [
+                {
+                    "stage": s.stage,
+                    "start_ms": round(s.start * 1000, 1),
+                    "duration_ms": round(s.duration * 1000, 1),
+                    **s.tags,
+                }
+                for s in self.spans
+            ],
+        }
+        if self._finished:
+            return record
+        self._finished = True
+
+        if self.registry:
+            fallback = self.tags.get("fallback", "none")
+            for s in self.spans:
+                labels = {k: s.tags.get(k, fallback if k == "fallback" else "")
+                          for k in HISTOGRAM_LABELS if k != "stage"}
+                self.registry.stage_seconds.observe(s.duration, stage=s.stage, **labels)
+                if "bytes" in s.tags:
+                    self.registry.stage_bytes.inc(s.tags["bytes"], stage=s.stage)
+            self.registry.turn_seconds.observe(total, fallback=fallback)
+            self.registry.turns.inc(fallback=fallback)
+
+        if self.trace_log:
+            self.trace_log.write(record)
+        return record
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
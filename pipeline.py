@@ -0,0 +1,503 @@
+"""
+pipeline.py - STT → LLM → TTS 파이프라인 실행기
+각 단계를 공용 백그라운드 루프의 코루틴으로 실행 (Streamlit 스크립트 스레드는 결과만 기다림)
+"""
+import asyncio
+import logging
+import threading
+import time
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from LLM import LLM, DEFAULT_SESSION, Reply
+from STT import STT, TranscriptEvent
+from TTS import TTS
+from VAD import VAD
+from codec import AudioEncoder
+from dispatcher import LIVE, Dispatcher
+from metrics import MetricsRegistry, TraceLog, TurnTrace
+from runtime import BackgroundLoop, CancelToken, get_loop
+from speculative import Speculator
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [PIPE] %(message)s')
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Turn:
+    """대화 한 턴의 결과"""
+    session_id: str = DEFAULT_SESSION
+    user_text: Optional[str] = None
+    reply_parts: List[str] = field(default_factory=list)
+    audio: Optional[bytes] = None
+    trace: Optional[TurnTrace] = None
+    cancel: CancelToken = field(default_factory=CancelToken)
+    spoken: int = 0   # 오디오까지 내보낸 응답 청크 수
+    priority: int = LIVE   # 공급자 자리 우선순위 (dispatcher.LIVE / BACKGROUND)
+    llm_reply: Reply = field(default_factory=Reply)   # 이 턴의 LLM 결과 (경로/토큰, 기록할 때 씀)
+
+    @property
+    def reply(self) -> str:
+        """AI 응답 전체 텍스트"""
+        return " ".join(self.reply_parts)
+
+    @property
+    def spoken_reply(self) -> str:
+        """실제로 말한 (오디오를 내보낸) 부분까지의 응답"""
+        return " ".join(self.reply_parts[:self.spoken])
+
+    @property
+    def interrupted(self) -> Optional[str]:
+        """말 끊기로 멈췄으면 취소 사유 (barge_in, stop 등), 아니면 None"""
+        return self.cancel.reason
+
+
+class PipelineRunner:
+    """STT, LLM, TTS를 한 루프에서 코루틴으로 구동"""
+
+    def __init__(
+        self,
+        stt: Optional[STT],
+        llm: Optional[LLM],
+        tts: Optional[TTS],
+        vad: Optional[VAD] = None,
+        encoder: Optional[AudioEncoder] = None,
+        metrics: Optional[MetricsRegistry] = None,
+        trace_log: Optional[TraceLog] = None,
+        loop: Optional[BackgroundLoop] = None,
+        dispatcher: Optional[Dispatcher] = None,
+    ):
+        """
+        Args:
+            stt: 음성 인식 모듈
+            llm: 대화 생성 모듈
+            tts: 음성 합성 모듈
+            vad: 업로드 전 무음 제거 (None이면 원본 그대로 업로드)
+            encoder: 업로드 전 압축 (None이면 WAV 그대로 업로드)
+            metrics: 단계별 지연 히스토그램 (None이면 집계 안 함)
+            trace_log: 턴별 JSONL 트레이스 기록 (None이면 기록 안 함)
+            loop: 실행할 백그라운드 루프 (None이면 프로세스 공용 루프)
+            dispatcher: 공급자별 동시 요청 제한 (None이면 제한 없음)
+        """
+        self.stt = stt
+        self.llm = llm
+        self.tts = tts
+        self.vad = vad
+        self.encoder = encoder
+        self.metrics = metrics
+        self.trace_log = trace_log
+        self.loop = loop or get_loop()
+        self.dispatcher = dispatcher
+        # 실시간 인식 턴에서 확정 전 텍스트로 미리 응답 생성 (추측도 Gemini 자리를 잡음)
+        self.speculator = Speculator(llm, hold=self._hold_sync if dispatcher else None) if llm else None
+        # 세션별로 지금 말하고 있는 턴 (새 턴이 시작되면 이전 턴은 끊음)
+        self._speaking: Dict[str, Turn] = {}
+        self._speaking_lock = threading.Lock()
+    
+    def start_trace(self, session_id: str = DEFAULT_SESSION) -> TurnTrace:
+        """턴 계측 시작 (렌더링까지 마친 뒤 trace.finish() 호출)"""
+        return TurnTrace(session_id, self.metrics, self.trace_log)
+
+    def _slot(self, provider: str, session_id: str, priority: int = LIVE):
+        """공급자 자리 (async with, 디스패처가 없으면 바로 통과)"""
+        if self.dispatcher is None:
+            return nullcontext(0.0)
+        return self.dispatcher.slot(provider, session_id, priority)
+
+    def _uses_gemini(self, text: str) -> bool:
+        """Gemini를 실제로 부를 턴인지 (로컬 빠른 경로/데모 응답은 자리를 잡지 않음)"""
+        return self.dispatcher is not None and self.llm.model is not None and not self.llm.is_local(text)
+
+    # ─────────────────────────────────────────────
+    # 코루틴 (루프 안에서 실행)
+    # ─────────────────────────────────────────────
+    async def transcribe(
+        self,
+        audio: bytes,
+        mime_type: str = "audio/wav",
+        trace: Optional[TurnTrace] = None,
+        priority: int = LIVE,
+    ) -> Optional[str]:
+        """무음 제거, 압축 후 음성 인식 (Deepgram SDK가 동기라 스레드에서 실행)"""
+        if not self.stt:
+            return None
+        trace = trace or self.start_trace()
+        
+        if self.vad and mime_type == "audio/wav":
+            with trace.span("vad", bytes=len(audio)) as span:
+                audio = self.vad.trim(audio)
+                span.tags["speech"] = audio is not None
+            if audio is None:
+                trace.tags["dropped"] = True
+                return None
+        if self.encoder and mime_type == "audio/wav":
+            with trace.span("encode", codec=self.encoder.codec):
+                audio, mime_type = await asyncio.to_thread(self.encoder.encode, audio)
+        
+        with trace.span("stt", provider="deepgram", bytes=len(audio), mime=mime_type) as span:
+            async with self._slot("deepgram", trace.session_id, priority) as wait:
+                span.tags["wait_ms"] = round(wait * 1000, 1)
+                return await asyncio.to_thread(self.stt.transcribe, audio, mime_type)
+    
+    async def respond(
+        self,
+        text: str,
+        session_id: str = DEFAULT_SESSION,
+        trace: Optional[TurnTrace] = None,
+        priority: int = LIVE,
+    ) -> str:
+        """응답 생성"""
+        if not self.llm:
+            return ""
+        trace = trace or self.start_trace(session_id)
+        trace.tags["intent"] = self._intent(text)
+        with trace.span("llm", provider="gemini") as span:
+            llm_slot = self._slot("gemini", session_id, priority) if self._uses_gemini(text) else nullcontext(0.0)
+            async with llm_slot as wait:
+                span.tags["wait_ms"] = round(wait * 1000, 1)
+                reply = await self.llm.generate_async(text, session_id=session_id)
+            span.tags["fallback"] = self._fallback(self.llm.session(session_id).last_path)
+            span.tags["prompt_tokens"] = self._prompt_tokens(session_id)
+        trace.tags["fallback"] = span.tags["fallback"]
+        return reply
+    
+    async def speak(self, text: str, trace: Optional[TurnTrace] = None, priority: int = LIVE,
+                    cancel: Optional[CancelToken] = None) -> Optional[bytes]:
+        """음성 합성 (cancel이 취소되면 None)"""
+        if not self.tts or not text:
+            return None
+        trace = trace or self.start_trace()
+        with trace.span("tts", provider="edge_tts") as span:
+            audio = await self.tts.synthesize(
+                text, cancel, slot=lambda: self._slot("edge_tts", trace.session_id, priority))
+            span.tags["bytes"] = len(audio or b"")
+        return audio
+    
+    async def speak_stream(self, text: str, trace: Optional[TurnTrace] = None,
+                           priority: int = LIVE) -> AsyncIterator[bytes]:
+        """음성 합성 (Edge TTS가 내보내는 청크를 오는 대로 yield, 첫 청크부터 전달 가능)"""
+        if not self.tts or not text:
+            return
+        trace = trace or self.start_trace()
+        span = trace.begin("tts", provider="edge_tts")
+        total = 0
+        try:
+            async for chunk in self.tts.synthesize_stream(
+                    text, slot=lambda: self._slot("edge_tts", trace.session_id, priority)):
+                if not total:
+                    trace.mark("tts_first_byte", provider="edge_tts")
+                total += len(chunk)
+                yield chunk
+        finally:
+            trace.end(span, bytes=total)
+    
+    async def run_turn(
+        self,
+        audio: bytes,
+        session_id: str = DEFAULT_SESSION,
+        mime_type: str = "audio/wav",
+    ) -> Turn:
+        """
+        음성 한 턴 전체 처리 (STT → LLM → TTS)
+        
+        turn.trace에 단계별 구간이 쌓입니다. 화면 렌더링까지 기록한 뒤
+        호출자가 turn.trace.finish()로 마무리합니다.
+        """
+        turn = Turn(session_id=session_id, trace=self.start_trace(session_id))
+        turn.user_text = await self.transcribe(audio, mime_type, turn.trace)
+        if not turn.user_text:
+            return turn
+        
+        reply = await self.respond(turn.user_text, session_id, turn.trace)
+        if reply:
+            turn.reply_parts.append(reply)
+            turn.audio = await self.speak(reply, turn.trace)
+        return turn
+    
+    async def stream_reply(
+        self,
+        turn: Turn,
+        source: Optional[Iterator[str]] = None,
+        gemini_slot: Optional[bool] = None,
+    ) -> AsyncIterator[bytes]:
+        """
+        LLM 스트리밍 → 문장별 TTS (오디오 청크를 도착 순서대로 yield)
+        
+        응답 텍스트는 청크가 나오는 대로 turn.reply_parts에 쌓입니다.
+        turn.cancel이 취소되면 (말 끊기) LLM 생성과 대기 중인 합성을 청크
+        경계에서 멈추고, 문맥에는 오디오까지 내보낸 부분만 끊김 표시로
+        기록합니다. 같은 세션에서 새 턴이 시작되면 말하던 이전 턴은
+        자동으로 끊깁니다.
+        
+        Args:
+            turn: user_text가 채워진 턴
+            source: 응답 텍스트 조각 (None이면 LLM.generate_stream, 추측 생성 결과 등,
+                record=False, result=turn.llm_reply로 만든 것이어야 함 - 기록은 여기서 llm.commit())
+            gemini_slot: Gemini 자리를 여기서 잡을지 (None이면 source가 없을 때만,
+                이미 자리를 잡고 만든 추측을 채택했으면 False)
+        """
+        if not self.llm or not turn.user_text or turn.cancel.cancelled:
+            return
+        if turn.trace is None:
+            turn.trace = self.start_trace(turn.session_id)
+        trace = turn.trace
+        trace.tags["intent"] = self._intent(turn.user_text)
+        self._begin_speaking(turn)
+        llm_span = trace.begin("llm", provider="gemini")
+        # Gemini 자리는 생성이 끝날 때까지 (TTS와 겹쳐 도는 동안에도) 잡아 둠
+        release_llm = lambda: None
+        
+        def first_token():
+            trace.mark("llm_first_token", provider="gemini")
+        
+        def chunks():
+            parts = source if source is not None else self.llm.generate_stream(
+                turn.user_text, session_id=turn.session_id, on_first_token=first_token,
+                record=False, cancel=turn.cancel, result=turn.llm_reply,
+            )
+            try:
+                for chunk in parts:
+                    if turn.cancel.cancelled:
+                        break
+                    if source is not None and not turn.reply_parts:
+                        first_token()
+                    turn.reply_parts.append(chunk)
+                    yield chunk
+            finally:
+                # 끊긴 경우 소스를 여기서 닫아야 생성이 멈추고 끊긴 응답이 기록됨
+                close = getattr(parts, "close", None)
+                if close:
+                    close()
+                release_llm()
+                end_llm()
+        
+        def end_llm():
+            if llm_span.end is None:
+                fallback = self._fallback(turn.llm_reply.path)
+                trace.end(llm_span, fallback=fallback, prompt_tokens=turn.llm_reply.prompt_tokens)
+                trace.tags["fallback"] = fallback
+        
+        completed = False
+        audio_stream = None
+        try:
+            if (source is None if gemini_slot is None else gemini_slot) and self._uses_gemini(turn.user_text):
+                wait_start = time.monotonic()
+                held = await self._hold("gemini", turn.session_id, turn.priority, turn.cancel)
+                llm_span.tags["wait_ms"] = round((time.monotonic() - wait_start) * 1000, 1)
+                if held is None:
+                    # 자리를 기다리다 끊김 (정지/말 끊기)
+                    return
+                release_llm = held
+            if not self.tts:
+                await asyncio.to_thread(lambda: list(chunks()))
+                turn.spoken = len(turn.reply_parts)
+            else:
+                tts_span = trace.begin("tts", provider="edge_tts")
+                total = 0
+                audio_stream = self.tts.synthesize_chunks(
+                    chunks(), cancel=turn.cancel,
+                    slot=lambda: self._slot("edge_tts", turn.session_id, turn.priority))
+                async for audio in audio_stream:
+                    if not total:
+                        trace.mark("tts_first_byte", provider="edge_tts")
+                    total += len(audio)
+                    turn.spoken += 1
+                    yield audio
+                trace.end(tts_span, bytes=total)
+            completed = True
+        finally:
+            # 소비자가 중간에 닫아도 (Streamlit rerun 등) 백그라운드 생성은 멈추고 끊긴 데까지 기록
+            self._end_speaking(turn, completed)
+            if audio_stream is not None:
+                await audio_stream.aclose()
+            release_llm()
+            end_llm()
+            await asyncio.to_thread(self._commit, turn)
+    
+    async def _hold(
+        self,
+        provider: str,
+        session_id: str,
+        priority: int,
+        cancel: CancelToken,
+    ) -> Optional[Callable[[], None]]:
+        """공급자 자리를 얻어 반납 함수를 돌려줌 (기다리는 중에 취소되면 포기하고 None)"""
+        hold = asyncio.ensure_future(self.dispatcher.hold(provider, session_id, priority))
+        cancelled = asyncio.ensure_future(cancel.wait())
+        release = None
+        try:
+            await asyncio.wait({hold, cancelled}, return_when=asyncio.FIRST_COMPLETED)
+            if hold.done() and not cancel.cancelled:
+                release = hold.result()
+        finally:
+            cancelled.cancel()
+            if release is None:
+                if not hold.done():
+                    hold.cancel()
+                elif not hold.cancelled() and hold.exception() is None:
+                    # 자리가 나는 순간 끊김 → 바로 반납
+                    hold.result()()
+        return release
+
+    def _hold_sync(self, session_id: str, cancel: CancelToken) -> Optional[Callable[[], None]]:
+        """추측 생성 스레드용 Gemini 자리 잡기 (실시간 턴과 같은 우선순위)"""
+        return self.loop.run(self._hold("gemini", session_id, LIVE, cancel))
+    
+    def _commit(self, turn: Turn):
+        """턴 응답을 문맥에 기록 (끊겼으면 말한 데까지, 응답이 없었으면 기록 안 함)"""
+        if turn.llm_reply.path is None or not turn.reply_parts:
+            return
+        if turn.cancel.cancelled:
+            self.llm.commit(turn.user_text, turn.spoken_reply, turn.llm_reply, turn.session_id, truncated=True)
+        else:
+            self.llm.commit(turn.user_text, turn.reply, turn.llm_reply, turn.session_id)
+    
+    # ─────────────────────────────────────────────
+    # 말 끊기 (barge-in)
+    # ─────────────────────────────────────────────
+    def _begin_speaking(self, turn: Turn):
+        with self._speaking_lock:
+            previous = self._speaking.get(turn.session_id)
+            self._speaking[turn.session_id] = turn
+        if previous is not None and previous is not turn:
+            self.interrupt(previous, "barge_in")
+    
+    def _end_speaking(self, turn: Turn, completed: bool):
+        with self._speaking_lock:
+            if self._speaking.get(turn.session_id) is turn:
+                del self._speaking[turn.session_id]
+        if not completed:
+            self.interrupt(turn, "closed")
+    
+    def interrupt(self, turn: Turn, reason: str = "stop") -> bool:
+        """
+        말하고 있는 턴을 끊음 (LLM 생성과 합성을 다음 청크 경계에서 멈춤)
+        
+        Args:
+            turn: 끊을 턴
+            reason: 취소 사유 (barge_in: 사용자가 말을 시작함, stop: 정지 버튼)
+            
+        Returns:
+            이번 호출로 끊었는지 (이미 끝났거나 끊긴 턴이면 False)
+        """
+        if not turn.cancel.cancel(reason):
+            return False
+        if turn.trace is not None:
+            turn.trace.mark("interrupted", reason=reason)
+            turn.trace.tags["interrupted"] = reason
+        logger.info(f"응답 중단 ({reason}): {turn.reply or '(첫 문장 전)'}")
+        return True
+    
+    def stop(self, session_id: str = DEFAULT_SESSION, reason: str = "stop") -> Optional[Turn]:
+        """
+        세션에서 말하고 있는 턴을 끊음 (정지 버튼, 스레드 안전)
+        
+        Returns:
+            끊은 턴 (말하는 중이 아니었으면 None)
+        """
+        with self._speaking_lock:
+            turn = self._speaking.get(session_id)
+        if turn is not None and self.interrupt(turn, reason):
+            return turn
+        return None
+    
+    async def watch_barge_in(
+        self,
+        events: AsyncIterator[TranscriptEvent],
+        turn: Turn,
+        min_chars: int = 2,
+    ) -> Optional[TranscriptEvent]:
+        """
+        응답을 말하는 동안 실시간 인식 이벤트를 보다가 사용자가 말하기 시작하면 끊음
+        
+        기침이나 맞장구 같은 아주 짧은 소리로 끊기지 않도록, 공백을 뺀
+        인식 텍스트가 min_chars 이상일 때만 끊습니다.
+        
+        Args:
+            events: StreamingSTT.events()
+            turn: 지금 말하고 있는 턴
+            min_chars: 끊기에 필요한 최소 글자 수
+            
+        Returns:
+            말 끊기를 일으킨 이벤트 (다음 턴의 시작), 턴이 먼저 끝나면 None
+        """
+        async for event in events:
+            if turn.cancel.cancelled:
+                return None
+            if len("".join(event.text.split())) >= min_chars:
+                self.interrupt(turn, "barge_in")
+                return event
+        return None
+    
+    async def speculative_reply(
+        self,
+        events: AsyncIterator[TranscriptEvent],
+        turn: Turn,
+    ) -> AsyncIterator[bytes]:
+        """
+        실시간 인식 이벤트 → (추측 생성) → 문장별 TTS
+        
+        엔드포인팅(speech_final)에서 확정된 텍스트로 응답을 미리 만들고,
+        UtteranceEnd(또는 이벤트 종료)를 턴 종료로 봐서 최종 텍스트와 비교합니다.
+        같으면 이미 만든 응답을 그대로 말하고, 다르면 다시 생성합니다.
+        
+        Args:
+            events: StreamingSTT.events()
+            turn: 결과를 채울 턴 (user_text는 최종 텍스트로 설정됨)
+        """
+        if turn.trace is None:
+            turn.trace = self.start_trace(turn.session_id)
+        spec = self.speculator.begin(turn.session_id, turn.cancel)
+        with turn.trace.span("stt", provider="deepgram_live"):
+            async for event in events:
+                spec.observe(event)
+                if event.utterance_end:
+                    break
+        turn.user_text = spec.transcript
+        if not turn.user_text:
+            return
+        
+        source = spec.finalize(turn.user_text, cancel=turn.cancel, record=False, result=turn.llm_reply)
+        turn.trace.tags["speculation"] = spec.outcome
+        # 채택한 추측은 자기 자리로 생성됨, 빗나가 새로 만들면 여기서 자리를 잡음
+        async for audio in self.stream_reply(turn, source=source, gemini_slot=spec.outcome != "hit"):
+            yield audio
+    
+    @staticmethod
+    def _fallback(path: Optional[str]) -> str:
+        """LLM 응답 경로 → 계측용 fallback 태그"""
+        return "none" if path in ("gemini", None) else path
+    
+    def _intent(self, text: str) -> Optional[str]:
+        """사용자 발화의 정형 의도 (기록/계측용, 로컬 응답 여부와 무관)"""
+        hit = self.llm.intents.match(text)
+        return hit.name if hit else None
+    
+    def _prompt_tokens(self, session_id: str) -> int:
+        """이번 턴 LLM 요청의 프롬프트 토큰 수 (트레이스 로그용)"""
+        return self.llm.session(session_id).context.stats["last_prompt_tokens"]
+    
+    # ─────────────────────────────────────────────
+    # 동기 호출 (Streamlit 스크립트 스레드용)
+    # ─────────────────────────────────────────────
+    def process(self, audio: bytes, session_id: str = DEFAULT_SESSION, mime_type: str = "audio/wav") -> Turn:
+        """음성 한 턴 처리 (동기)"""
+        return self.loop.run(self.run_turn(audio, session_id, mime_type))
+
+    def transcribe_sync(
+        self,
+        audio: bytes,
+        mime_type: str = "audio/wav",
+        trace: Optional[TurnTrace] = None,
+    ) -> Optional[str]:
+        """음성 인식 (동기)"""
+        return self.loop.run(self.transcribe(audio, mime_type, trace))
+
+    def speak_sync(self, text: str) -> Optional[bytes]:
+        """음성 합성 (동기)"""
+        return self.loop.run(self.speak(text))
+
+    def reply_audio(self, turn: Turn) -> Iterator[bytes]:
+        """stream_reply의 동기 버전 (청크마다 바로 반환)"""
+        return self.loop.iterate(self.stream_reply(turn))
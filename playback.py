@@ -0,0 +1,383 @@
+"""
+playback.py - 로컬 재생 엔진 (키오스크 등 서버 스피커로 말할 때)
+플레이어 프로세스 하나를 계속 띄워 두고 디코딩한 PCM을 stdin으로 흘려 넣음
+(응답마다 임시 파일/프로세스를 만들지 않고, 이어지는 청크는 끊김 없이 이어서 재생)
+
+재생 순서는 대기열 하나로 정하고, stop()은 대기열을 비운 뒤 플레이어를 끝내
+이미 넘긴 오디오까지 바로 멈춥니다 (다음 청크가 오면 다시 띄움).
+
+stdin 플레이어(aplay/pacat/sox/ffplay)가 하나도 없는 macOS는 afplay로 대체하는데,
+afplay는 stdin을 읽지 못해 청크마다 파일 쓰기 + 프로세스 실행이 남습니다
+(파일은 하나를 덮어써 재사용, 끊김 없는 재생은 sox나 ffmpeg 설치 필요).
+"""
+import io
+import logging
+import os
+import platform
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import soundfile as sf
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [PLAY] %(message)s')
+logger = logging.getLogger(__name__)
+
+# stdin으로 16-bit 모노 PCM을 받는 플레이어 (앞에서부터 설치된 것 사용, {rate}는 샘플레이트)
+PCM_PLAYERS = (
+    ["aplay", "-q", "-t", "raw", "-f", "S16_LE", "-r", "{rate}", "-c", "1"],             # Linux ALSA
+    ["pacat", "--raw", "--format=s16le", "--rate={rate}", "--channels=1"],               # PulseAudio/PipeWire
+    ["play", "-q", "-t", "raw", "-e", "signed", "-b", "16", "-r", "{rate}", "-c", "1", "-"],  # sox (macOS: brew install sox)
+    ["ffplay", "-nodisp", "-loglevel", "quiet", "-f", "s16le", "-ar", "{rate}", "-ac", "1", "-i", "pipe:0"],
+)
+
+
+def find_player() -> Optional[List[str]]:
+    """설치된 스트리밍 플레이어 명령 (없으면 None)"""
+    for command in PCM_PLAYERS:
+        if shutil.which(command[0]):
+            return command
+    return None
+
+
+def decode_pcm(audio: bytes) -> Tuple[bytes, int]:
+    """MP3/Ogg/WAV → (16-bit 모노 PCM, 샘플레이트)"""
+    data, rate = sf.read(io.BytesIO(audio), dtype="int16", always_2d=True)
+    if data.shape[1] > 1:
+        data = data.mean(axis=1).astype(np.int16)
+    return np.ascontiguousarray(data).reshape(-1).tobytes(), rate
+
+
+@dataclass
+class Clip:
+    """대기열에 넣은 오디오 하나 (engine.wait(clip)으로 재생 끝까지 대기)"""
+    audio: bytes
+    generation: int
+    written: bool = False       # 플레이어에 다 넘김
+    cancelled: bool = False     # stop/flush로 버려짐 (또는 디코딩 실패)
+    ends_at: float = 0.0        # 재생이 끝날 시각 (time.monotonic 기준 추정)
+    queued_at: float = 0.0
+    seconds: float = 0.0        # 오디오 길이 (다 넘긴 뒤 채움)
+
+
+class PlaybackEngine:
+    """
+    영구 플레이어 + 재생 대기열
+
+    사용 예:
+        engine = PlaybackEngine()
+        for audio in chunks:
+            engine.enqueue(audio)       # 바로 반환, 앞 청크에 이어서 재생
+        engine.drain()                  # 다 재생될 때까지 대기
+        engine.stop()                   # 말 끊기: 대기열 비우고 소리도 바로 멈춤
+    """
+
+    def __init__(self, command: Optional[List[str]] = None, max_queue: int = 64, slice_ms: int = 100):
+        """
+        Args:
+            command: 플레이어 명령 ({rate} 자리에 샘플레이트, None이면 설치된 것 자동 선택,
+                없으면 Windows는 winsound, 그 밖에는 afplay/임시 파일로 대체)
+            max_queue: 대기열에 쌓아 둘 최대 청크 수 (가득 차면 enqueue가 기다림)
+            slice_ms: 한 번에 플레이어에 넘기는 길이 (stop이 끼어들 수 있는 간격)
+        """
+        self.command = command or find_player()
+        self.slice_ms = slice_ms
+        self._queue: "queue.Queue[Optional[Clip]]" = queue.Queue(maxsize=max_queue)
+        self._cond = threading.Condition()
+        self._generation = 0
+        self._process: Optional[subprocess.Popen] = None
+        self._rate: Optional[int] = None
+        self._ends_at = 0.0
+        self._playing: List[Clip] = []
+        self._closed = False
+        self._clip_file: Optional[str] = None   # afplay 대체 경로용 (하나를 덮어써 재사용)
+        self.stats: Dict[str, float] = {
+            "enqueued": 0, "played": 0, "cancelled": 0, "decode_errors": 0,
+            "spawns": 0, "stops": 0, "gaps": 0, "seconds": 0.0,
+        }
+        self._thread = threading.Thread(target=self._run, daemon=True, name="haii-playback")
+        self._thread.start()
+        backend = self.command[0] if self.command else ("winsound" if platform.system() == "Windows" else "file")
+        logger.info(f"재생 엔진 시작 ({backend})")
+        if backend == "file":
+            logger.warning("stdin 플레이어가 없어 청크마다 afplay를 실행합니다 "
+                           "(끊김 없는 재생: brew install sox 또는 ffmpeg)")
+
+    # ─────────────────────────────────────────────
+    # 공개 API (스레드 안전)
+    # ─────────────────────────────────────────────
+    def enqueue(self, audio: bytes) -> Clip:
+        """재생 대기열에 추가 (디코딩/재생은 재생 스레드에서, 바로 반환)"""
+        with self._cond:
+            clip = Clip(audio, self._generation, queued_at=time.monotonic())
+            self.stats["enqueued"] += 1
+        self._queue.put(clip)
+        return clip
+
+    def wait(self, clip: Clip, timeout: Optional[float] = None) -> bool:
+        """
+        clip 재생이 끝날 때까지 대기
+
+        Returns:
+            끝까지 재생했으면 True, 멈췄거나(stop/flush) 시간 초과면 False
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if clip.cancelled:
+                    return False
+                now = time.monotonic()
+                if clip.written and now >= clip.ends_at:
+                    return True
+                remaining = clip.ends_at - now if clip.written else None
+                if deadline is not None:
+                    if now >= deadline:
+                        return False
+                    remaining = min(remaining, deadline - now) if remaining is not None else deadline - now
+                self._cond.wait(remaining)
+
+    def play(self, audio: bytes, timeout: Optional[float] = None) -> bool:
+        """넣고 재생 끝까지 대기 (TTS.play_audio)"""
+        return self.wait(self.enqueue(audio), timeout)
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """대기열의 오디오가 다 재생될 때까지 대기 (멈추면 False)"""
+        with self._cond:
+            generation = self._generation
+        self._queue.join()
+        with self._cond:
+            if self._generation != generation:
+                return False
+            last = self._playing[-1] if self._playing else None
+        return self.wait(last, timeout) if last is not None else True
+
+    def flush(self) -> int:
+        """아직 시작하지 않은 청크만 버림 (지금 나오는 소리는 계속)"""
+        dropped = 0
+        while True:
+            try:
+                clip = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._queue.task_done()
+            if clip is None:
+                # close()가 넣은 종료 신호는 다시 넣어 둠
+                self._queue.put(None)
+                break
+            self._cancel(clip)
+            dropped += 1
+        return dropped
+
+    def stop(self):
+        """말 끊기: 대기열을 비우고 플레이어에 넘긴 오디오까지 바로 멈춤"""
+        with self._cond:
+            self._generation += 1
+            now = time.monotonic()
+            playing = [c for c in self._playing if c.ends_at > now]
+            self._playing = []
+            self._ends_at = 0.0
+        dropped = self.flush()
+        for clip in playing:
+            self._cancel(clip)
+        self._kill()
+        self.stats["stops"] += 1
+        if dropped or playing:
+            logger.info(f"재생 중지 (버린 청크 {dropped + len(playing)}개)")
+
+    def close(self):
+        """플레이어와 재생 스레드 종료"""
+        if self._closed:
+            return
+        self._closed = True
+        self.stop()
+        self._queue.put(None)
+        self._thread.join(timeout=2)
+        if self._clip_file is not None:
+            try:
+                os.remove(self._clip_file)
+            except OSError:
+                pass
+
+    @property
+    def busy(self) -> bool:
+        """재생 중이거나 대기 중인 오디오가 있는지"""
+        return not self._queue.empty() or time.monotonic() < self._ends_at
+
+    # ─────────────────────────────────────────────
+    # 재생 스레드
+    # ─────────────────────────────────────────────
+    def _run(self):
+        while True:
+            clip = self._queue.get()
+            try:
+                if clip is None:
+                    break
+                if clip.generation != self._generation:
+                    self._cancel(clip)
+                    continue
+                try:
+                    pcm, rate = decode_pcm(clip.audio)
+                except Exception as e:
+                    self.stats["decode_errors"] += 1
+                    logger.warning(f"디코딩 실패, 건너뜀: {e}")
+                    self._cancel(clip)
+                    continue
+                try:
+                    played = self._write(clip, pcm, rate)
+                except Exception as e:
+                    logger.error(f"재생 실패: {e}")
+                    self._kill()
+                    played = False
+                if not played:
+                    self._cancel(clip)
+            finally:
+                self._queue.task_done()
+        self._kill()
+
+    def _write(self, clip: Clip, pcm: bytes, rate: int) -> bool:
+        """PCM을 플레이어에 넘김 (파이프가 차면 재생 속도에 맞춰 기다림, 멈추면 False)"""
+        if not self.command:
+            return self._play_blocking(clip, pcm, rate)
+        step = max(2, rate * self.slice_ms // 1000 * 2)
+        for offset in range(0, len(pcm), step):
+            part = pcm[offset:offset + step]
+            with self._cond:
+                if clip.generation != self._generation:
+                    return False
+                now = time.monotonic()
+                if clip.queued_at < self._ends_at < now:
+                    # 앞 청크가 재생 중일 때 들어왔는데 못 이어 붙임 (디코딩/쓰기가 늦음)
+                    self.stats["gaps"] += 1
+                self._ends_at = max(self._ends_at, now) + len(part) / 2 / rate
+                clip.ends_at = self._ends_at
+                if offset == 0:
+                    self._playing = [c for c in self._playing if c.ends_at > now] + [clip]
+            process = self._player(rate)
+            if clip.generation != self._generation:
+                # 그사이 stop()이 불림 (새로 띄운 플레이어에 이전 말을 넘기지 않음)
+                return False
+            try:
+                process.stdin.write(part)
+                process.stdin.flush()
+            except (BrokenPipeError, OSError, ValueError):
+                # stop()이 플레이어를 끝냈거나 플레이어가 죽음
+                if clip.generation == self._generation:
+                    logger.warning("플레이어가 종료됨, 다음 청크에서 다시 시작")
+                    self._kill()
+                return False
+        self._played(clip, len(pcm) / 2 / rate)
+        return True
+
+    def _player(self, rate: int) -> subprocess.Popen:
+        """플레이어 프로세스 (없거나 샘플레이트가 바뀌었으면 새로 띄움)"""
+        process = self._process
+        if process is not None and process.poll() is None and self._rate == rate:
+            return process
+        if process is not None:
+            self._kill()
+        args = [part.replace("{rate}", str(rate)) for part in self.command]
+        process = subprocess.Popen(args, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self._process, self._rate = process, rate
+        self.stats["spawns"] += 1
+        return process
+
+    def _kill(self):
+        """플레이어 종료 (파이프/장치에 남은 오디오도 버려짐)"""
+        process, self._process = self._process, None
+        if process is not None and process.poll() is None:
+            process.kill()
+            try:
+                process.wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                pass
+        if not self.command and platform.system() == "Windows":
+            import winsound
+            winsound.PlaySound(None, 0)
+
+    def _play_blocking(self, clip: Clip, pcm: bytes, rate: int) -> bool:
+        """스트리밍 플레이어가 없을 때: 청크마다 끝까지 재생 (Windows는 메모리에서 바로)"""
+        wav = io.BytesIO()
+        sf.write(wav, np.frombuffer(pcm, dtype=np.int16), rate, format="WAV", subtype="PCM_16")
+        with self._cond:
+            self._ends_at = time.monotonic() + len(pcm) / 2 / rate
+            clip.ends_at = self._ends_at
+            self._playing = [clip]
+        if platform.system() == "Windows":
+            import winsound
+            winsound.PlaySound(wav.getvalue(), winsound.SND_MEMORY | winsound.SND_NODEFAULT)
+        else:
+            # afplay는 stdin을 못 읽으므로 파일 경유 (stop()은 프로세스를 끝냄, 재생 스레드만 씀)
+            if self._clip_file is None:
+                fd, self._clip_file = tempfile.mkstemp(prefix="haii-play-", suffix=".wav")
+                os.close(fd)
+            with open(self._clip_file, "wb") as f:
+                f.write(wav.getvalue())
+            self._process = subprocess.Popen(["afplay", self._clip_file],
+                                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            self.stats["spawns"] += 1
+            self._process.wait()
+        with self._cond:
+            if clip.generation != self._generation:
+                return False
+            clip.ends_at = min(clip.ends_at, time.monotonic())
+        self._played(clip, len(pcm) / 2 / rate)
+        return True
+
+    def _played(self, clip: Clip, seconds: float):
+        """다 넘김 (집계는 여기서, 재생 중에 stop()으로 끊기면 _cancel이 되돌림)"""
+        with self._cond:
+            clip.written = True
+            clip.seconds = seconds
+            self.stats["played"] += 1
+            self.stats["seconds"] += seconds
+            self._cond.notify_all()
+
+    def _cancel(self, clip: Clip):
+        """버림/끊김 처리 (여러 번 불러도 한 번만 집계)"""
+        with self._cond:
+            if clip.cancelled:
+                return
+            clip.cancelled = True
+            self.stats["cancelled"] += 1
+            if clip.written:
+                # 다 넘겼지만 끝까지 나오기 전에 끊김 → 재생으로 세지 않음
+                self.stats["played"] -= 1
+                self.stats["seconds"] -= clip.seconds
+            self._cond.notify_all()
+
+
+# 테스트
+if __name__ == "__main__":
+    import sys
+
+    # 플레이어가 없어도 돌도록: 실시간 속도로 stdin을 읽기만 하는 가짜 플레이어
+    fake = [sys.executable, "-c",
+            "import sys,time\nr=int(sys.argv[1])\n"
+            "while True:\n d=sys.stdin.buffer.read(r//5)\n"
+            " if not d: break\n time.sleep(len(d)/2/r)", "{rate}"]
+    engine = PlaybackEngine(command=find_player() or fake)
+    rate = 24000
+    chunks = []
+    for freq in (330, 392, 440, 523):
+        tone = (0.2 * np.sin(2 * np.pi * freq * np.arange(rate // 2) / rate)).astype("float32")
+        out = io.BytesIO()
+        sf.write(out, tone, rate, format="WAV", subtype="PCM_16")
+        chunks.append(out.getvalue())
+
+    start = time.monotonic()
+    clips = [engine.enqueue(c) for c in chunks]
+    print(f"enqueue 4개: {(time.monotonic() - start) * 1000:.1f}ms")
+    print(f"전체 재생: {engine.drain()} ({time.monotonic() - start:.2f}s, 오디오 2.00s)")
+    clips = [engine.enqueue(c) for c in chunks]
+    time.sleep(0.7)
+    engine.stop()
+    print(f"0.7s에 중지: {[engine.wait(c, 0) for c in clips]} 대기열 {engine._queue.qsize()}")
+    print(f"다시 재생: {engine.play(chunks[0])}")
+    print(engine.stats)
+    engine.close()
@@ -0,0 +1,268 @@
+"""
+ratelimit.py - API 키별 요청 속도 제한 + 재시도 스케줄러
+프로세스 안의 모든 세션이 키 하나의 쿼터(RPM)를 나눠 쓰도록 토큰 버킷(GCRA)으로 입장 제어,
+429는 retry-after를 지키는 지수 백오프(지터)로 재시도하고 턴 마감을 못 지킬 때만 포기
+"""
+import asyncio
+import hashlib
+import logging
+import random
+import re
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [RATELIMIT] %(message)s')
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_RETRY_HINT = re.compile(r"retry(?:[ _-]?(?:after|delay|in))?\D{0,12}?(\d+(?:\.\d+)?)\s*s", re.IGNORECASE)
+
+
+class RateLimited(Exception):
+    """마감 안에 쿼터를 얻지 못함 (호출자가 대체 응답으로 전환)"""
+
+    def __init__(self, reason: str, wait: float = 0.0):
+        super().__init__(f"429 rate limited ({reason}, wait {wait:.2f}s)")
+        self.reason = reason
+        self.wait = wait
+
+
+def is_rate_limit(error: BaseException) -> bool:
+    """429/쿼터 초과 오류인지"""
+    if isinstance(error, RateLimited):
+        return True
+    if getattr(error, "code", None) == 429 or type(error).__name__ in ("ResourceExhausted", "TooManyRequests"):
+        return True
+    text = str(error)
+    return "429" in text or "quota" in text.lower()
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """오류가 알려준 재시도 대기 시간 (초, 없으면 None)"""
+    value = getattr(error, "retry_after", None)
+    if isinstance(value, (int, float)):
+        return float(value)
+    # google.api_core 예외: details 안의 RetryInfo.retry_delay
+    for detail in getattr(error, "details", None) or ():
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None:
+            return getattr(delay, "seconds", 0) + getattr(delay, "nanos", 0) / 1e9
+    match = _RETRY_HINT.search(str(error))
+    return float(match.group(1)) if match else None
+
+
+class RateLimiter:
+    """
+    토큰 버킷 (GCRA 방식 예약)
+
+    요청마다 다음 허용 시각을 예약하므로 대기 순서가 도착 순서와 같고,
+    기다려야 할 시간을 미리 알 수 있어 마감을 넘길 요청은 바로 거절합니다.
+
+    사용 예:
+        limiter = limiter_for(api_key, rpm=15)
+        response = limiter.call(lambda: model.generate_content(prompt), deadline=time.monotonic() + 6)
+    """
+
+    def __init__(
+        self,
+        rpm: float,
+        burst: Optional[int] = None,
+        max_waiters: int = 32,
+        max_retries: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        name: str = "",
+    ):
+        """
+        Args:
+            rpm: 분당 허용 요청 수 (API 키 쿼터)
+            burst: 연속으로 바로 보낼 수 있는 요청 수 (None이면 rpm의 1/4)
+            max_waiters: 동시에 대기할 수 있는 요청 수 (넘으면 바로 거절)
+            max_retries: 429 재시도 횟수
+            base_delay: 백오프 시작 대기 (초)
+            max_delay: 백오프 최대 대기 (초)
+            name: 로그용 이름
+        """
+        self.rpm = rpm
+        self.interval = 60.0 / rpm
+        self.burst = max(1, burst if burst is not None else int(rpm // 4))
+        self.max_waiters = max_waiters
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.name = name
+        self._tat = 0.0              # 이론상 다음 도착 시각 (GCRA)
+        self._blocked_until = 0.0    # 429 retry-after 동안 전체 정지
+        self._waiters = 0
+        self._lock = threading.Lock()
+        self.stats = {
+            "admitted": 0,
+            "rejected_queue": 0,
+            "rejected_deadline": 0,
+            "throttled": 0,
+            "retries": 0,
+            "wait_seconds": 0.0,
+        }
+
+    # ─────────────────────────────────────────────
+    # 입장 제어
+    # ─────────────────────────────────────────────
+    def reserve(self, deadline: Optional[float] = None) -> float:
+        """
+        요청 한 건 예약
+
+        Args:
+            deadline: time.monotonic() 기준 마감 (None이면 무제한)
+
+        Returns:
+            보내기 전에 기다릴 시간 (초)
+
+        Raises:
+            RateLimited: 대기열이 가득 찼거나 마감 전에 차례가 오지 않음
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._waiters >= self.max_waiters:
+                self.stats["rejected_queue"] += 1
+                raise RateLimited("queue full")
+            tat = max(self._tat, now)
+            start = max(tat - (self.burst - 1) * self.interval, self._blocked_until, now)
+            wait = start - now
+            if deadline is not None and start > deadline:
+                self.stats["rejected_deadline"] += 1
+                raise RateLimited("deadline", wait)
+            self._tat = max(tat, start) + self.interval
+            self.stats["admitted"] += 1
+            self.stats["wait_seconds"] += wait
+            if wait > 0:
+                self._waiters += 1
+            return wait
+
+    def _done_waiting(self, wait: float):
+        if wait > 0:
+            with self._lock:
+                self._waiters -= 1
+
+    def penalize(self, seconds: float):
+        """429를 받으면 키 전체를 잠시 멈춤 (다른 세션도 같은 쿼터를 쓰므로)"""
+        with self._lock:
+            self.stats["throttled"] += 1
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    def acquire(self, deadline: Optional[float] = None):
+        """차례가 올 때까지 대기 (동기)"""
+        wait = self.reserve(deadline)
+        try:
+            if wait > 0:
+                time.sleep(wait)
+        finally:
+            self._done_waiting(wait)
+
+    async def acquire_async(self, deadline: Optional[float] = None):
+        """차례가 올 때까지 대기 (비동기)"""
+        wait = self.reserve(deadline)
+        try:
+            if wait > 0:
+                await asyncio.sleep(wait)
+        finally:
+            self._done_waiting(wait)
+
+    # ─────────────────────────────────────────────
+    # 재시도
+    # ─────────────────────────────────────────────
+    def _backoff(self, attempt: int, error: BaseException, deadline: Optional[float]) -> float:
+        """
+        다음 재시도까지 대기 시간 (full jitter, retry-after보다 짧지 않게)
+
+        Raises:
+            전달받은 error: 재시도 횟수를 다 썼거나 마감 전에 재시도할 수 없음
+        """
+        hint = retry_after(error)
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if hint is not None:
+            delay = max(delay, hint)
+        self.penalize(hint if hint is not None else delay)
+        if attempt >= self.max_retries or (deadline is not None and time.monotonic() + delay > deadline):
+            raise error
+        self.stats["retries"] += 1
+        logger.warning(f"{self.name} 429 - {delay:.2f}초 후 재시도 ({attempt + 1}/{self.max_retries})")
+        return delay
+
+    def call(self, fn: Callable[[], T], deadline: Optional[float] = None) -> T:
+        """
+        쿼터 안에서 fn 실행 (429면 백오프 후 재시도)
+
+        Args:
+            fn: API 호출
+            deadline: time.monotonic() 기준 마감
+
+        Raises:
+            RateLimited: 마감 전에 차례가 오지 않음
+            fn의 예외: 429가 아니거나 재시도로도 마감을 못 지킴
+        """
+        attempt = 0
+        while True:
+            self.acquire(deadline)
+            try:
+                return fn()
+            except Exception as e:
+                if not is_rate_limit(e):
+                    raise
+                time.sleep(self._backoff(attempt, e, deadline))
+                attempt += 1
+
+    async def call_async(self, fn: Callable[[], Awaitable[T]], deadline: Optional[float] = None) -> T:
+        """call()의 비동기 버전"""
+        attempt = 0
+        while True:
+            await self.acquire_async(deadline)
+            try:
+                return await fn()
+            except Exception as e:
+                if not is_rate_limit(e):
+                    raise
+                await asyncio.sleep(self._backoff(attempt, e, deadline))
+                attempt += 1
+
+    @property
+    def waiters(self) -> int:
+        """지금 차례를 기다리는 요청 수"""
+        return self._waiters
+
+
+# API 키 → 공용 제한기 (키 원문은 보관하지 않음)
+_LIMITERS: Dict[str, RateLimiter] = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+def limiter_for(api_key: Optional[str], rpm: float, **kwargs) -> RateLimiter:
+    """
+    API 키별 공용 RateLimiter (프로세스 안에서 하나)
+
+    Args:
+        api_key: API 키 (None이면 익명 키 하나를 공유)
+        rpm: 처음 만들 때의 분당 허용 요청 수
+        **kwargs: RateLimiter 생성 인자
+    """
+    key = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:12]
+    with _LIMITERS_LOCK:
+        limiter = _LIMITERS.get(key)
+        if limiter is None:
+            limiter = _LIMITERS[key] = RateLimiter(rpm, name=f"key:{key[:6]}", **kwargs)
+            logger.info(f"속도 제한 생성: {limiter.name} ({rpm:g} RPM, burst {limiter.burst})")
+        return limiter
+
+
+# 테스트
+if __name__ == "__main__":
+    limiter = RateLimiter(rpm=120, burst=2, name="demo")
+    start = time.monotonic()
+    for i in range(6):
+        try:
+            limiter.acquire(deadline=time.monotonic() + 1.2)
+            print(f"요청 {i}: {time.monotonic() - start:.2f}s")
+        except RateLimited as e:
+            print(f"요청 {i}: 거절 ({e})")
+    print(limiter.stats)
@@ -0,0 +1,178 @@
+"""
+runtime.py - 프로세스 공용 백그라운드 이벤트 루프
+턴마다 asyncio.run()으로 루프를 만들고 닫는 대신, 루프 하나를 계속 돌려
+비동기 클라이언트/연결을 턴 사이에 재사용하고 여러 세션의 턴을 겹쳐 실행
+"""
+import asyncio
+import concurrent.futures
+import logging
+import sys
+import threading
+from typing import AsyncIterator, Awaitable, Callable, Iterator, List, Optional, TypeVar
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [LOOP] %(message)s')
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Windows 이벤트 루프 정책 (프로세스당 한 번)
+if sys.platform == "win32":
+    asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+
+class BackgroundLoop:
+    """백그라운드 스레드에서 계속 도는 asyncio 이벤트 루프"""
+
+    def __init__(self, name: str = "haii-loop"):
+        """
+        Args:
+            name: 루프 스레드 이름
+        """
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+        logger.info(f"백그라운드 루프 시작: {name}")
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro: Awaitable[T]) -> "concurrent.futures.Future[T]":
+        """
+        코루틴을 루프에 넣고 바로 반환 (스레드 안전)
+
+        Returns:
+            결과를 기다릴 수 있는 concurrent.futures.Future
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Awaitable[T], timeout: Optional[float] = None) -> T:
+        """
+        코루틴을 루프에서 실행하고 결과를 기다림 (동기 호출용)
+
+        Args:
+            coro: 실행할 코루틴
+            timeout: 최대 대기 시간 (초)
+        """
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("루프 스레드 안에서는 run()을 호출할 수 없습니다 (await 사용)")
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    def iterate(self, agen: AsyncIterator[T]) -> Iterator[T]:
+        """비동기 이터레이터를 루프에서 돌리며 동기 이터레이터로 순회"""
+        iterator = agen.__aiter__()
+        done = object()
+
+        async def next_item():
+            try:
+                return await iterator.__anext__()
+            except StopAsyncIteration:
+                return done
+
+        try:
+            while True:
+                item = self.run(next_item())
+                if item is done:
+                    return
+                yield item
+        finally:
+            aclose = getattr(iterator, "aclose", None)
+            if aclose is not None:
+                async def close():
+                    await aclose()
+                self.submit(close())
+
+    def stop(self):
+        """루프 종료"""
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+
+
+class CancelToken:
+    """
+    턴 취소 신호 (말 끊기/정지 버튼)
+
+    스크립트 스레드, LLM 스트리밍 스레드, 루프의 코루틴 어디서든 cancel()을
+    부르면 각 단계가 다음 확인 지점(청크 경계)에서 멈춥니다.
+    """
+
+    def __init__(self):
+        self.reason: Optional[str] = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "stop") -> bool:
+        """
+        취소 (처음 한 번만 유효)
+
+        Args:
+            reason: 취소 사유 (barge_in: 사용자가 말을 시작함, stop: 정지 버튼 등)
+
+        Returns:
+            이번 호출로 취소되었는지 (이미 취소된 상태면 False)
+        """
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"취소 콜백 실패: {e}")
+        return True
+
+    def on_cancel(self, callback: Callable[[], None]):
+        """취소될 때 호출할 함수 등록 (이미 취소됐으면 바로 호출)"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback: Callable[[], None]):
+        """on_cancel로 등록한 함수 해제 (일이 먼저 끝났을 때, 오래 쓰는 토큰에 콜백이 쌓이지 않게)"""
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    async def wait(self):
+        """취소될 때까지 대기 (코루틴, 다른 스레드에서 취소해도 깨어남)"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake():
+            if not future.done():
+                future.set_result(None)
+
+        callback = lambda: loop.call_soon_threadsafe(wake)
+        self.on_cancel(callback)
+        try:
+            await future
+        finally:
+            self.remove_callback(callback)
+
+
+_default_loop: Optional[BackgroundLoop] = None
+_default_lock = threading.Lock()
+
+
+def get_loop() -> BackgroundLoop:
+    """프로세스 공용 백그라운드 루프 (처음 호출 시 시작)"""
+    global _default_loop
+    with _default_lock:
+        if _default_loop is None:
+            _default_loop = BackgroundLoop()
+        return _default_loop
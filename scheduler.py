@@ -0,0 +1,368 @@
+"""
+scheduler.py - 복약 알림 전화 스케줄러
+어르신별 복약 시간표에 맞춰 전화를 거는 시점을 관리 (한 프로세스에서 수만 명)
+
+어르신마다 "다음에 걸 시각" 하나만 힙에 넣고, 꺼내서 전화를 건 뒤 그다음 시각을
+다시 넣습니다. 모두가 08:30에 몰리지 않도록 어르신별로 고정된 지연(jitter)을 더하고,
+초당 전화 수 상한으로 한 번 더 고르게 폅니다.
+"""
+import asyncio
+import heapq
+import inspect
+import itertools
+import json
+import logging
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [SCHED] %(message)s')
+logger = logging.getLogger(__name__)
+
+# README의 기본 복약 시간표: 아침/저녁 식후 30분
+DEFAULT_DOSES = (
+    ("morning", "08:30", ("혈압약", "당뇨약", "종합비타민")),
+    ("evening", "18:30", ("혈압약", "콘드로이친", "고지혈증약")),
+)
+
+
+def _minute_of_day(hhmm: str) -> int:
+    """복약 시각 ("H:MM" 또는 "HH:MM") → 자정 기준 분 (잘못된 시각이면 ValueError)"""
+    parts = hhmm.strip().split(":")
+    if len(parts) != 2 or not all(p.isdigit() for p in parts):
+        raise ValueError(f"복약 시각 형식이 잘못되었습니다: {hhmm!r} (HH:MM)")
+    hour, minute = int(parts[0]), int(parts[1])
+    if not (0 <= hour <= 23 and 0 <= minute <= 59):
+        raise ValueError(f"복약 시각 범위가 잘못되었습니다: {hhmm!r} (00:00 ~ 23:59)")
+    return hour * 60 + minute
+
+
+@dataclass(frozen=True)
+class Timetable:
+    """
+    복약 시간표 (하루 단위 반복, 같은 구성은 Timetable.of()로 하나를 공유)
+
+    minutes[i]분(자정 기준)에 slots[i] 슬롯, medications[i] 약
+    """
+    minutes: Tuple[int, ...]
+    slots: Tuple[str, ...]
+    medications: Tuple[Tuple[str, ...], ...]
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def of(doses: Tuple[Tuple[str, str, Tuple[str, ...]], ...]) -> "Timetable":
+        """
+        (슬롯, "HH:MM", 약 목록) 튜플들 → 시간표
+
+        같은 처방은 같은 객체를 돌려주므로 어르신 수만 명이어도 시간표는 몇 개뿐입니다.
+        """
+        rows = sorted((_minute_of_day(hhmm), slot, tuple(meds)) for slot, hhmm, meds in doses)
+        if not rows:
+            raise ValueError("복약 시간이 없습니다")
+        minutes, slots, medications = zip(*rows)
+        return Timetable(minutes, slots, medications)
+
+
+@dataclass
+class ScheduledCall:
+    """걸어야 할 전화 하나"""
+    elder_id: str
+    slot: str
+    due: float                      # 걸 시각 (jitter 포함, epoch 초)
+    nominal: float                  # 시간표상 시각
+    medications: Tuple[str, ...] = ()
+
+
+def local_midnight(ts: float) -> float:
+    """ts가 속한 날의 로컬 자정 (epoch 초)"""
+    day = datetime.fromtimestamp(ts).replace(hour=0, minute=0, second=0, microsecond=0)
+    return day.timestamp()
+
+
+class CallScheduler:
+    """
+    복약 알림 전화 스케줄러
+
+    힙에는 어르신당 항목 하나 (다음 전화)만 두고, 시간표를 바꾸거나 지우면 세대
+    번호로 이전 항목을 무효화합니다 (힙에서 바로 빼지 않고 꺼낼 때 버림).
+
+    사용 예:
+        scheduler = CallScheduler(on_due=start_outbound_call, spread=600, max_rate=20)
+        scheduler.add("elder-01", Timetable.of(DEFAULT_DOSES))
+        get_loop().submit(scheduler.run())
+    """
+
+    def __init__(
+        self,
+        on_due: Optional[Callable[[ScheduledCall], Any]] = None,
+        spread: float = 600.0,
+        max_rate: Optional[float] = None,
+        ring_window: float = 1800.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        Args:
+            on_due: 전화 걸 때 호출 (코루틴 함수면 태스크로 실행, None이면 take()로 꺼내 감)
+            spread: 시간표 시각 뒤로 어르신별 고정 지연을 흩뿌릴 폭 (초, 0이면 정각)
+            max_rate: 초당 최대 전화 수 (None이면 제한 없음, 넘치면 뒤로 밀림)
+            ring_window: take()로 꺼내지 않은 전화를 부재중으로 볼 때까지 (초)
+            clock: 현재 시각 함수 (시험용)
+        """
+        self.on_due = on_due
+        self.spread = spread
+        self.max_rate = max_rate
+        self.ring_window = ring_window
+        self.clock = clock
+        # (걸 시각, 순번, 어르신 ID, 세대)
+        self._heap: List[Tuple[float, int, str, int]] = []
+        self._timetables: Dict[str, Timetable] = {}
+        self._generation: Dict[str, int] = {}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._ringing: Dict[str, ScheduledCall] = {}
+        self._next_allowed = 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._tasks: set = set()
+        self.stats: Dict[str, float] = {"fired": 0, "missed": 0, "answered": 0, "errors": 0, "max_late_s": 0.0}
+
+    # ─────────────────────────────────────────────
+    # 시간표 관리 (스레드 안전)
+    # ─────────────────────────────────────────────
+    def add(self, elder_id: str, timetable: Timetable):
+        """어르신 추가 또는 시간표 변경 (다음 전화 시각을 새로 계산)"""
+        now = self.clock()
+        with self._lock:
+            self._timetables[elder_id] = timetable
+            generation = self._generation.get(elder_id, 0) + 1
+            self._generation[elder_id] = generation
+            due, _ = self._next(elder_id, timetable, now)
+            heapq.heappush(self._heap, (due, next(self._seq), elder_id, generation))
+        self._notify()
+
+    def remove(self, elder_id: str):
+        """어르신 제외 (힙 항목은 꺼낼 때 버림)"""
+        with self._lock:
+            self._timetables.pop(elder_id, None)
+            self._generation[elder_id] = self._generation.get(elder_id, 0) + 1
+            self._ringing.pop(elder_id, None)
+
+    def __len__(self) -> int:
+        return len(self._timetables)
+
+    def next_call(self, elder_id: str) -> Optional[ScheduledCall]:
+        """어르신의 다음 전화 (없으면 None)"""
+        with self._lock:
+            timetable = self._timetables.get(elder_id)
+            if timetable is None:
+                return None
+            due, index = self._next(elder_id, timetable, self.clock())
+        return self._call(elder_id, timetable, index, due)
+
+    def offset(self, elder_id: str, slot: str) -> float:
+        """어르신/슬롯별 고정 지연 (0 ~ spread초, 매일 같은 시각에 전화가 가도록 해시로 정함)"""
+        if not self.spread:
+            return 0.0
+        return zlib.crc32(f"{elder_id}:{slot}".encode()) / 2 ** 32 * self.spread
+
+    def _next(self, elder_id: str, timetable: Timetable, after: float) -> Tuple[float, int]:
+        """after 이후 첫 전화 (걸 시각, 시간표 인덱스)"""
+        today = datetime.fromtimestamp(after).replace(hour=0, minute=0, second=0, microsecond=0)
+        for day in range(2):
+            base = today + timedelta(days=day)
+            best = None
+            for i, minute in enumerate(timetable.minutes):
+                # 자정 + 분으로 더하면 서머타임 바뀌는 날 한 시간 어긋나므로 그날의 시:분으로 계산
+                nominal = base.replace(hour=minute // 60, minute=minute % 60).timestamp()
+                due = nominal + self.offset(elder_id, timetable.slots[i])
+                if due > after and (best is None or due < best[0]):
+                    best = (due, i)
+            if best is not None:
+                return best
+        raise RuntimeError("다음 전화 시각을 찾지 못했습니다")
+
+    def _call(self, elder_id: str, timetable: Timetable, index: int, due: float) -> ScheduledCall:
+        return ScheduledCall(
+            elder_id=elder_id,
+            slot=timetable.slots[index],
+            due=due,
+            nominal=due - self.offset(elder_id, timetable.slots[index]),
+            medications=timetable.medications[index],
+        )
+
+    # ─────────────────────────────────────────────
+    # 꺼내기
+    # ─────────────────────────────────────────────
+    def pop_due(self, now: Optional[float] = None, limit: Optional[int] = None) -> List[ScheduledCall]:
+        """
+        걸 시각이 된 전화를 꺼내고 각 어르신의 다음 전화를 다시 넣음
+
+        Args:
+            now: 기준 시각 (None이면 clock())
+            limit: 최대 개수 (속도 제한용, 나머지는 힙에 남음)
+        """
+        now = self.clock() if now is None else now
+        calls: List[ScheduledCall] = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now and (limit is None or len(calls) < limit):
+                due, _, elder_id, generation = heapq.heappop(self._heap)
+                if self._generation.get(elder_id) != generation:
+                    continue
+                timetable = self._timetables[elder_id]
+                _, index = self._next(elder_id, timetable, due - 1e-6)
+                calls.append(self._call(elder_id, timetable, index, due))
+                next_due, _ = self._next(elder_id, timetable, due)
+                heapq.heappush(self._heap, (next_due, next(self._seq), elder_id, generation))
+        return calls
+
+    def take(self, elder_id: str) -> Optional[ScheduledCall]:
+        """
+        이 어르신에게 울리고 있는 전화를 꺼냄 (on_due 없이 앱이 폴링할 때)
+
+        ring_window가 지난 전화는 부재중으로 집계하고 None
+        """
+        with self._lock:
+            call = self._ringing.pop(elder_id, None)
+        if call is None:
+            return None
+        if self.clock() - call.due > self.ring_window:
+            self.stats["missed"] += 1
+            logger.info(f"부재중: {elder_id} ({call.slot})")
+            return None
+        self.stats["answered"] += 1
+        return call
+
+    def ringing(self, elder_id: str) -> Optional[ScheduledCall]:
+        """
+        이 어르신에게 울리고 있는 전화 (꺼내지 않음, ring_window가 지났으면 None)
+
+        같은 어르신 화면을 여러 개 띄워도 모두 울리도록, 세션마다 이미 울린
+        전화(due)를 기억해 두고 새 전화일 때만 울립니다.
+        """
+        with self._lock:
+            call = self._ringing.get(elder_id)
+        if call is None or self.clock() - call.due > self.ring_window:
+            return None
+        return call
+
+    # ─────────────────────────────────────────────
+    # 실행 (루프 안에서)
+    # ─────────────────────────────────────────────
+    def _notify(self):
+        # 더 이른 전화가 들어왔을 수 있으므로 대기 중인 run()을 깨움
+        if self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def run(self):
+        """다음 전화 시각까지 자다가 걸기를 반복 (취소될 때까지)"""
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        logger.info(f"스케줄러 시작: 어르신 {len(self)}명")
+        while True:
+            with self._lock:
+                head = self._heap[0][0] if self._heap else None
+            delay = None if head is None else max(0.0, head - self.clock())
+            if delay:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), min(delay, 60.0))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            if head is None:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+            for call in self.pop_due(limit=100):
+                await self._pace()
+                self._fire(call)
+
+    async def _pace(self):
+        """초당 전화 수 상한 (넘치면 다음 자리까지 기다림)"""
+        if not self.max_rate:
+            return
+        now = time.monotonic()
+        self._next_allowed = max(now, self._next_allowed + 1.0 / self.max_rate)
+        if self._next_allowed > now:
+            await asyncio.sleep(self._next_allowed - now)
+
+    def _fire(self, call: ScheduledCall):
+        late = self.clock() - call.due
+        self.stats["fired"] += 1
+        self.stats["max_late_s"] = max(self.stats["max_late_s"], late)
+        if self.on_due is None:
+            with self._lock:
+                self._ringing[call.elder_id] = call
+            return
+        try:
+            result = self.on_due(call)
+            if inspect.isawaitable(result):
+                task = asyncio.ensure_future(result)
+                self._tasks.add(task)
+                task.add_done_callback(self._done)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"전화 걸기 실패 ({call.elder_id}): {e}")
+
+    def _done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self.stats["errors"] += 1
+            logger.error(f"전화 걸기 실패: {task.exception()}")
+
+
+def load_timetables(path: str) -> Dict[str, Timetable]:
+    """
+    시간표 파일 읽기
+
+    JSON 형식:
+        {"elder-01": [{"slot": "morning", "time": "08:30", "medications": ["혈압약"]}, ...], ...}
+    """
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return {
+        elder_id: Timetable.of(tuple((d["slot"], d["time"], tuple(d.get("medications", ()))) for d in doses))
+        for elder_id, doses in data.items()
+    }
+
+
+# 테스트
+if __name__ == "__main__":
+    from collections import Counter
+
+    logging.getLogger().setLevel(logging.WARNING)
+    N = 20000
+    start = local_midnight(time.time()) + 86400 + 8 * 3600   # 내일 08:00
+
+    for spread, rate in ((0, None), (600, None), (600, 20)):
+        clock = [start]
+        scheduler = CallScheduler(spread=spread, max_rate=rate, clock=lambda: clock[0])
+        t = time.perf_counter()
+        for i in range(N):
+            scheduler.add(f"elder-{i:05d}", Timetable.of(DEFAULT_DOSES))
+        added = time.perf_counter() - t
+
+        # 1초씩 시간을 흘리며 꺼냄 (max_rate면 초당 그만큼만)
+        per_second = Counter()
+        t = time.perf_counter()
+        while clock[0] < start + 3600:
+            calls = scheduler.pop_due(limit=int(rate) if rate else None)
+            if calls:
+                per_second[int(clock[0] - start)] += len(calls)
+            clock[0] += 1
+        popped = time.perf_counter() - t
+        total = sum(per_second.values())
+        print(f"spread={spread}s max_rate={rate}: {total}통화, 최대 {max(per_second.values())}통화/초, "
+              f"마지막 {max(per_second) // 60}분 후, 추가 {added * 1e6 / N:.1f}µs/명, 꺼내기 {popped * 1e6 / total:.1f}µs/통화, "
+              f"시간표 객체 {Timetable.of.cache_info().currsize}개")
+
+    # 시간대별 인사말
+    from LLM import LLM
+    llm = LLM(api_key="offline")
+    for hour in (7, 12, 19, 23):
+        print(hour, llm.get_greeting(now=datetime.now().replace(hour=hour)))
+    print(llm.get_greeting(slot="morning", medications=DEFAULT_DOSES[0][2]))
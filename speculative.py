@@ -0,0 +1,371 @@
+"""
+speculative.py - 중간 인식 결과로 미리 응답 생성 (추측 생성)
+엔드포인팅이 발화 종료를 알리면 확정 전 텍스트로 LLM을 먼저 돌리고,
+턴이 끝났을 때 최종 텍스트와 같으면 그대로 쓰고 다르면 취소 후 다시 생성
+"""
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional
+
+from LLM import Reply
+from context import estimate_tokens
+from intent import normalize
+from runtime import CancelToken
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [SPEC] %(message)s')
+logger = logging.getLogger(__name__)
+
+# (세션 ID, 취소 신호) → Gemini 자리 반납 함수 (기다리다 취소되면 None, 동기 호출)
+Hold = Callable[[str, CancelToken], Optional[Callable[[], None]]]
+
+
+class Draft:
+    """추측 생성 하나 (백그라운드 스레드에서 LLM 스트림을 받아 버퍼링)"""
+
+    def __init__(
+        self,
+        llm,
+        text: str,
+        session_id: str,
+        parent: Optional[CancelToken] = None,
+        hold: Optional[Hold] = None,
+    ):
+        """
+        Args:
+            llm: LLM 인스턴스
+            text: 추측에 쓸 (확정 전) 텍스트
+            session_id: 대화 세션 ID
+            parent: 턴의 취소 신호 (말 끊기/정지면 추측도 멈춤)
+            hold: Gemini 자리 잡기 (None이면 제한 없음)
+        """
+        self.llm = llm
+        self.text = text
+        self.key = normalize(text)
+        self.session_id = session_id
+        self.chunks: List[str] = []
+        self.done = False
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        # 로컬 빠른 경로로 답하면 프롬프트 토큰도 Gemini 자리도 들지 않음
+        self.local = llm.is_local(text)
+        # 생성 결과는 세션이 아니라 여기에 (채택될 때만 턴으로 넘어감)
+        self.result = Reply()
+        self.token = CancelToken()
+        self._parent = parent
+        self._hold = hold if llm.model is not None and not self.local else None
+        if parent is not None:
+            parent.on_cancel(self._stop)
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="llm-draft", daemon=True)
+        self._thread.start()
+
+    def _stop(self):
+        self.token.cancel(self._parent.reason or "stop")
+
+    def _run(self):
+        release = None
+        stream = None
+        try:
+            if self._hold is not None:
+                release = self._hold(self.session_id, self.token)
+                if release is None:
+                    # 자리를 기다리다 취소됨 → 요청을 보내지 않음
+                    return
+            stream = self.llm.generate_stream(
+                self.text, session_id=self.session_id, record=False, cancel=self.token, result=self.result)
+            for chunk in stream:
+                with self._cond:
+                    self.chunks.append(chunk)
+                    self._cond.notify_all()
+                if self.token.cancelled:
+                    break
+        except Exception as e:
+            logger.error(f"추측 생성 실패: {e}")
+        finally:
+            # 생성기를 이 스레드에서 닫아 Gemini 스트림을 바로 멈춤
+            if stream is not None:
+                stream.close()
+            if release is not None:
+                release()
+            if self._parent is not None:
+                self._parent.remove_callback(self._stop)
+            with self._cond:
+                self.done = True
+                self.finished = time.perf_counter()
+                self._cond.notify_all()
+
+    @property
+    def reply(self) -> str:
+        with self._cond:
+            return " ".join(self.chunks)
+
+    def cancel(self) -> int:
+        """
+        취소 (다음 조각에서 멈춤)
+
+        Returns:
+            버린 토큰 추정치 (프롬프트 + 지금까지 생성한 응답)
+        """
+        self.token.cancel("discard")
+        # 프롬프트는 요청을 보냈을 때만 (자리를 기다리던 중이면 0)
+        return self.result.prompt_tokens + estimate_tokens(self.reply)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """생성이 끝날 때까지 대기"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.done, timeout)
+
+    def iter_chunks(self) -> Iterator[str]:
+        """이미 받은 조각부터 생성이 끝날 때까지 차례로"""
+        index = 0
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: index < len(self.chunks) or self.done)
+                if index >= len(self.chunks):
+                    return
+                chunk = self.chunks[index]
+            index += 1
+            yield chunk
+
+
+class SpeculativeTurn:
+    """
+    한 턴의 추측 생성 상태
+
+    observe()로 실시간 인식 이벤트를 넣고, 턴이 끝나면 finalize(최종 텍스트)로
+    응답 조각 반복자를 받습니다.
+    """
+
+    def __init__(self, speculator: "Speculator", session_id: str, cancel: Optional[CancelToken] = None):
+        self.speculator = speculator
+        self.session_id = session_id
+        self.cancel = cancel
+        self.finals: List[str] = []
+        self.draft: Optional[Draft] = None
+        self.wasted_tokens = 0
+        # finalize 결과: hit / miss / none (추측 안 함)
+        self.outcome = "none"
+
+    @property
+    def transcript(self) -> str:
+        """지금까지 확정된 텍스트"""
+        return " ".join(self.finals).strip()
+
+    def observe(self, event):
+        """
+        실시간 인식 이벤트 반영
+
+        Args:
+            event: STT.TranscriptEvent
+        """
+        if event.is_final and event.text:
+            self.finals.append(event.text)
+        if event.speech_final and not event.utterance_end:
+            # 엔드포인팅 = 발화가 끝났을 가능성이 높음 → 미리 생성
+            self._speculate(self.transcript)
+        elif event.text and not event.is_final and self.draft is not None:
+            # 다시 말하기 시작함 → 추측이 빗나갈 것이므로 바로 취소
+            self._discard("resumed")
+
+    def _speculate(self, text: str):
+        spec = self.speculator
+        if len(normalize(text)) < spec.min_chars:
+            return
+        if self.draft is not None:
+            if self.draft.key == normalize(text):
+                return
+            self._discard("changed")
+        if self.wasted_tokens >= spec.max_wasted_tokens:
+            return
+        self.draft = Draft(spec.llm, text, self.session_id, parent=self.cancel, hold=spec.hold)
+        spec.count("attempts")
+        logger.info(f"추측 생성 시작: {text}")
+
+    def _discard(self, reason: str):
+        wasted = self.draft.cancel()
+        self.wasted_tokens += wasted
+        self.speculator.count("cancelled")
+        self.speculator.count("wasted_tokens", wasted)
+        logger.info(f"추측 생성 취소 ({reason}, 토큰 {wasted}): {self.draft.text}")
+        self.draft = None
+
+    def finalize(
+        self,
+        final_text: Optional[str] = None,
+        cancel: Optional[CancelToken] = None,
+        record: bool = True,
+        result: Optional[Reply] = None,
+    ) -> Iterator[str]:
+        """
+        턴 종료: 최종 텍스트로 추측을 검증
+
+        Args:
+            final_text: 최종 인식 결과 (None이면 확정된 구간을 이어 붙인 것)
+            cancel: 말 끊기 취소 신호 (멈추면 남은 생성을 버림, None이면 begin()에 준 것)
+            record: False면 문맥에 기록하지 않음 (호출자가 실제로 말한 부분을 llm.commit())
+            result: 채택된 응답의 Reply를 받을 곳 (record=False일 때 commit()에 넘김)
+
+        Returns:
+            응답 텍스트 조각 반복자 (맞으면 추측 결과, 아니면 새 생성)
+        """
+        text = (final_text if final_text is not None else self.transcript).strip()
+        cancel = cancel if cancel is not None else self.cancel
+        spec = self.speculator
+        draft = self.draft
+        self.draft = None
+
+        if draft is not None and draft.key == normalize(text):
+            now = time.perf_counter()
+            saved = (min(now, draft.finished) if draft.finished else now) - draft.started
+            self.outcome = "hit"
+            spec.count("hits")
+            spec.count("saved_ms", saved * 1000)
+            logger.info(f"추측 적중 ({saved * 1000:.0f}ms 절약): {text}")
+            return self._commit(draft, text, cancel, record, result)
+
+        if draft is not None:
+            wasted = draft.cancel()
+            self.wasted_tokens += wasted
+            self.outcome = "miss"
+            spec.count("misses")
+            spec.count("wasted_tokens", wasted)
+            logger.info(f"추측 빗나감 (토큰 {wasted}): {draft.text} → {text}")
+        if not text:
+            return iter(())
+        return spec.llm.generate_stream(text, session_id=self.session_id, record=record, cancel=cancel, result=result)
+
+    def _commit(
+        self,
+        draft: Draft,
+        text: str,
+        cancel: Optional[CancelToken] = None,
+        record: bool = True,
+        result: Optional[Reply] = None,
+    ) -> Iterator[str]:
+        llm = self.speculator.llm
+        sent: List[str] = []
+        finished = False
+        try:
+            for chunk in draft.iter_chunks():
+                if cancel is not None and cancel.cancelled:
+                    break
+                sent.append(chunk)
+                yield chunk
+            else:
+                finished = True
+        finally:
+            if not finished:
+                # 말 끊기 (또는 소비자가 스트림을 닫음): 남은 생성은 버림
+                draft.cancel()
+            if result is not None:
+                # 채택: 추측의 경로/토큰을 턴으로 넘김
+                adopted = draft.result
+                result.path, result.text = adopted.path, adopted.text
+                result.response, result.prompt_tokens = adopted.response, adopted.prompt_tokens
+            if record and sent:
+                llm.commit(text, draft.reply if finished else " ".join(sent), draft.result,
+                           session_id=self.session_id, truncated=not finished)
+
+
+class Speculator:
+    """
+    추측 생성기 (프로세스 공용, 적중률/절약 시간 집계)
+
+    사용 예:
+        turn = speculator.begin(session_id)
+        async for event in stream.events():
+            turn.observe(event)
+            if event.utterance_end:
+                break
+        for chunk in turn.finalize():
+            ...
+    """
+
+    def __init__(self, llm, min_chars: int = 2, max_wasted_tokens: int = 600, hold: Optional[Hold] = None):
+        """
+        Args:
+            llm: LLM 인스턴스
+            min_chars: 이보다 짧은 (정규화 후) 텍스트로는 추측하지 않음
+            max_wasted_tokens: 한 턴에서 버릴 수 있는 토큰 상한 (넘으면 그 턴은 추측 중단)
+            hold: 추측 생성도 Gemini 자리를 잡도록 (PipelineRunner가 디스패처로 만들어 줌)
+        """
+        self.llm = llm
+        self.hold = hold
+        self.min_chars = min_chars
+        self.max_wasted_tokens = max_wasted_tokens
+        self._lock = threading.Lock()
+        self.stats: Dict[str, float] = {
+            "turns": 0, "attempts": 0, "hits": 0, "misses": 0, "cancelled": 0,
+            "wasted_tokens": 0, "saved_ms": 0.0,
+        }
+
+    def begin(self, session_id: str, cancel: Optional[CancelToken] = None) -> SpeculativeTurn:
+        """
+        새 턴 시작
+
+        Args:
+            session_id: 대화 세션 ID
+            cancel: 턴의 취소 신호 (끊기면 진행 중인 추측도 멈춤)
+        """
+        self.count("turns")
+        return SpeculativeTurn(self, session_id, cancel)
+
+    def count(self, key: str, amount: float = 1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def summary(self) -> Dict:
+        """적중률, 턴당 평균 절약 시간, 버린 토큰"""
+        with self._lock:
+            stats = dict(self.stats)
+        decided = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / decided if decided else 0.0
+        stats["avg_saved_ms"] = stats["saved_ms"] / stats["hits"] if stats["hits"] else 0.0
+        return stats
+
+
+# 테스트
+if __name__ == "__main__":
+    import asyncio
+    import logging as _logging
+
+    from LLM import LLM
+    from STT import StreamingSTT
+    from fake_deepgram import FakeDeepgramServer
+    from fake_providers import FakeGenerativeModel, LatencyModel
+
+    _logging.getLogger().setLevel(_logging.WARNING)
+    llm = LLM(api_key="offline", model=FakeGenerativeModel(LatencyModel(600)), fast_path=False)
+    speculator = Speculator(llm)
+
+    async def call(transcript: str, more: Optional[str] = None):
+        async with FakeDeepgramServer(transcript, more=more) as server:
+            async with StreamingSTT(api_key="test", url=server.url) as stream:
+                turn = speculator.begin("demo")
+
+                async def listen():
+                    async for event in stream.events():
+                        turn.observe(event)
+                        if event.utterance_end:
+                            return
+
+                listener = asyncio.create_task(listen())
+                # 단어당 0.2초, 이어 말하기 전에는 0.5초 멈춤
+                for i, word in enumerate(transcript.split() + (more or "").split()):
+                    if i == len(transcript.split()):
+                        await asyncio.sleep(0.5)
+                    for _ in range(10):
+                        await stream.send(b"\x00" * 640)
+                        await asyncio.sleep(0.02)
+                # 엔드포인팅 뒤 턴 종료(UtteranceEnd) 판단까지 쉼
+                await asyncio.sleep(1.0)
+                await stream.finish()
+                await listener
+                start = time.perf_counter()
+                reply = " ".join(await asyncio.to_thread(lambda: list(turn.finalize())))
+                print(f"{turn.transcript} → {reply} ({(time.perf_counter() - start) * 1000:.0f}ms)")
+
+    asyncio.run(call("네 먹었어요"))
+    asyncio.run(call("약은 먹었는데", more="허리가 좀 아파"))
+    print(speculator.summary())
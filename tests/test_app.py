@@ -0,0 +1,61 @@
+import time
+
+import pytest
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+import metrics
+
+
+@pytest.fixture
+def registries(monkeypatch):
+    """앱이 만든 MetricsRegistry를 붙잡아 둠 (st.cache_resource 안에서 만들어지므로)"""
+    created = []
+    original = metrics.MetricsRegistry.__init__
+
+    def init(self):
+        original(self)
+        created.append(self)
+
+    monkeypatch.setattr(metrics.MetricsRegistry, "__init__", init)
+    monkeypatch.setenv("MEDIA_PORT", "0")
+    st.cache_resource.clear()
+    yield created
+    st.cache_resource.clear()
+
+
+def _reruns(registry):
+    """(page, scope) → 기록된 실행 횟수"""
+    return {dict(key)["page"] + ":" + dict(key)["scope"]: series[-1]
+            for key, series in registry.rerun_seconds._series.items()}
+
+
+@pytest.mark.parametrize("script, page, scopes", [
+    ("app.py", "call", ("app", "timer", "conversation")),
+    ("main.py", "connected", ("app", "timer")),
+])
+def test_each_run_times_the_app_and_its_fragments(registries, script, page, scopes):
+    at = AppTest.from_file(script, default_timeout=30)
+    at.session_state.state = page
+    at.session_state.start_time = time.time()
+    at.session_state.messages = [{"role": "ai", "text": "안녕하세요"}]
+    at.run()
+    assert not at.exception
+    [registry] = registries
+    assert _reruns(registry) == {f"{page}:{scope}": 1 for scope in scopes}
+
+    at.run()
+    assert _reruns(registry) == {f"{page}:{scope}": 2 for scope in scopes}
+
+
+def test_run_stopped_by_rerun_is_not_timed(registries):
+    at = AppTest.from_file("app.py", default_timeout=30)
+    at.session_state.state = "idle"
+    at.run()
+    [registry] = registries
+    assert _reruns(registry) == {"idle:app": 1}
+
+    # 전화 걸기 → st.rerun()으로 멈춘 실행은 빼고 다시 실행된 ringing 화면만 기록
+    at.button[0].click().run()
+    assert at.session_state.state == "ringing"
+    assert _reruns(registry) == {"idle:app": 1, "ringing:app": 1}
@@ -0,0 +1,108 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import httpx
+
+from batch_transcribe import BatchTranscriber, is_transient, load_done
+
+
+def _response(transcript="안녕하세요", channels=1, alternatives=1):
+    alternative = SimpleNamespace(transcript=transcript, confidence=0.9)
+    channel = SimpleNamespace(alternatives=[alternative] * alternatives)
+    return SimpleNamespace(
+        results=SimpleNamespace(channels=[channel] * channels),
+        metadata=SimpleNamespace(duration=1.5),
+    )
+
+
+class ApiError(Exception):
+    def __init__(self, status):
+        super().__init__(f"status {status}")
+        self.status = status
+
+
+class FakeSTT:
+    """파일 이름별로 정해 둔 응답(또는 차례로 던질 오류)을 돌려주는 가짜 STT"""
+
+    def __init__(self, script):
+        self.script = {name: list(steps) for name, steps in script.items()}
+        self.requests = []
+
+    def request(self, audio, mime_type):
+        name = audio.decode()
+        self.requests.append(name)
+        step = self.script[name].pop(0) if len(self.script[name]) > 1 else self.script[name][0]
+        if isinstance(step, Exception):
+            raise step
+        return step
+
+
+def _run(tmp_path, script, out=None, **kwargs):
+    paths = []
+    for name in script:
+        path = tmp_path / f"{name}.wav"
+        path.write_bytes(name.encode())
+        paths.append(path)
+    out = out or tmp_path / "out.jsonl"
+    stt = FakeSTT(script)
+    batch = BatchTranscriber(stt, concurrency=2, base_delay=0.0, max_delay=0.0, **kwargs)
+    summary = asyncio.run(batch.run(paths, out))
+    records = {json.loads(line)["path"].rsplit("/", 1)[-1]: json.loads(line) for line in out.read_text().splitlines()}
+    return summary, records, stt
+
+
+def test_load_done_keeps_finished_and_ignores_failed_or_torn_lines(tmp_path):
+    out = tmp_path / "out.jsonl"
+    assert load_done(out) == set()
+    out.write_text(
+        json.dumps({"path": "/a.wav", "status": "ok"}) + "\n"
+        + json.dumps({"path": "/b.wav", "status": "empty"}) + "\n"
+        + json.dumps({"path": "/c.wav", "status": "failed"}) + "\n"
+        + '{"path": "/d.wav", "sta'
+    )
+    assert load_done(out) == {"/a.wav", "/b.wav"}
+
+
+def test_is_transient_classifies_errors():
+    assert is_transient(httpx.ConnectError("refused"))
+    assert is_transient(httpx.ReadTimeout("slow"))
+    assert is_transient(ApiError(429))
+    assert is_transient(ApiError(503))
+    assert is_transient(ApiError("500"))
+    assert not is_transient(ApiError(400))
+    assert not is_transient(ApiError(401))
+    assert not is_transient(ApiError("bad"))
+    assert not is_transient(ValueError("no status"))
+
+
+def test_transient_errors_are_retried_and_permanent_ones_are_not(tmp_path):
+    summary, records, stt = _run(tmp_path, {
+        "flaky": [ApiError(503), httpx.ConnectError("refused"), _response()],
+        "denied": [ApiError(401)],
+    }, retries=3)
+    assert records["flaky.wav"]["status"] == "ok" and records["flaky.wav"]["attempts"] == 3
+    assert records["denied.wav"]["status"] == "failed" and records["denied.wav"]["attempts"] == 1
+    assert stt.requests.count("denied") == 1
+    assert summary["retries"] == 2
+
+
+def test_resume_skips_done_files_and_retries_failed_ones(tmp_path):
+    out = tmp_path / "out.jsonl"
+    _run(tmp_path, {"a": [_response()], "b": [ApiError(400)]}, out=out)
+    summary, records, stt = _run(tmp_path, {"a": [_response()], "b": [_response("다시")]}, out=out)
+    assert stt.requests == ["b"]
+    assert summary["skipped"] == 1 and summary["ok"] == 1
+    assert records["b.wav"]["transcript"] == "다시"
+
+
+def test_malformed_response_is_recorded_as_failed(tmp_path):
+    summary, records, _ = _run(tmp_path, {
+        "no_channels": [_response(channels=0)],
+        "no_alternatives": [_response(alternatives=0)],
+        "fine": [_response()],
+    })
+    assert records["no_channels.wav"]["status"] == "failed"
+    assert records["no_alternatives.wav"]["status"] == "failed"
+    assert records["fine.wav"]["status"] == "ok"
+    assert summary["files"] == 3 and summary["failed"] == 2
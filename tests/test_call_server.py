@@ -0,0 +1,136 @@
+import asyncio
+import json
+
+import pytest
+import websockets
+
+from LLM import LLM
+from TTS import TTS
+from call_server import CLOSE_SLOW, CallClient, CallServer
+from fake_providers import FakeGenerativeModel, LatencyModel, make_fake_communicate
+from pipeline import PipelineRunner
+from runtime import BackgroundLoop
+
+
+@pytest.fixture
+def pipeline():
+    loop = BackgroundLoop()
+    llm = LLM(api_key="test-call-server", model=FakeGenerativeModel(LatencyModel(0), token_ms=2),
+              rpm=6000, fast_path=False)
+    tts = TTS(communicate=make_fake_communicate(LatencyModel(100, p95_ms=100)))
+    yield PipelineRunner(None, llm, tts, loop=loop)
+    loop.stop()
+
+
+def _serve(pipeline, scenario, **kwargs):
+    async def main():
+        async with CallServer(pipeline, host="127.0.0.1", port=0, **kwargs) as server:
+            return await asyncio.wait_for(scenario(server), 20)
+    return asyncio.run(main())
+
+
+def test_calls_over_max_calls_are_rejected_busy(pipeline):
+    async def scenario(server):
+        async with CallClient(server.url, "s1"):
+            with pytest.raises(ConnectionError, match="busy"):
+                await CallClient(server.url, "s2").connect()
+            assert server.stats["rejected"] == 1
+            assert server.stats["active"] == 1
+        # 먼저 통화가 끝나면 다시 받음
+        for _ in range(50):
+            if server.stats["active"] == 0:
+                break
+            await asyncio.sleep(0.02)
+        async with CallClient(server.url, "s3") as call:
+            assert not call.closed
+        return server.stats
+
+    stats = _serve(pipeline, scenario, max_calls=1)
+    assert stats["calls"] == 2 and stats["rejected"] == 1
+
+
+class StuckSocket:
+    """start와 턴 하나를 보내고 나서 서버가 보내는 메시지를 전혀 받지 않는 클라이언트"""
+
+    def __init__(self):
+        self.inbox: asyncio.Queue = asyncio.Queue()
+        self.inbox.put_nowait(json.dumps({"type": "start", "session_id": "slow"}))
+        self.inbox.put_nowait(json.dumps({"type": "text", "turn": 1, "text": "허리가 아파요"}))
+        self.close_code = None
+
+    async def recv(self):
+        return await self.inbox.get()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        message = await self.inbox.get()
+        if message is None:
+            raise StopAsyncIteration
+        return message
+
+    async def send(self, message):
+        await asyncio.sleep(3600)
+
+    async def close(self, code=1000, reason=""):
+        if self.close_code is None:
+            self.close_code = code
+        self.inbox.put_nowait(None)
+
+
+def test_slow_client_is_dropped(pipeline):
+    async def main():
+        server = CallServer(pipeline, send_timeout=0.2)
+        ws = StuckSocket()
+        await asyncio.wait_for(server._handle(ws), 10)
+        return server, ws
+
+    server, ws = asyncio.run(main())
+    assert ws.close_code == CLOSE_SLOW
+    assert server.stats["dropped_slow"] == 1
+    assert server.stats["active"] == 0
+
+
+def test_new_turn_barges_in_and_ends_the_previous_turn(pipeline):
+    async def scenario(server):
+        async with websockets.connect(server.url, max_size=None) as ws:
+            await ws.send(json.dumps({"type": "start", "session_id": "s1"}))
+            assert json.loads(await ws.recv())["type"] == "ready"
+            await ws.send(json.dumps({"type": "text", "turn": 1, "text": "오늘 날씨 어때요"}, ensure_ascii=False))
+
+            turn_ends = []
+            barged = False
+            while len(turn_ends) < 2:
+                message = await ws.recv()
+                if isinstance(message, bytes):
+                    continue
+                data = json.loads(message)
+                if data["type"] == "reply" and data["turn"] == 1 and not barged:
+                    # 첫 문장을 말하는 중에 다음 턴
+                    barged = True
+                    await ws.send(json.dumps({"type": "text", "turn": 2, "text": "고마워요"}, ensure_ascii=False))
+                elif data["type"] == "turn_end":
+                    turn_ends.append(data)
+            return turn_ends, server.stats
+
+    (first, second), stats = _serve(pipeline, scenario)
+    assert (first["turn"], first["interrupted"]) == (1, "barge_in")
+    assert first["reply"]
+    assert (second["turn"], second["interrupted"]) == (2, None)
+    assert stats["turns"] == 2 and stats["interrupted"] == 1
+
+
+def test_stop_ends_the_turn_as_stopped(pipeline):
+    async def scenario(server):
+        async with CallClient(server.url, "s1") as call:
+            events = []
+            async for event in call.say_text("오늘 날씨 어때요"):
+                events.append(event)
+                if event.type == "audio" and len(events) == 1:
+                    await call.stop()
+            return events
+
+    events = _serve(pipeline, scenario)
+    assert events[-1].type == "turn_end"
+    assert events[-1].data["interrupted"] == "stop"
@@ -0,0 +1,78 @@
+import io
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from codec import EDGE_MP3_KBPS, SpeechEncoder, compression_for
+
+RATE = 24000
+SECONDS = 4.0
+
+
+@pytest.fixture(scope="module")
+def edge_mp3():
+    """Edge TTS와 같은 24kHz 48kbps MP3 (말 사이 쉼이 있는 유성음 비슷한 신호)"""
+    t = np.arange(int(RATE * SECONDS)) / RATE
+    voiced = sum(np.sin(2 * np.pi * 190 * k * t) / k for k in range(1, 8))
+    signal = (0.2 * voiced * (np.sin(2 * np.pi * 2.5 * t) > -0.3)).astype("float32")
+    out = io.BytesIO()
+    sf.write(out, signal, RATE, format="MP3", subtype="MPEG_LAYER_III",
+             compression_level=compression_for("mp3", EDGE_MP3_KBPS, RATE), bitrate_mode="CONSTANT")
+    return out.getvalue()
+
+
+def _decoded_seconds(audio):
+    data, sample_rate = sf.read(io.BytesIO(audio))
+    return len(data) / sample_rate
+
+
+def test_passthrough_mp3_is_returned_unchanged(edge_mp3):
+    encoder = SpeechEncoder("mp3")
+    assert encoder.passthrough and encoder.key == ""
+    assert (encoder.mime_type, encoder.extension, encoder.concatenable) == ("audio/mpeg", ".mp3", True)
+    assert encoder.encode(edge_mp3) is edge_mp3
+    summary = encoder.summary()
+    assert summary["bytes_per_second"] == pytest.approx(EDGE_MP3_KBPS * 1000 / 8, rel=0.01)
+    assert summary["vs_edge_mp3"] == 1.0
+
+
+@pytest.mark.parametrize("output_format, bitrate, mime, magic, key", [
+    ("mp3", 32, "audio/mpeg", b"\xff", "mp3@32"),
+    ("opus", 24, "audio/ogg", b"OggS", "opus@24"),
+    ("opus", 16, "audio/ogg", b"OggS", "opus@16"),
+    ("pcm", None, "audio/wav", b"RIFF", "pcm"),
+])
+def test_encoded_format_and_mime_type(edge_mp3, output_format, bitrate, mime, magic, key):
+    encoder = SpeechEncoder(output_format, bitrate)
+    audio = encoder.encode(edge_mp3)
+    assert audio.startswith(magic)
+    assert encoder.mime_type == mime and encoder.key == key
+    assert encoder.concatenable == (mime == "audio/mpeg")
+    assert _decoded_seconds(audio) == pytest.approx(SECONDS, abs=0.15)
+    assert encoder.summary()["speech_seconds"] == pytest.approx(SECONDS, abs=0.15)
+
+
+def test_bytes_per_second_follows_bitrate(edge_mp3):
+    rates = {}
+    for output_format, bitrate in (("mp3", 32), ("opus", 24), ("opus", 16), ("pcm", None)):
+        encoder = SpeechEncoder(output_format, bitrate)
+        encoder.encode(edge_mp3)
+        rates[output_format, bitrate] = encoder.summary()["bytes_per_second"]
+
+    # MP3는 고정 비트레이트, Opus는 가변이라 목표 이하, PCM은 24kHz 16-bit 그대로
+    assert rates["mp3", 32] == pytest.approx(32000 / 8, rel=0.1)
+    assert rates["opus", 16] < rates["opus", 24] <= 24000 / 8 * 1.1
+    assert rates["pcm", None] == pytest.approx(RATE * 2, rel=0.01)
+    assert rates["opus", 24] < rates["mp3", 32] < EDGE_MP3_KBPS * 1000 / 8
+
+
+def test_undecodable_input_returns_none_and_counts_failure():
+    encoder = SpeechEncoder("opus")
+    assert encoder.encode(b"not audio") is None
+    assert encoder.summary()["failed"] == 1 and encoder.summary()["clips"] == 0
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        SpeechEncoder("aac")
@@ -0,0 +1,69 @@
+from context import SUMMARY_PREFIX, TRUNCATED_MARK, ContextWindow, estimate_tokens
+
+
+def _fill(window, count, start=0):
+    for i in range(start, start + count):
+        window.add(f"{i}번 이야기", f"{i}번 대답")
+
+
+def test_folds_in_batches_past_max_turns():
+    window = ContextWindow(max_turns=3, fold_batch=2)
+    _fill(window, 4)
+    assert len(window.turns) == 4 and window.summary == ""
+    _fill(window, 1, start=4)
+    # max_turns + fold_batch 에 닿으면 최근 max_turns만 남기고 접음
+    assert [u for u, _ in window.turns] == ["2번 이야기", "3번 이야기", "4번 이야기"]
+    assert window.stats["folded_turns"] == 2
+    assert "0번 이야기" in window.summary and "1번 이야기" in window.summary
+
+
+def test_summarizer_gets_previous_summary_and_old_turns():
+    calls = []
+
+    def summarizer(summary, turns):
+        calls.append((summary, list(turns)))
+        return f"요약{len(calls)}"
+
+    window = ContextWindow(max_turns=1, fold_batch=1, summarizer=summarizer)
+    _fill(window, 3)
+    assert calls == [("", [("0번 이야기", "0번 대답")]), ("요약1", [("1번 이야기", "1번 대답")])]
+    assert window.summary == "요약2"
+
+
+def test_failing_summarizer_falls_back_to_extract():
+    def summarizer(summary, turns):
+        raise RuntimeError("quota")
+
+    window = ContextWindow(max_turns=1, fold_batch=1, summarizer=summarizer)
+    _fill(window, 2)
+    assert "0번 이야기" in window.summary
+
+
+def test_summary_stays_within_its_token_cap():
+    window = ContextWindow(max_turns=1, fold_batch=1, summary_tokens=20)
+    for i in range(20):
+        window.add(f"{i}번째 긴 이야기, 오늘은 공원에 산책을 다녀왔어요", "좋네요")
+    assert estimate_tokens(window.summary) <= 20
+
+
+def test_build_puts_summary_first_and_respects_budget():
+    window = ContextWindow(max_turns=2, fold_batch=1, token_budget=60)
+    _fill(window, 3)
+    contents = window.build("오늘 뭐 했어")
+    assert contents[0]["parts"][0] == SUMMARY_PREFIX.format(summary=window.summary)
+    assert contents[-1] == {"role": "user", "parts": ["오늘 뭐 했어"]}
+
+    tight = ContextWindow(max_turns=6, token_budget=30)
+    _fill(tight, 5)
+    contents = tight.build("새 질문")
+    assert tight.stats["last_prompt_tokens"] <= 30
+    assert tight.stats["dropped_turns"] > 0
+    # 예산 때문에 빠진 턴도 저장은 그대로
+    assert len(tight.turns) == 5
+
+
+def test_truncated_reply_is_marked_in_history():
+    window = ContextWindow()
+    window.add("약 먹었어", "잘하셨어요, 그런데", truncated=True)
+    assert window.turns[-1][1].endswith(TRUNCATED_MARK)
+    assert window.history[-1] == {"role": "ai", "content": "잘하셨어요, 그런데", "truncated": True}
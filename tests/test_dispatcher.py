@@ -0,0 +1,86 @@
+import asyncio
+
+from dispatcher import BACKGROUND, LIVE, Dispatcher, ProviderPool
+
+
+async def _queue(pool, requests):
+    """자리 하나를 잡아 둔 채로 요청들을 줄 세우고, 풀어 가며 받은 순서를 돌려줌"""
+    order = []
+
+    async def worker(session_id, priority, tag):
+        await pool.acquire(session_id, priority)
+        order.append(tag)
+        pool.release()
+
+    await pool.acquire("holder")
+    tasks = [asyncio.create_task(worker(*request)) for request in requests]
+    await asyncio.sleep(0)
+    assert pool.queued == len(requests)
+    pool.release()
+    await asyncio.gather(*tasks)
+    return order
+
+
+def test_sessions_take_turns_within_a_priority():
+    pool = ProviderPool("gemini", 1)
+    requests = [("a", LIVE, "a1"), ("a", LIVE, "a2"), ("a", LIVE, "a3"), ("b", LIVE, "b1"), ("b", LIVE, "b2")]
+    order = asyncio.run(_queue(pool, requests))
+    assert order == ["a1", "b1", "a2", "b2", "a3"]
+
+
+def test_live_goes_before_background():
+    pool = ProviderPool("edge_tts", 1)
+    requests = [("bg", BACKGROUND, "bg1"), ("bg", BACKGROUND, "bg2"), ("call", LIVE, "live")]
+    order = asyncio.run(_queue(pool, requests))
+    assert order[0] == "live"
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def main():
+        pool = ProviderPool("deepgram", 1)
+        await pool.acquire("holder")
+        waiter = asyncio.create_task(pool.acquire("a"))
+        await asyncio.sleep(0)
+        assert pool.queued == 1
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert pool.queued == 0
+        pool.release()
+        assert pool.in_flight == 0
+        return pool
+
+    pool = asyncio.run(main())
+    assert pool.stats["cancelled"] == 1
+
+
+def test_slot_granted_to_a_cancelled_waiter_is_passed_on():
+    async def main():
+        pool = ProviderPool("gemini", 1)
+        await pool.acquire("holder")
+        first = asyncio.create_task(pool.acquire("a"))
+        second = asyncio.create_task(pool.acquire("b"))
+        await asyncio.sleep(0)
+        # 자리를 넘겨받기로 정해진 뒤 (콜백 실행 전) 취소
+        pool.release()
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        await asyncio.wait_for(second, 1)
+        assert pool.in_flight == 1
+        pool.release()
+        assert pool.in_flight == 0 and pool.queued == 0
+
+    asyncio.run(main())
+
+
+def test_hold_releases_once():
+    async def main():
+        dispatcher = Dispatcher({"gemini": 1}, max_calls=1)
+        release = await dispatcher.hold("gemini", "a")
+        assert dispatcher.pools["gemini"].in_flight == 1
+        release()
+        release()
+        assert dispatcher.pools["gemini"].in_flight == 0
+        # 제한이 없는 공급자는 바로 통과
+        (await dispatcher.hold("unknown", "a"))()
+
+    asyncio.run(main())
@@ -0,0 +1,48 @@
+import pytest
+
+from intent import IntentEngine
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return IntentEngine()
+
+
+@pytest.mark.parametrize("text, name", [
+    ("네 약 먹었어요", "medication_taken"),
+    ("오늘 아침에 밥 먹었어요", "meal_eaten"),
+    ("약 아직 안 먹었어", "medication_missed"),
+    ("밥은 안 먹었어", "meal_missed"),
+    ("약은 못 먹었어", "medication_missed"),
+    ("고마워", "thanks"),
+])
+def test_answers_routine_turns(engine, text, name):
+    hit = engine.answer(text)
+    assert hit is not None and hit.name == name
+
+
+@pytest.mark.parametrize("text", ["안 먹었어", "안 좋아", "괜찮지 않아", "밥 먹지 않았어"])
+def test_negation_never_gets_the_opposite_reply(engine, text):
+    hit = engine.answer(text)
+    assert hit is None or hit.name not in ("meal_eaten", "medication_taken", "mood_good")
+
+
+def test_bare_ate_is_not_a_meal(engine):
+    assert engine.answer("먹었어") is None
+
+
+@pytest.mark.parametrize("text", ["약은 먹었나 모르겠어", "누가 약 먹었어?", "밥 먹었니", "약 먹었냐"])
+def test_questions_and_uncertainty_go_to_gemini(engine, text):
+    assert engine.answer(text) is None
+    assert engine.fallback(text, "default") == "default"
+
+
+@pytest.mark.parametrize("text, name", [
+    ("괜찮아 아파", "pain"),
+    ("밥은 먹었는데 허리가 아파", "pain"),
+    ("네 좋아요 근데 가슴이 답답해", "emergency"),
+])
+def test_non_local_intent_vetoes_local_answer(engine, text, name):
+    assert engine.answer(text) is None
+    hit = engine.match(text)
+    assert hit.name == name and not engine.accepts(hit)
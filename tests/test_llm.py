@@ -0,0 +1,34 @@
+from types import SimpleNamespace
+
+from LLM import LLM
+
+
+class LockProbe:
+    """generate_content를 부를 때 세션 잠금이 잡혀 있었는지 기록하는 모델"""
+
+    def __init__(self):
+        self.llm = None
+        self.locked = []
+
+    def generate_content(self, contents, stream=False):
+        self.locked.append(self.llm.session("s").lock.locked())
+        return SimpleNamespace(text="네, 알겠어요.")
+
+
+def test_generate_does_not_hold_session_lock_during_model_call():
+    model = LockProbe()
+    llm = LLM(api_key="test-llm", model=model, fast_path=False, rpm=6000)
+    model.llm = llm
+    assert llm.generate("허리가 좀 아파", session_id="s") == "네, 알겠어요."
+    assert model.locked == [False]
+    assert llm.session("s").context.turns[-1] == ("허리가 좀 아파", "네, 알겠어요.")
+    assert llm.session("s").last_path == "gemini"
+
+
+def test_token_usage_does_not_create_sessions():
+    llm = LLM(api_key="test-llm", model=LockProbe(), fast_path=False, rpm=6000)
+    assert llm.token_usage("unknown") == {}
+    assert llm.session_count == 0
+    llm.session("known")
+    assert llm.token_usage("known")["requests"] == 0
+    assert llm.token_usage()["requests"] == 0
@@ -0,0 +1,98 @@
+import http.client
+import threading
+
+import pytest
+
+from media import MediaServer
+
+DATA = bytes(range(256)) * 4
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = MediaServer(host="127.0.0.1", port=0, public_url="http://media.test")
+    yield server
+    server.stop()
+
+
+def _request(server, path, headers=None, method="GET"):
+    conn = http.client.HTTPConnection("127.0.0.1", server.port, timeout=5)
+    try:
+        conn.request(method, path, headers=headers or {})
+        response = conn.getresponse()
+        return response.status, dict(response.getheaders()), response.read()
+    finally:
+        conn.close()
+
+
+def test_url_for_uses_public_url(server):
+    assert server.url_for("abc") == "http://media.test/media/abc"
+    assert server.public
+
+
+def test_not_public_without_public_url(monkeypatch):
+    monkeypatch.delenv("MEDIA_PUBLIC_URL", raising=False)
+    local = MediaServer(host="127.0.0.1", port=0)
+    try:
+        # 브라우저가 다른 기기일 수 있으므로 URL 대신 data URI를 쓰도록
+        assert not local.public
+    finally:
+        local.stop()
+
+
+def test_full_response(server):
+    media_id = server.store.put(DATA)
+    status, headers, body = _request(server, f"/media/{media_id}.mp3")
+    assert status == 200 and body == DATA
+    assert headers["Accept-Ranges"] == "bytes"
+    assert headers["Content-Length"] == str(len(DATA))
+
+
+@pytest.mark.parametrize("header, start, end", [
+    ("bytes=0-99", 0, 99),
+    ("bytes=1000-", 1000, 1023),
+    ("bytes=-24", 1000, 1023),
+    ("bytes=1000-5000", 1000, 1023),
+])
+def test_range_response(server, header, start, end):
+    media_id = server.store.put(DATA)
+    status, headers, body = _request(server, f"/media/{media_id}", {"Range": header})
+    assert status == 206
+    assert headers["Content-Range"] == f"bytes {start}-{end}/{len(DATA)}"
+    assert body == DATA[start:end + 1]
+
+
+def test_unsatisfiable_range(server):
+    media_id = server.store.put(DATA)
+    status, headers, body = _request(server, f"/media/{media_id}", {"Range": "bytes=2000-"})
+    assert status == 416
+    assert headers["Content-Range"] == f"bytes */{len(DATA)}"
+    assert body == b""
+
+
+def test_head_has_headers_without_body(server):
+    media_id = server.store.put(DATA)
+    status, headers, body = _request(server, f"/media/{media_id}", method="HEAD")
+    assert status == 200 and body == b""
+    assert headers["Content-Length"] == str(len(DATA))
+
+
+def test_in_progress_entry_streams_chunks(server):
+    media_id = server.store.create()
+
+    def produce():
+        for i in range(3):
+            server.store.append(media_id, DATA[i * 100:(i + 1) * 100])
+        server.store.finish(media_id)
+
+    timer = threading.Timer(0.1, produce)
+    timer.start()
+    status, headers, body = _request(server, f"/media/{media_id}")
+    timer.join()
+    assert status == 200 and headers["Transfer-Encoding"] == "chunked"
+    assert body == DATA[:300]
+
+
+def test_unknown_media_and_paths(server):
+    assert _request(server, "/media/missing")[0] == 404
+    assert _request(server, "/other")[0] == 404
@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+from LLM import LLM, Reply
+from fake_providers import FakeGenerativeModel, LatencyModel
+from pipeline import PipelineRunner, Turn
+from runtime import BackgroundLoop
+
+
+@pytest.fixture
+def llm():
+    return LLM(api_key="test-pipeline", model=FakeGenerativeModel(LatencyModel(0), token_ms=0), rpm=6000)
+
+
+@pytest.fixture
+def pipeline(llm):
+    loop = BackgroundLoop()
+    yield PipelineRunner(None, llm, None, loop=loop)
+    loop.stop()
+
+
+def _run(pipeline, turn, source=None):
+    async def main():
+        async for _ in pipeline.stream_reply(turn, source=source):
+            pass
+    asyncio.run(main())
+
+
+def test_record_false_keeps_result_off_the_session(llm):
+    conv = llm.session("s")
+    first, second = Reply(), Reply()
+    text = "".join(llm.generate_stream("허리가 좀 아파", session_id="s", record=False, result=first))
+    # 같은 세션의 다른 생성 (말 끊기 턴, 추측 생성, 다른 탭)
+    "".join(llm.generate_stream("고마워", session_id="s", record=False, result=second))
+    assert (first.path, second.path) == ("gemini", "intent")
+    assert len(conv.context.turns) == 0
+
+    llm.commit("허리가 좀 아파", text, first, session_id="s")
+    assert list(conv.context.turns) == [("허리가 좀 아파", text)]
+    assert conv.context.stats["requests"] == 1
+    assert conv.last_path == "gemini"
+
+
+def test_commit_without_result_path_records_nothing(llm):
+    llm.commit("안녕", "", Reply(), session_id="s")
+    assert len(llm.session("s").context.turns) == 0
+
+
+def test_turn_commits_its_own_reply(pipeline, llm):
+    turn = Turn(session_id="s", user_text="허리가 좀 아파")
+    _run(pipeline, turn)
+    assert turn.llm_reply.path == "gemini"
+    assert list(llm.session("s").context.turns) == [("허리가 좀 아파", turn.reply)]
+
+
+def test_cancelled_turn_commits_nothing(pipeline, llm):
+    turn = Turn(session_id="s", user_text="허리가 좀 아파")
+    turn.cancel.cancel("stop")
+    _run(pipeline, turn)
+    assert not turn.reply_parts and llm.model.calls == 0
+    assert len(llm.session("s").context.turns) == 0
+
+
+def test_local_turn_is_remembered_as_intent(pipeline, llm):
+    turn = Turn(session_id="s", user_text="고마워")
+    _run(pipeline, turn)
+    assert turn.llm_reply.path == "intent"
+    assert llm.session("s").context.turns[-1] == ("고마워", turn.reply)
+    assert llm.session("s").context.stats["requests"] == 0
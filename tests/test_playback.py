@@ -0,0 +1,95 @@
+import io
+import sys
+import time
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from playback import PlaybackEngine
+
+RATE = 24000
+
+# 실제 장치 없이: 실시간 속도로 stdin을 읽기만 하는 가짜 플레이어
+FAKE_PLAYER = [sys.executable, "-c",
+               "import sys,time\nr=int(sys.argv[1])\n"
+               "while True:\n d=sys.stdin.buffer.read(r//5)\n"
+               " if not d: break\n time.sleep(len(d)/2/r)", "{rate}"]
+
+
+def _tone(seconds, freq=440):
+    samples = (0.2 * np.sin(2 * np.pi * freq * np.arange(int(RATE * seconds)) / RATE)).astype("float32")
+    out = io.BytesIO()
+    sf.write(out, samples, RATE, format="WAV", subtype="PCM_16")
+    return out.getvalue()
+
+
+@pytest.fixture
+def engine():
+    engine = PlaybackEngine(command=FAKE_PLAYER)
+    yield engine
+    engine.close()
+
+
+def _until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "시간 초과"
+        time.sleep(0.01)
+
+
+def test_queued_clips_play_in_order_through_one_player(engine):
+    start = time.monotonic()
+    clips = [engine.enqueue(_tone(0.2, freq)) for freq in (330, 392, 440)]
+    assert time.monotonic() - start < 0.1
+    assert engine.drain(timeout=5)
+    assert time.monotonic() - start >= 0.55
+    assert all(c.written and not c.cancelled for c in clips)
+    assert clips[0].ends_at < clips[1].ends_at < clips[2].ends_at
+    assert engine.stats["played"] == 3 and engine.stats["spawns"] == 1
+    assert engine.stats["seconds"] == pytest.approx(0.6, abs=0.01)
+    assert not engine.busy
+
+
+def test_stop_cuts_playing_and_queued_audio(engine):
+    clips = [engine.enqueue(_tone(0.5)) for _ in range(4)]
+    _until(lambda: engine._playing)
+    time.sleep(0.1)
+    engine.stop()
+    assert [engine.wait(c, 0) for c in clips] == [False] * 4
+    assert all(c.cancelled for c in clips)
+    assert engine._process is None and not engine.busy
+    assert engine.stats["played"] == 0 and engine.stats["cancelled"] == 4
+
+    # 멈춘 뒤 다음 오디오는 새 플레이어로 바로 재생
+    assert engine.play(_tone(0.2), timeout=5)
+    assert engine.stats["spawns"] == 2 and engine.stats["played"] == 1
+
+
+def test_flush_drops_only_clips_not_yet_started(engine):
+    # 파이프 버퍼(64KB)보다 긴 청크라 첫 청크를 넘기는 동안 나머지는 대기열에 남음
+    first, second, third = (engine.enqueue(_tone(1.5)) for _ in range(3))
+    _until(lambda: engine._playing)
+    assert engine.flush() == 2
+    assert second.cancelled and third.cancelled
+    assert not first.cancelled
+    engine.stop()
+    assert first.cancelled
+
+
+def test_undecodable_clip_is_skipped(engine):
+    bad = engine.enqueue(b"not audio")
+    good = engine.enqueue(_tone(0.1))
+    assert not engine.wait(bad, timeout=5)
+    assert engine.wait(good, timeout=5)
+    assert engine.stats["decode_errors"] == 1 and engine.stats["played"] == 1
+
+
+def test_close_stops_player_and_thread():
+    engine = PlaybackEngine(command=FAKE_PLAYER)
+    clip = engine.enqueue(_tone(1.0))
+    _until(lambda: engine._playing)
+    engine.close()
+    assert clip.cancelled
+    assert not engine._thread.is_alive()
+    assert engine._process is None
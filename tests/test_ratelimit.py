@@ -0,0 +1,90 @@
+import time
+
+import pytest
+
+from ratelimit import RateLimited, RateLimiter, is_rate_limit, retry_after
+
+
+class _Quota(Exception):
+    def __init__(self, text, retry_after=None):
+        super().__init__(text)
+        if retry_after is not None:
+            self.retry_after = retry_after
+
+
+def test_burst_then_spacing():
+    limiter = RateLimiter(rpm=60, burst=2)
+    assert limiter.reserve() == 0
+    assert limiter.reserve() == 0
+    assert limiter.reserve() == pytest.approx(1.0, abs=0.05)
+
+
+def test_rejects_when_turn_falls_after_deadline():
+    limiter = RateLimiter(rpm=60, burst=1)
+    limiter.reserve()
+    with pytest.raises(RateLimited) as info:
+        limiter.reserve(deadline=time.monotonic() + 0.2)
+    assert info.value.reason == "deadline"
+    assert info.value.wait == pytest.approx(1.0, abs=0.05)
+    assert limiter.stats["rejected_deadline"] == 1
+    # 거절된 요청은 자리를 예약하지 않음
+    assert limiter.reserve(deadline=time.monotonic() + 1.5) == pytest.approx(1.0, abs=0.05)
+
+
+def test_rejects_when_queue_is_full():
+    limiter = RateLimiter(rpm=60, burst=1, max_waiters=1)
+    limiter.reserve()
+    limiter.reserve()
+    with pytest.raises(RateLimited) as info:
+        limiter.reserve()
+    assert info.value.reason == "queue full"
+
+
+def test_penalize_blocks_until_retry_after():
+    limiter = RateLimiter(rpm=600, burst=10)
+    limiter.penalize(2.0)
+    assert limiter.reserve() == pytest.approx(2.0, abs=0.05)
+    with pytest.raises(RateLimited):
+        limiter.reserve(deadline=time.monotonic() + 1.0)
+
+
+@pytest.mark.parametrize("error, seconds", [
+    (_Quota("429 Too Many Requests", retry_after=3), 3.0),
+    (_Quota("429 quota exceeded, retry in 7s"), 7.0),
+    (_Quota("Please retry after 1.5 s"), 1.5),
+    (_Quota("429 Too Many Requests"), None),
+])
+def test_retry_after_hint(error, seconds):
+    assert retry_after(error) == seconds
+
+
+def test_is_rate_limit():
+    assert is_rate_limit(RateLimited("deadline"))
+    assert is_rate_limit(_Quota("Resource has been exhausted (e.g. check quota)."))
+    assert not is_rate_limit(ValueError("bad request"))
+
+
+def test_call_retries_429_and_honours_retry_after():
+    limiter = RateLimiter(rpm=6000, burst=10, base_delay=0.0, max_retries=2)
+    calls = []
+
+    def fn():
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            raise _Quota("429", retry_after=0.2)
+        return "ok"
+
+    assert limiter.call(fn) == "ok"
+    assert calls[1] - calls[0] >= 0.2
+    assert limiter.stats["retries"] == 1 and limiter.stats["throttled"] == 1
+
+
+def test_call_gives_up_when_retry_would_miss_deadline():
+    limiter = RateLimiter(rpm=6000, burst=10)
+
+    def fn():
+        raise _Quota("429", retry_after=5)
+
+    with pytest.raises(_Quota):
+        limiter.call(fn, deadline=time.monotonic() + 1)
+    assert limiter.stats["retries"] == 0
@@ -0,0 +1,139 @@
+import time
+from datetime import datetime
+
+import pytest
+
+from scheduler import DEFAULT_DOSES, CallScheduler, Timetable
+
+
+class Clock:
+    def __init__(self, ts):
+        self.now = ts
+
+    def __call__(self):
+        return self.now
+
+
+def _at(hhmm, day=17):
+    return datetime(2026, 10, day, int(hhmm[:2]), int(hhmm[3:])).timestamp()
+
+
+@pytest.fixture
+def clock():
+    return Clock(_at("08:00"))
+
+
+@pytest.fixture
+def scheduler(clock):
+    return CallScheduler(spread=0, clock=clock)
+
+
+def test_timetable_is_shared_and_sorted():
+    doses = (("evening", "18:30", ("혈압약",)), ("morning", "08:30", ("혈압약",)))
+    table = Timetable.of(doses)
+    assert table is Timetable.of(doses)
+    assert table.slots == ("morning", "evening")
+    assert table.minutes == (8 * 60 + 30, 18 * 60 + 30)
+
+
+def test_pop_due_returns_each_slot_once_and_reschedules(scheduler, clock):
+    scheduler.add("e1", Timetable.of(DEFAULT_DOSES))
+    assert scheduler.pop_due(_at("08:29")) == []
+
+    calls = scheduler.pop_due(_at("08:31"))
+    assert [(c.elder_id, c.slot, c.due) for c in calls] == [("e1", "morning", _at("08:30"))]
+    assert calls[0].medications == DEFAULT_DOSES[0][2]
+    assert scheduler.pop_due(_at("08:31")) == []
+
+    calls = scheduler.pop_due(_at("18:31"))
+    assert [(c.slot, c.due) for c in calls] == [("evening", _at("18:30"))]
+    # 저녁 다음은 내일 아침
+    assert scheduler.pop_due(_at("08:31", day=18))[0].slot == "morning"
+
+
+def test_pop_due_limit_leaves_the_rest(scheduler):
+    table = Timetable.of(DEFAULT_DOSES)
+    for i in range(5):
+        scheduler.add(f"e{i}", table)
+    assert len(scheduler.pop_due(_at("08:31"), limit=2)) == 2
+    assert len(scheduler.pop_due(_at("08:31"))) == 3
+
+
+def test_changed_timetable_invalidates_old_entry(scheduler):
+    scheduler.add("e1", Timetable.of(DEFAULT_DOSES))
+    scheduler.add("e1", Timetable.of((("noon", "12:00", ("진통제",)),)))
+    assert scheduler.pop_due(_at("08:31")) == []
+    calls = scheduler.pop_due(_at("12:01"))
+    assert [c.slot for c in calls] == ["noon"]
+
+
+def test_removed_elder_is_never_called(scheduler):
+    scheduler.add("e1", Timetable.of(DEFAULT_DOSES))
+    scheduler.remove("e1")
+    assert len(scheduler) == 0
+    assert scheduler.pop_due(_at("23:59")) == []
+    assert scheduler.next_call("e1") is None
+
+
+def test_offset_is_stable_and_within_spread(clock):
+    scheduler = CallScheduler(spread=600, clock=clock)
+    offset = scheduler.offset("e1", "morning")
+    assert 0 <= offset < 600
+    assert offset == scheduler.offset("e1", "morning")
+    scheduler.add("e1", Timetable.of(DEFAULT_DOSES))
+    call = scheduler.next_call("e1")
+    assert call.due == pytest.approx(_at("08:30") + offset)
+    assert call.nominal == pytest.approx(_at("08:30"))
+
+
+def test_ringing_peeks_and_take_pops(scheduler, clock):
+    scheduler.add("e1", Timetable.of(DEFAULT_DOSES))
+    clock.now = _at("08:31")
+    for call in scheduler.pop_due():
+        scheduler._fire(call)
+    # 화면 여러 개가 같은 전화를 볼 수 있음
+    assert scheduler.ringing("e1").slot == "morning"
+    assert scheduler.ringing("e1").slot == "morning"
+    assert scheduler.ringing("e2") is None
+    assert scheduler.take("e1").slot == "morning"
+    assert scheduler.ringing("e1") is None and scheduler.take("e1") is None
+
+
+def test_unanswered_call_expires_after_ring_window(scheduler, clock):
+    scheduler.add("e1", Timetable.of(DEFAULT_DOSES))
+    clock.now = _at("08:31")
+    for call in scheduler.pop_due():
+        scheduler._fire(call)
+    clock.now = _at("09:30")
+    assert scheduler.ringing("e1") is None
+    assert scheduler.take("e1") is None
+    assert scheduler.stats["missed"] == 1
+
+
+def test_timetable_parses_single_digit_hour_and_rejects_bad_times():
+    table = Timetable.of((("morning", "8:30", ()), ("evening", "18:05", ())))
+    assert table.minutes == (8 * 60 + 30, 18 * 60 + 5)
+    for bad in ("25:00", "08:60", "24:00", "0830", "8:3a", "-1:30", "8:30:00"):
+        with pytest.raises(ValueError):
+            Timetable.of((("morning", bad, ()),))
+
+
+@pytest.fixture
+def new_york(monkeypatch):
+    monkeypatch.setenv("TZ", "America/New_York")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+@pytest.mark.skipif(not hasattr(time, "tzset"), reason="TZ 변경 불가")
+def test_due_keeps_wall_clock_time_on_dst_days(new_york):
+    # 2026-03-08 서머타임 시작 (하루 23시간), 2026-11-01 종료 (하루 25시간)
+    for month, day in ((3, 8), (11, 1)):
+        clock = Clock(datetime(2026, month, day, 0, 30).timestamp())
+        scheduler = CallScheduler(spread=0, clock=clock)
+        scheduler.add("e1", Timetable.of(DEFAULT_DOSES))
+        call = scheduler.next_call("e1")
+        assert datetime.fromtimestamp(call.due) == datetime(2026, month, day, 8, 30)
+        assert datetime.fromtimestamp(call.nominal) == datetime(2026, month, day, 8, 30)
@@ -0,0 +1,109 @@
+import threading
+
+import pytest
+
+from LLM import LLM, Reply
+from STT import TranscriptEvent
+from fake_providers import FakeGenerativeModel, LatencyModel
+from runtime import CancelToken
+from speculative import Speculator
+
+
+@pytest.fixture
+def llm():
+    # 토큰 간격을 두어 취소가 생성 중간에 걸리도록
+    return LLM(api_key="test-speculative", model=FakeGenerativeModel(LatencyModel(0), token_ms=20), fast_path=False, rpm=6000)
+
+
+class Slots:
+    """디스패처 자리 흉내 (잡은/반납한 횟수)"""
+
+    def __init__(self):
+        self.held = 0
+        self.released = 0
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def __call__(self, session_id, cancel):
+        while not self.gate.wait(0.01):
+            if cancel.cancelled:
+                return None
+        self.held += 1
+        return self.release
+
+    def release(self):
+        self.released += 1
+
+
+def _endpoint(turn, text):
+    turn.observe(TranscriptEvent(text, is_final=True, speech_final=True))
+    return turn.draft
+
+
+def test_hit_adopts_draft_without_touching_session(llm):
+    slots = Slots()
+    spec = Speculator(llm, hold=slots)
+    turn = spec.begin("s")
+    draft = _endpoint(turn, "허리가 좀 아파")
+    assert draft.wait(5)
+    conv = llm.session("s")
+    # 추측 결과는 채택 전까지 세션에 남지 않음
+    assert len(conv.context.turns) == 0 and draft.result.path == "gemini"
+
+    result = Reply()
+    calls = llm.model.calls
+    reply = " ".join(turn.finalize("허리가 좀 아파", record=False, result=result))
+    assert turn.outcome == "hit" and llm.model.calls == calls
+    assert reply == draft.reply and result.path == "gemini"
+    assert result.prompt_tokens == draft.result.prompt_tokens > 0
+    assert slots.held == slots.released == 1
+
+
+def test_changed_transcript_discards_draft(llm):
+    spec = Speculator(llm)
+    turn = spec.begin("s")
+    first = _endpoint(turn, "약은 먹었는데")
+    # 다시 말하기 시작함 → 바로 버림
+    turn.observe(TranscriptEvent("허리가", is_final=False))
+    assert turn.draft is None and first.token.cancelled
+    assert first.wait(5)
+    assert spec.stats["cancelled"] == 1
+
+    reply = " ".join(turn.finalize("약은 먹었는데 허리가 좀 아파", record=True))
+    assert turn.outcome == "none" and reply
+    assert llm.session("s").context.turns[-1][0] == "약은 먹었는데 허리가 좀 아파"
+
+
+def test_miss_regenerates_for_final_text(llm):
+    spec = Speculator(llm)
+    turn = spec.begin("s")
+    draft = _endpoint(turn, "약은 먹었는데")
+    result = Reply()
+    list(turn.finalize("약은 먹었는데 허리가 좀 아파", record=False, result=result))
+    assert turn.outcome == "miss" and draft.token.cancelled
+    assert result.path == "gemini" and spec.stats["misses"] == 1
+
+
+def test_turn_cancel_stops_running_draft(llm):
+    cancel = CancelToken()
+    spec = Speculator(llm)
+    turn = spec.begin("s", cancel)
+    draft = _endpoint(turn, "허리가 좀 아파")
+    cancel.cancel("barge_in")
+    assert draft.wait(1)
+    assert draft.token.reason == "barge_in"
+    # 한 번 끝난 추측은 턴 토큰에 콜백을 남기지 않음
+    assert not cancel._callbacks
+
+
+def test_draft_waiting_for_slot_gives_up_on_cancel(llm):
+    slots = Slots()
+    slots.gate.clear()
+    cancel = CancelToken()
+    spec = Speculator(llm, hold=slots)
+    turn = spec.begin("s", cancel)
+    draft = _endpoint(turn, "허리가 좀 아파")
+    cancel.cancel("stop")
+    assert draft.wait(1)
+    assert slots.held == 0 and llm.model.calls == 0
+    assert draft.cancel() == 0
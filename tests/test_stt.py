@@ -0,0 +1,83 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from STT import STT
+from fake_deepgram import FakeDeepgramREST
+
+
+class EchoContentType(FakeDeepgramREST):
+    """받은 Content-Type을 인식 결과로 돌려주는 가짜 서버"""
+
+    def __init__(self):
+        super().__init__(latency=0.02)
+        self.pairs = []
+        self._pairs_lock = threading.Lock()
+
+    def _respond(self, body, content_type=""):
+        with self._pairs_lock:
+            self.pairs.append((body[:4], content_type))
+        status, headers, payload = super()._respond(body, content_type)
+        payload["results"]["channels"][0]["alternatives"][0]["transcript"] = content_type
+        return status, headers, payload
+
+
+@pytest.fixture
+def server():
+    with EchoContentType() as server:
+        yield server
+
+
+FILES = {"audio/wav": b"RIFF" + b"\x00" * 2000, "audio/mpeg": b"ID3\x03" + b"\x00" * 2000}
+
+
+def test_each_request_carries_its_own_content_type(server):
+    stt = STT(api_key="test", url=server.url, pool_size=4)
+    jobs = [mime for _ in range(12) for mime in FILES]
+    try:
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(lambda mime: stt.transcribe(FILES[mime], mime), jobs))
+    finally:
+        stt.close()
+    assert results == jobs
+    expected = {body[:4]: mime for mime, body in FILES.items()}
+    assert all(expected[prefix] == content_type for prefix, content_type in server.pairs)
+    # 공용 SDK 설정은 건드리지 않음
+    assert "Content-Type" not in stt._rest._config.headers
+
+
+def test_pool_reuses_connections(server):
+    stt = STT(api_key="test", url=server.url, pool_size=2)
+    try:
+        for _ in range(5):
+            assert stt.transcribe(FILES["audio/wav"]) == "audio/wav"
+        stats = stt.connection_stats()
+    finally:
+        stt.close()
+    assert stats["requests"] == 5 and stats["new_connections"] == 1
+
+
+def test_transcribe_async_does_not_block_the_loop(server):
+    stt = STT(api_key="test", url=server.url)
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.005)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        text = await stt.transcribe_async(FILES["audio/mpeg"], "audio/mpeg")
+        task.cancel()
+        return text, ticks
+
+    try:
+        text, ticks = asyncio.run(main())
+    finally:
+        stt.close()
+    assert text == "audio/mpeg" and ticks > 0
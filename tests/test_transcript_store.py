@@ -0,0 +1,117 @@
+import sqlite3
+import time
+
+import pytest
+
+from transcript_store import TranscriptStore, day_of
+
+T0 = time.mktime((2026, 10, 17, 9, 0, 0, 0, 0, -1))
+DAY = day_of(T0)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = TranscriptStore(str(tmp_path / "transcripts.db"), flush_interval=0.05)
+    yield store
+    store.close()
+
+
+def _trace(started_at, total_ms, fallback="none", intent=None, interrupted=None):
+    tags = {"fallback": fallback}
+    if intent:
+        tags["intent"] = intent
+    if interrupted:
+        tags["interrupted"] = interrupted
+    return {"started_at": started_at, "total_ms": total_ms, "tags": tags,
+            "spans": [{"name": "llm", "ms": total_ms / 2}]}
+
+
+def test_writes_are_batched_into_few_transactions(tmp_path):
+    store = TranscriptStore(str(tmp_path / "t.db"), batch_size=50, flush_interval=0.2)
+    try:
+        call_id = store.start_call("e1", started_at=T0)
+        for i in range(199):
+            store.record_turn(call_id, f"발화 {i}", "응답", _trace(T0 + i, 500.0))
+        assert store.flush(timeout=5)
+        assert store.stats["queued"] == store.stats["written"] == 200
+        assert store.stats["max_batch"] <= 50
+        assert 4 <= store.stats["batches"] < 20
+        assert len(store.transcript(call_id)) == 199
+    finally:
+        store.close()
+
+
+def test_full_queue_drops_writes_without_blocking(tmp_path):
+    path = str(tmp_path / "t.db")
+    store = TranscriptStore(path, batch_size=1, flush_interval=0.0, max_pending=3)
+    # 다른 연결이 쓰기 잠금을 잡아 쓰기 스레드를 멈춰 둠
+    blocker = sqlite3.connect(path, isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")
+    try:
+        call_id = store.start_call("e1", started_at=T0)
+        deadline = time.monotonic() + 5
+        while store._queue.qsize() and time.monotonic() < deadline:
+            time.sleep(0.01)   # 첫 기록을 꺼내 잠금에서 기다릴 때까지
+
+        start = time.perf_counter()
+        for i in range(10):
+            store.record_turn(call_id, f"발화 {i}", "응답", _trace(T0 + i, 500.0))
+        assert time.perf_counter() - start < 1.0
+        assert store.stats["dropped"] == 7
+        assert store.stats["queued"] == 4
+    finally:
+        blocker.execute("ROLLBACK")
+        blocker.close()
+    assert store.flush(timeout=10)
+    assert store.stats["written"] == 4
+    store.close()
+
+
+def test_flush_after_close_returns_false(store):
+    store.start_call("e1", started_at=T0)
+    assert store.flush(timeout=5)
+    store.close()
+    start = time.perf_counter()
+    assert store.flush() is False
+    assert time.perf_counter() - start < 1.0
+
+
+def test_record_turn_requires_started_call(store):
+    with pytest.raises(KeyError):
+        store.record_turn("missing", "안녕", "안녕하세요")
+
+
+def test_query_helpers(store):
+    morning = store.start_call("e1", session_id="s1", started_at=T0)
+    store.record_turn(morning, None, "좋은 아침이에요", _trace(T0, 800.0))
+    store.record_turn(morning, "허리가 아파요", "많이 아프세요?", _trace(T0 + 10, 1200.0, intent="pain"))
+    store.record_turn(morning, "밥 먹었어요", "잘하셨어요", _trace(T0 + 20, 1000.0, fallback="quota",
+                                                              interrupted="barge_in"))
+    store.end_call(morning, ended_at=T0 + 60)
+
+    evening = store.start_call("e1", started_at=T0 + 3600)
+    store.record_turn(evening, "잘 자요", "안녕히 주무세요", _trace(T0 + 3600, 600.0))
+    store.end_call(evening, ended_at=T0 + 3660)
+
+    other = store.start_call("e2", started_at=T0)
+    store.record_turn(other, "허리가 아파요", "저런", _trace(T0, 700.0, intent="pain"))
+    assert store.flush(timeout=5)
+
+    calls = store.calls("e1", DAY, DAY)
+    assert [c["call_id"] for c in calls] == [evening, morning]
+    assert (calls[1]["turns"], calls[1]["interrupted"], calls[1]["session_id"]) == (3, 1, "s1")
+    assert store.calls("e1", "2026-10-18", "2026-10-31") == []
+
+    turns = store.transcript(morning)
+    assert [t["seq"] for t in turns] == [0, 1, 2]
+    assert turns[0]["user_text"] is None
+    assert turns[1]["intent"] == "pain"
+    assert turns[2]["trace"] == [{"name": "llm", "ms": 500.0}]
+
+    pain = store.turns("e1", DAY, DAY, intent="pain")
+    assert [(t["call_id"], t["user_text"]) for t in pain] == [(morning, "허리가 아파요")]
+    assert len(store.turns("e1", DAY, DAY)) == 4
+
+    [summary] = store.daily_summary("e1", DAY, DAY)
+    assert summary == {"day": DAY, "calls": 2, "turns": 4, "avg_ms": 900.0,
+                       "fallback_turns": 1, "interrupted_turns": 1}
@@ -0,0 +1,25 @@
+import asyncio
+
+from TTS import TTS
+
+
+def test_synthesize_chunks_keeps_at_most_prefetch_in_flight():
+    tts = TTS()
+    state = {"active": 0, "peak": 0}
+
+    async def synthesize(text, cancel=None, slot=None):
+        state["active"] += 1
+        state["peak"] = max(state["peak"], state["active"])
+        await asyncio.sleep(0.01)
+        state["active"] -= 1
+        return text.encode()
+
+    tts.synthesize = synthesize
+
+    async def collect(prefetch):
+        return [audio async for audio in tts.synthesize_chunks([f"{i}" for i in range(8)], prefetch=prefetch)]
+
+    for prefetch in (1, 2, 3):
+        state["peak"] = 0
+        assert asyncio.run(collect(prefetch)) == [f"{i}".encode() for i in range(8)]
+        assert state["peak"] == prefetch
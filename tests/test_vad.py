@@ -0,0 +1,63 @@
+import io
+import wave
+
+import numpy as np
+
+from VAD import VAD
+
+RATE = 16000
+
+
+def _speech(seconds, amplitude=0.3):
+    """유성음 흉내: 150Hz 기본음 + 배음, 음절 단위로 크기가 오르내림"""
+    t = np.arange(int(RATE * seconds)) / RATE
+    voiced = sum(np.sin(2 * np.pi * 150 * k * t) / k for k in range(1, 5))
+    envelope = 0.6 + 0.4 * np.sin(2 * np.pi * 4 * t)
+    return (amplitude * envelope * voiced / 2).astype(np.float32)
+
+
+def _silence(seconds, amplitude=0.0005):
+    rng = np.random.default_rng(0)
+    return (amplitude * rng.standard_normal(int(RATE * seconds))).astype(np.float32)
+
+
+def _wav(samples):
+    out = io.BytesIO()
+    with wave.open(out, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(RATE)
+        wf.writeframes((samples * 32767).astype("<i2").tobytes())
+    return out.getvalue()
+
+
+def test_pure_speech_is_kept_whole():
+    samples = _speech(2.0)
+    assert VAD().detect(samples, RATE) == (0, len(samples))
+
+
+def test_speech_with_quiet_edges_is_kept_whole():
+    # 처음과 끝을 작게 말한 녹음: 하위 10% 에너지도 말소리라 소음으로 보면 안 됨
+    samples = np.concatenate([_speech(0.6, 0.05), _speech(1.0, 0.5), _speech(0.6, 0.05)])
+    assert VAD().detect(samples, RATE) == (0, len(samples))
+
+
+def test_pure_silence_is_dropped():
+    vad = VAD()
+    assert vad.detect(_silence(2.0), RATE) is None
+    assert vad.detect(np.zeros(RATE, dtype=np.float32), RATE) is None
+    assert vad.trim(_wav(_silence(2.0))) is None
+    assert vad.stats["dropped"] == 1
+
+
+def test_speech_surrounded_by_silence_is_trimmed():
+    vad = VAD(padding_ms=100)
+    samples = np.concatenate([_silence(1.0), _speech(1.0), _silence(1.0)])
+    start, end = vad.detect(samples, RATE)
+    assert 0.8 * RATE <= start <= 1.0 * RATE
+    assert 2.0 * RATE <= end <= 2.2 * RATE
+
+    trimmed = vad.trim(_wav(samples))
+    assert trimmed is not None
+    with wave.open(io.BytesIO(trimmed), "rb") as wf:
+        assert wf.getnframes() == end - start
@@ -0,0 +1,377 @@
+"""
+transcript_store.py - 통화 기록 저장소 (SQLite WAL)
+통화와 턴(대화 내용, 단계 지연, 응답 경로, 의도)을 남겨 보호자 화면에서 조회
+쓰기는 대기열에 넣고 바로 반환, 백그라운드 스레드가 모아서 한 트랜잭션으로 기록
+"""
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [STORE] %(message)s')
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS calls (
+    call_id     TEXT PRIMARY KEY,
+    elder_id    TEXT NOT NULL,
+    session_id  TEXT,
+    day         TEXT NOT NULL,              -- 통화 시작 날짜 (로컬, YYYY-MM-DD)
+    started_at  REAL NOT NULL,
+    ended_at    REAL,
+    turns       INTEGER NOT NULL DEFAULT 0,
+    interrupted INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS calls_elder_day ON calls (elder_id, day);
+CREATE INDEX IF NOT EXISTS calls_day ON calls (day);
+
+CREATE TABLE IF NOT EXISTS turns (
+    id          INTEGER PRIMARY KEY,
+    call_id     TEXT NOT NULL,
+    elder_id    TEXT NOT NULL,
+    seq         INTEGER NOT NULL,           -- 통화 안에서의 순서 (0 = 인사말)
+    day         TEXT NOT NULL,
+    at          REAL NOT NULL,
+    user_text   TEXT,
+    reply       TEXT,
+    intent      TEXT,
+    fallback    TEXT,                       -- none / intent / demo / quota / error
+    interrupted TEXT,                       -- barge_in / stop / closed
+    speculation TEXT,
+    total_ms    REAL,
+    trace       TEXT                        -- 단계별 구간 (JSON)
+);
+CREATE INDEX IF NOT EXISTS turns_call ON turns (call_id, seq);
+CREATE INDEX IF NOT EXISTS turns_elder_day ON turns (elder_id, day);
+"""
+
+
+def day_of(ts: float) -> str:
+    """타임스탬프 → 로컬 날짜 (YYYY-MM-DD)"""
+    return time.strftime("%Y-%m-%d", time.localtime(ts))
+
+
+class TranscriptStore:
+    """
+    통화 기록 저장소
+
+    기록 메서드(start_call, record_turn, end_call)는 대기열에 넣기만 하므로
+    통화 중 요청 경로를 막지 않습니다. 조회는 스레드별 읽기 연결로 하며,
+    WAL이라 쓰는 중에도 기다리지 않습니다.
+
+    사용 예:
+        store = TranscriptStore("data/transcripts.db")
+        call_id = store.start_call("elder-01")
+        store.record_turn(call_id, "밥 먹었어요", "잘하셨어요~", trace=turn.trace.finish())
+        store.end_call(call_id)
+        store.calls("elder-01", "2025-01-01", "2025-01-31")
+    """
+
+    def __init__(
+        self,
+        path: str = "data/transcripts.db",
+        batch_size: int = 200,
+        flush_interval: float = 0.5,
+        max_pending: int = 10000,
+    ):
+        """
+        Args:
+            path: 데이터베이스 파일 (":memory:"는 지원 안 함, 읽기/쓰기 연결이 따로라서)
+            batch_size: 한 트랜잭션에 모을 최대 기록 수
+            flush_interval: 첫 기록 뒤 이만큼 더 모았다가 기록 (초)
+            max_pending: 대기열 상한 (넘으면 버리고 dropped로 집계, 통화는 막지 않음)
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        conn.close()
+
+        self.stats: Dict[str, float] = {
+            "queued": 0, "written": 0, "batches": 0, "dropped": 0, "errors": 0,
+            "max_batch": 0, "write_ms": 0.0,
+        }
+        # 진행 중인 통화: call_id → [elder_id, 다음 턴 번호]
+        self._open: Dict[str, List] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, name="transcript-writer", daemon=True)
+        self._thread.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # WAL에서는 NORMAL이어도 손상되지 않음 (전원 차단 시 마지막 트랜잭션만 잃을 수 있음)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    # ─────────────────────────────────────────────
+    # 기록 (대기열에 넣고 바로 반환)
+    # ─────────────────────────────────────────────
+    def start_call(
+        self,
+        elder_id: str,
+        session_id: Optional[str] = None,
+        call_id: Optional[str] = None,
+        started_at: Optional[float] = None,
+    ) -> str:
+        """
+        통화 시작
+
+        Returns:
+            통화 ID (record_turn, end_call에 사용)
+        """
+        call_id = call_id or uuid.uuid4().hex
+        started_at = started_at or time.time()
+        with self._lock:
+            self._open[call_id] = [elder_id, 0]
+        self._put((
+            "INSERT OR IGNORE INTO calls (call_id, elder_id, session_id, day, started_at) VALUES (?, ?, ?, ?, ?)",
+            (call_id, elder_id, session_id, day_of(started_at), started_at),
+        ))
+        return call_id
+
+    def record_turn(
+        self,
+        call_id: str,
+        user_text: Optional[str],
+        reply: str,
+        trace: Optional[Dict] = None,
+        intent: Optional[str] = None,
+        at: Optional[float] = None,
+    ):
+        """
+        턴 기록
+
+        Args:
+            call_id: start_call이 돌려준 통화 ID
+            user_text: 사용자 발화 (인사말은 None)
+            reply: 실제로 말한 응답 (끊겼으면 말한 데까지)
+            trace: TurnTrace.finish() 결과 (지연, fallback, interrupted, intent 태그)
+            intent: 의도 (None이면 trace의 intent 태그)
+            at: 턴 시각 (None이면 trace 시작 시각, 없으면 지금)
+        """
+        with self._lock:
+            entry = self._open.get(call_id)
+            if entry is None:
+                raise KeyError(f"시작하지 않은 통화: {call_id}")
+            elder_id, seq = entry
+            entry[1] += 1
+        trace = trace or {}
+        tags = trace.get("tags", {})
+        at = at or trace.get("started_at") or time.time()
+        self._put((
+            "INSERT INTO turns (call_id, elder_id, seq, day, at, user_text, reply, intent, fallback,"
+            " interrupted, speculation, total_ms, trace) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (call_id, elder_id, seq, day_of(at), at, user_text, reply, intent or tags.get("intent"),
+             tags.get("fallback"), tags.get("interrupted"), tags.get("speculation"), trace.get("total_ms"),
+             json.dumps(trace.get("spans"), ensure_ascii=False) if trace.get("spans") else None),
+        ))
+
+    def end_call(self, call_id: str, ended_at: Optional[float] = None):
+        """통화 종료 (턴 수, 끊긴 턴 수 집계)"""
+        with self._lock:
+            self._open.pop(call_id, None)
+        self._put((
+            "UPDATE calls SET ended_at = ?,"
+            " turns = (SELECT COUNT(*) FROM turns WHERE call_id = ?),"
+            " interrupted = (SELECT COUNT(*) FROM turns WHERE call_id = ? AND interrupted IS NOT NULL)"
+            " WHERE call_id = ?",
+            (ended_at or time.time(), call_id, call_id, call_id),
+        ))
+
+    def _put(self, item):
+        try:
+            self._queue.put_nowait(item)
+            key = "queued"
+        except queue.Full:
+            key = "dropped"
+            logger.warning("기록 대기열이 가득 차 버림 (디스크가 느리거나 막힘)")
+        with self._lock:
+            self.stats[key] += 1
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        지금까지 넣은 기록이 디스크에 쓰일 때까지 대기
+
+        Returns:
+            다 썼으면 True, 시간 초과거나 쓰기 스레드가 끝났으면 (close 뒤) False
+        """
+        if not self._thread.is_alive():
+            return False
+        deadline = None if timeout is None else time.monotonic() + timeout
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        # 쓰기 스레드가 이 표시를 꺼내기 전에 끝날 수 있으므로 살아 있는지 보면서 기다림
+        while True:
+            wait = 0.1 if deadline is None else min(0.1, deadline - time.monotonic())
+            if done.wait(max(0.0, wait)):
+                return True
+            if not self._thread.is_alive() or (deadline is not None and time.monotonic() >= deadline):
+                return done.is_set()
+
+    def close(self):
+        """남은 기록을 쓰고 종료"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    # ─────────────────────────────────────────────
+    # 쓰기 스레드
+    # ─────────────────────────────────────────────
+    def _run(self):
+        conn = self._connect()
+        running = True
+        while running:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and batch[-1] is not None and not isinstance(batch[-1], threading.Event):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            statements = [item for item in batch if isinstance(item, tuple)]
+            if statements:
+                self._write(conn, statements)
+            for item in batch:
+                if item is None:
+                    running = False
+                elif isinstance(item, threading.Event):
+                    item.set()
+        conn.close()
+
+    def _write(self, conn: sqlite3.Connection, statements: List):
+        start = time.perf_counter()
+        try:
+            with conn:
+                for sql, params in statements:
+                    conn.execute(sql, params)
+        except sqlite3.Error as e:
+            with self._lock:
+                self.stats["errors"] += 1
+            logger.error(f"기록 실패 ({len(statements)}건): {e}")
+            return
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            stats = self.stats
+            stats["written"] += len(statements)
+            stats["batches"] += 1
+            stats["max_batch"] = max(stats["max_batch"], len(statements))
+            stats["write_ms"] += elapsed_ms
+
+    # ─────────────────────────────────────────────
+    # 조회 (보호자 화면)
+    # ─────────────────────────────────────────────
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+            conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    def _query(self, sql: str, params=()) -> List[Dict]:
+        return [dict(row) for row in self._reader().execute(sql, params)]
+
+    def calls(self, elder_id: str, start: str, end: str) -> List[Dict]:
+        """
+        기간 안의 통화 목록 (최근 순)
+
+        Args:
+            elder_id: 어르신 ID
+            start: 시작 날짜 (YYYY-MM-DD, 포함)
+            end: 끝 날짜 (YYYY-MM-DD, 포함)
+        """
+        return self._query(
+            "SELECT * FROM calls WHERE elder_id = ? AND day BETWEEN ? AND ? ORDER BY started_at DESC",
+            (elder_id, start, end),
+        )
+
+    def transcript(self, call_id: str) -> List[Dict]:
+        """통화 하나의 턴 (순서대로, 단계 구간 포함)"""
+        rows = self._query("SELECT * FROM turns WHERE call_id = ? ORDER BY seq", (call_id,))
+        for row in rows:
+            row["trace"] = json.loads(row["trace"]) if row["trace"] else []
+        return rows
+
+    def turns(self, elder_id: str, start: str, end: str, intent: Optional[str] = None) -> List[Dict]:
+        """기간 안의 턴 (의도로 거를 수 있음, 예: 통증 호소만)"""
+        sql = ("SELECT call_id, seq, day, at, user_text, reply, intent, fallback, interrupted, total_ms"
+               " FROM turns WHERE elder_id = ? AND day BETWEEN ? AND ?")
+        params = [elder_id, start, end]
+        if intent is not None:
+            sql += " AND intent = ?"
+            params.append(intent)
+        return self._query(sql + " ORDER BY at", params)
+
+    def daily_summary(self, elder_id: str, start: str, end: str) -> List[Dict]:
+        """날짜별 통화 수, 턴 수, 평균 지연, 폴백/끊긴 턴 수"""
+        return self._query(
+            "SELECT day, COUNT(DISTINCT call_id) AS calls, COUNT(*) AS turns,"
+            " ROUND(AVG(total_ms), 1) AS avg_ms,"
+            " SUM(fallback IS NOT NULL AND fallback != 'none') AS fallback_turns,"
+            " SUM(interrupted IS NOT NULL) AS interrupted_turns"
+            " FROM turns WHERE elder_id = ? AND day BETWEEN ? AND ? GROUP BY day ORDER BY day",
+            (elder_id, start, end),
+        )
+
+
+# 테스트
+if __name__ == "__main__":
+    import random
+    import tempfile
+
+    path = os.path.join(tempfile.mkdtemp(), "transcripts.db")
+    store = TranscriptStore(path)
+    rng = random.Random(0)
+    now = time.time()
+
+    # 어르신 50명 × 30일 × 하루 2통화 × 통화당 8턴
+    enqueue = []
+    for elder in range(50):
+        for day in range(30):
+            for call in range(2):
+                started = now - day * 86400 - call * 3600
+                call_id = store.start_call(f"elder-{elder:02d}", started_at=started)
+                for seq in range(8):
+                    trace = {"started_at": started + seq * 20, "total_ms": rng.uniform(600, 2500),
+                             "tags": {"fallback": rng.choice(["none"] * 9 + ["quota"]),
+                                      "intent": rng.choice([None, "meal", "pain", "sleep"])}}
+                    t = time.perf_counter()
+                    store.record_turn(call_id, "오늘 점심 먹었어요", "잘하셨어요~", trace)
+                    enqueue.append(time.perf_counter() - t)
+                store.end_call(call_id, ended_at=started + 200)
+        # 한꺼번에 넣는 시험이라 어르신마다 비움 (실제 통화는 초당 몇 건)
+        store.flush()
+    enqueue.sort()
+    print(f"기록 {store.stats['written']}건, 배치 {store.stats['batches']}개, "
+          f"호출당 p99 {enqueue[int(len(enqueue) * 0.99)] * 1e6:.0f}µs")
+
+    start, end = day_of(now - 29 * 86400), day_of(now)
+    for name, query in (
+        ("한 달 통화 목록", lambda: store.calls("elder-07", start, end)),
+        ("한 달 날짜별 요약", lambda: store.daily_summary("elder-07", start, end)),
+        ("한 달 통증 호소", lambda: store.turns("elder-07", start, end, intent="pain")),
+    ):
+        t = time.perf_counter()
+        rows = query()
+        print(f"{name}: {len(rows)}행, {(time.perf_counter() - t) * 1000:.2f}ms")
+    store.close()